@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+
+'''Benchmark TimeSeries and DataFrame operations at a range of sizes.
+
+Each benchmark runs in a forked process so that its peak memory can be
+measured on its own. Results are written as JSON, which can be compared
+with an earlier run using `--compare`:
+
+    $ python bench.py --output new.json --compare old.json
+'''
+
+import gc
+import os
+import sys
+import json
+import timeit
+import platform
+import resource
+import datetime
+import argparse
+import subprocess
+
+import numpy
+from timeseries import TimeSeries, DataFrame
+from timeseries import dates
+
+# Points in each series benchmark
+SERIES_SIZES = [ 10 ** exponent for exponent in xrange(3, 8) ]
+
+# Members in each DataFrame benchmark
+MEMBER_COUNTS = [ 10, 100, 1000, 10000 ]
+
+# Fast operations are looped until each timing takes at least this long
+MINIMUM_SECONDS = 0.02
+
+# (name, kind, function) tuples registered with @benchmark
+BENCHMARKS = []
+
+def benchmark(kind, name=None):
+    '''Register a benchmark of a series (`kind` is 'series') or a group
+    ('frame'), named after the function unless `name` is given. The
+    function is called with the size (points or members) and the number of
+    points per member, and returns a tuple of (operation, items) where
+    `operation` is the function to time and `items` is the number of points
+    it processes.'''
+    def register(fn):
+        BENCHMARKS.append((name or fn.__name__, kind, fn))
+        return fn
+    return register
+
+def make_arrays(size, seed=0):
+    '''Get timestamps at one minute intervals and random values.'''
+    random = numpy.random.RandomState(seed)
+    timestamps = 1400000000000 + 60000 * numpy.arange(size, dtype=numpy.int64)
+    return timestamps, random.standard_normal(size) + 100
+
+def make_series(size, seed=0):
+    return TimeSeries._from_arrays(*make_arrays(size, seed))
+
+def make_frame(members, points):
+    return DataFrame(('series%d' % member, make_series(points, member))
+        for member in xrange(members))
+
+@benchmark('series')
+def construct_from_tuples(size, points):
+    timestamps, values = make_arrays(size)
+    tuples = zip(timestamps.tolist(), values.tolist())
+    tuples.reverse()
+    return lambda: TimeSeries(tuples), size
+
+@benchmark('series')
+def construct_from_sorted_tuples(size, points):
+    timestamps, values = make_arrays(size)
+    tuples = zip(timestamps.tolist(), values.tolist())
+    return lambda: TimeSeries(tuples), size
+
+@benchmark('series')
+def construct_from_buffer(size, points):
+    timestamps, values = make_arrays(size)
+    records = numpy.empty(size, dtype=[ ('timestamp', '<i8'), ('value', '<f8') ])
+    records['timestamp'], records['value'] = timestamps, values
+    buffer = records.tobytes()
+    return lambda: TimeSeries.from_buffer(buffer), size
+
+@benchmark('series')
+def timestamps(size, points):
+    series = make_series(size)
+    return lambda: series.timestamps, size
+
+@benchmark('series')
+def values(size, points):
+    series = make_series(size)
+    return lambda: series.values, size
+
+@benchmark('series')
+def to_datetime64(size, points):
+    timestamps = make_arrays(size)[0]
+    return lambda: dates.to_datetime64(timestamps), size
+
+@benchmark('series')
+def getitem(size, points):
+    series = make_series(size)
+    keys = numpy.random.RandomState(0).choice(series._timestamps, 1000).tolist()
+    def lookup():
+        for key in keys:
+            series[key]
+    return lookup, len(keys)
+
+@benchmark('series')
+def getitem_slice(size, points):
+    series = make_series(size)
+    start, stop = series._timestamps[size // 4], series._timestamps[3 * size // 4]
+    return lambda: series[start:stop], 1
+
+def arithmetic(fn, scalar=False):
+    def operation(size, points):
+        left = make_series(size)
+        right = 3.0 if scalar else make_series(size, 1)
+        return lambda: fn(left, right), size
+    return operation
+
+for name, fn in (('add', lambda a, b: a + b), ('sub', lambda a, b: a - b),
+        ('mul', lambda a, b: a * b), ('div', lambda a, b: a / b),
+        ('pow', lambda a, b: a ** b)):
+    benchmark('series', name)(arithmetic(fn))
+    benchmark('series', name + '_scalar')(arithmetic(fn, scalar=True))
+
+@benchmark('series')
+def add_misaligned(size, points):
+    left = make_series(size)
+    right = TimeSeries._from_arrays(left._timestamps[::2] + 1, left._values[::2])
+    return lambda: left + right, size
+
+@benchmark('series')
+def lazy_expression(size, points):
+    a, b, c = make_series(size), make_series(size, 1), make_series(size, 2)
+    return lambda: ((a.lazy() + b) * c / a - 1).evaluate(), size
+
+def moving_average(method):
+    def operation(size, points):
+        series = make_series(size)
+        return lambda: series.moving_average(100, method), size
+    return operation
+
+for name in ('simple', 'weighted', 'exponential', 'triangular'):
+    benchmark('series', 'moving_average_' + name)(
+        moving_average(getattr(TimeSeries, name.upper())))
+
+def rolling(statistic, **kwargs):
+    def operation(size, points):
+        series = make_series(size)
+        return lambda: statistic(series.rolling(**kwargs)), size
+    return operation
+
+for name, statistic in (('max', lambda rolling: rolling.max()),
+        ('std', lambda rolling: rolling.std()),
+        ('quantile', lambda rolling: rolling.quantile(0.99))):
+    benchmark('series', 'rolling_' + name)(rolling(statistic, window=100))
+    # make_series() has a point a minute, so this is also 100 points
+    benchmark('series', 'rolling_%s_duration' % name)(rolling(statistic,
+        duration=6000000))
+
+@benchmark('series')
+def rolling_quantile_wide(size, points):
+    # Quantiles are O(n log w), so a window of a tenth of the series should
+    # cost little more than the 100 point rolling_quantile
+    series = make_series(size)
+    return lambda: series.rolling(size // 10).quantile(0.99), size
+
+@benchmark('series')
+def trend(size, points):
+    series = make_series(size)
+    return lambda: series.trend(TimeSeries.CUBIC), size
+
+@benchmark('frame')
+def frame_timestamps(members, points):
+    frame = make_frame(members, points)
+    def operation():
+        frame._invalidate()
+        return frame.timestamps
+    return operation, members * points
+
+@benchmark('frame')
+def frame_str(members, points):
+    frame = make_frame(members, points)
+    def operation():
+        frame._invalidate()
+        return str(frame)
+    return operation, members * points
+
+@benchmark('frame')
+def frame_sum(members, points):
+    frame = make_frame(members, points)
+    def operation():
+        frame._invalidate()
+        return frame.sum()
+    return operation, members * points
+
+@benchmark('frame')
+def frame_trend(members, points):
+    frame = make_frame(members, points)
+    return lambda: frame.trend(), members * points
+
+def resident_memory():
+    '''Get the current resident memory of the process in bytes.'''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        return peak_memory()
+
+def reset_peak_memory():
+    '''Reset the peak resident memory of the process where Linux allows it.'''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+def peak_memory():
+    '''Get the peak resident memory of the process in bytes.'''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def time_loops(operation, loops):
+    start = timeit.default_timer()
+    for _ in xrange(loops):
+        operation()
+    return timeit.default_timer() - start
+
+def measure(fn, size, points, repeat):
+    '''Run a benchmark and return its result as a dict.'''
+    operation, items = fn(size, points)
+    gc.collect()
+    reset_peak_memory()
+    baseline = resident_memory()
+    loops = 1
+    while True:
+        seconds = time_loops(operation, loops)
+        if seconds >= MINIMUM_SECONDS:
+            break
+        loops *= 10
+    times = [ seconds ] + [ time_loops(operation, loops) for _ in xrange(repeat - 1) ]
+    times = [ seconds / loops for seconds in times ]
+    best = min(times)
+    return {
+        'seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        'loops': loops,
+        'items': items,
+        'throughput': items / best if best else None,
+        'peak_memory': max(0, peak_memory() - baseline),
+    }
+
+def run(fn, size, points, repeat):
+    '''Run a benchmark in a forked process where possible.'''
+    if not hasattr(os, 'fork'):
+        return measure(fn, size, points, repeat)
+    read, write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read)
+        try:
+            result = measure(fn, size, points, repeat)
+        except Exception as error:
+            result = { 'error': '%s: %s' % (type(error).__name__, error) }
+        with os.fdopen(write, 'w') as output:
+            json.dump(result, output)
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as source:
+        data = source.read()
+    _, status = os.waitpid(pid, 0)
+    if not data:
+        return { 'error': 'Benchmark process exited with status %d' % status }
+    return json.loads(data)
+
+def revision():
+    try:
+        return subprocess.check_output([ 'git', 'rev-parse', 'HEAD' ],
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    '''Print the change in time of each benchmark against a baseline run and
+    return the number that got slower by more than `threshold`.'''
+    previous = dict(((result['name'], result['size']), result)
+        for result in baseline['results'] if 'seconds' in result)
+    regressions = 0
+    for result in results:
+        old = previous.get((result['name'], result['size']))
+        if old is None or 'seconds' not in result:
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else 1.0
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            regressions += 1
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        sys.stderr.write('%-32s %9d %8.2fx%s\n' % (result['name'], result['size'],
+            ratio, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', help='write JSON results to this path')
+    parser.add_argument('--compare', help='compare with JSON results from an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.2,
+        help='ratio of times counted as a regression by --compare')
+    parser.add_argument('--filter', default='',
+        help='only run benchmarks with names containing this string')
+    parser.add_argument('--max-size', type=int, default=SERIES_SIZES[-1],
+        help='largest series to benchmark')
+    parser.add_argument('--max-members', type=int, default=MEMBER_COUNTS[-1],
+        help='largest group to benchmark')
+    parser.add_argument('--points', type=int, default=100,
+        help='points in each member of a group')
+    parser.add_argument('--repeat', type=int, default=3,
+        help='times to run each operation, keeping the fastest')
+    options = parser.parse_args()
+
+    results = []
+    for name, kind, fn in BENCHMARKS:
+        if options.filter not in name:
+            continue
+        if kind == 'series':
+            sizes = [ size for size in SERIES_SIZES if size <= options.max_size ]
+        else:
+            sizes = [ size for size in MEMBER_COUNTS if size <= options.max_members ]
+        for size in sizes:
+            result = { 'name': name, 'kind': kind, 'size': size }
+            if kind == 'frame':
+                result['points'] = options.points
+            result.update(run(fn, size, options.points, options.repeat))
+            results.append(result)
+            if 'error' in result:
+                sys.stderr.write('%-32s %9d  %s\n' % (name, size, result['error']))
+            else:
+                sys.stderr.write('%-32s %9d %12.6fs %14.0f/s %10.1fMB\n' % (name, size,
+                    result['seconds'], result['throughput'] or 0,
+                    result['peak_memory'] / 1048576.0))
+
+    report = {
+        'revision': revision(),
+        'date': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    if options.compare:
+        with open(options.compare) as source:
+            baseline = json.load(source)
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
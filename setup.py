@@ -10,7 +10,7 @@ setup(
     description = "Time series modelling and analysis",
     license = "MIT",
     url = "https://github.com/chriso/timeseries",
-    install_requires = [],
+    install_requires = [ "numpy" ],
     packages = find_packages()
 )
 
@@ -0,0 +1,55 @@
+import numpy
+from unittest import TestCase
+from timeseries import TimeSeries, DataFrame, WorkerPool
+from timeseries.backtest import cut_points, forecast_errors
+
+class TestBacktest(TestCase):
+
+    def setUp(self):
+        self.series = TimeSeries([ (i, 10 + 2 * i + i % 3) for i in range(30) ])
+        self.methods = [ TimeSeries.SES, TimeSeries.HOLT ]
+
+    def test_cut_points(self):
+        self.assertListEqual(cut_points(30, 3, 4), [ 18, 21, 24, 27 ])
+        self.assertListEqual(cut_points(30, 3, 3, step=1), [ 25, 26, 27 ])
+        with self.assertRaises(ArithmeticError):
+            cut_points(10, 3, 3)
+        with self.assertRaises(ValueError):
+            cut_points(10, 0, 3)
+
+    def test_forecast_errors(self):
+        errors = forecast_errors(numpy.array([ 2.0, 4.0, 0.0 ]), numpy.array([ 3.0, 2.0, 1.0 ]))
+        self.assertAlmostEquals(errors['mae'], 4 / 3.0)
+        self.assertAlmostEquals(errors['mape'], 50)
+        self.assertAlmostEquals(errors['rmse'], 2 ** 0.5)
+
+    def test_backtest(self):
+        result = self.series.backtest(3, folds=4, methods=self.methods)
+        self.assertListEqual(result.origins, [ 17, 20, 23, 26 ])
+        self.assertEquals(len(result.errors[TimeSeries.SES]), 4)
+        self.assertEquals(result.best(), TimeSeries.HOLT)
+        self.assertEquals(result.best('mape'), TimeSeries.HOLT)
+        self.assertDictEqual(result.failures, {})
+        # The fold forecasts the points after its origin from a prefix
+        fold = self.series[:18].forecast(3, method=TimeSeries.SES)
+        expected = forecast_errors(self.series._values[18:21], fold._values)
+        self.assertDictEqual(result.errors[TimeSeries.SES][0], expected)
+
+    def test_failures(self):
+        result = self.series.backtest(3, methods=[ TimeSeries.SES, TimeSeries.HOLT_WINTERS ])
+        self.assertListEqual(result.errors[TimeSeries.HOLT_WINTERS], [ None ] * 3)
+        self.assertTrue(isinstance(result.failures[TimeSeries.HOLT_WINTERS, 0], ValueError))
+        self.assertTrue(numpy.isnan(result.mean()[TimeSeries.HOLT_WINTERS]))
+        self.assertEquals(result.best(), TimeSeries.SES)
+        self.assertTrue('ValueError' in str(result))
+
+    def test_parallel(self):
+        expected = self.series.backtest(3, methods=self.methods)
+        self.assertDictEqual(self.series.backtest(3, methods=self.methods,
+            workers=2).errors, expected.errors)
+        group = DataFrame(foo=self.series, bar=self.series * 2)
+        with WorkerPool(2, preload=False) as pool:
+            results = group.backtest(3, methods=self.methods, workers=pool)
+        self.assertListEqual(sorted(results), [ 'bar', 'foo' ])
+        self.assertDictEqual(results['foo'].errors, expected.errors)
+        self.assertEquals(results['bar'].best(), TimeSeries.HOLT)
@@ -0,0 +1,142 @@
+import math
+import pickle
+import numpy
+from unittest import TestCase
+from timeseries import TimeSeries, DataFrame, CompressedTimeSeries
+
+class TestCompression(TestCase):
+
+    def setUp(self):
+        count = 5000
+        timestamps = 1400000000000 + numpy.arange(count) * 1000
+        timestamps[100] += 3
+        timestamps[2000:] += 60000
+        values = numpy.round(50 + 10 * numpy.sin(numpy.arange(count) / 300.0), 1)
+        self.series = TimeSeries._from_arrays(timestamps, values)
+
+    def test_round_trip(self):
+        compressed = self.series.compress(chunk_size=512)
+        self.assertTrue(isinstance(compressed, CompressedTimeSeries))
+        self.assertEquals(len(compressed), len(self.series))
+        self.assertEquals(len(compressed.chunks), 10)
+        self.assertListEqual(compressed.timestamps, self.series.timestamps)
+        self.assertListEqual(compressed.values, self.series.values)
+        decompressed = compressed.decompress()
+        self.assertFalse(isinstance(decompressed, CompressedTimeSeries))
+        self.assertListEqual(decompressed.timestamps, self.series.timestamps)
+
+    def test_compression_ratio(self):
+        regular = TimeSeries(zip(range(0, 86400000, 1000), [ 42.5 ] * 86400)).compress()
+        self.assertTrue(regular.compression_ratio > 30)
+        self.assertTrue(self.series.compress().compression_ratio > 1.5)
+        self.assertEquals(CompressedTimeSeries([]).compression_ratio, 1.0)
+
+    def test_metric_compression_ratio(self):
+        # A day of per-second samples of a random walk recorded to 2 dp
+        random = numpy.random.RandomState(0)
+        timestamps = 1400000000000 + 1000 * numpy.arange(86400)
+        walk = 100 + numpy.cumsum(random.standard_normal(86400) * 0.1)
+        compressed = TimeSeries._from_arrays(timestamps, numpy.round(walk, 2)).compress()
+        self.assertTrue(compressed.compression_ratio > 8)
+        self.assertListEqual(compressed.values, numpy.round(walk, 2).tolist())
+        # Values with no short decimal form are XORed in the Gorilla style
+        compressed = TimeSeries._from_arrays(timestamps, walk).compress()
+        self.assertTrue(compressed.chunks[0][4] is None)
+        self.assertTrue(compressed.compression_ratio > 2)
+        self.assertListEqual(compressed.values, walk.tolist())
+
+    def test_methods(self):
+        compressed = self.series.compress()
+        series = self.series
+        self.assertListEqual((compressed + 1).points, (series + 1).points)
+        self.assertListEqual((compressed * series).points, (series * series).points)
+        self.assertListEqual(compressed.moving_average(10).values,
+            series.moving_average(10).values)
+        self.assertEquals(compressed[series.timestamps[42]], series.values[42])
+        compressed -= 1
+        self.assertTrue(isinstance(compressed, CompressedTimeSeries))
+        self.assertListEqual(compressed.points, (series - 1).points)
+
+    def test_lookup(self):
+        compressed = self.series.compress(chunk_size=512)
+        timestamps = self.series.timestamps
+        self.assertEquals(compressed[timestamps[1500]], self.series.values[1500])
+        self.assertEquals(compressed.asof(timestamps[512] - 1), self.series.asof(timestamps[512] - 1))
+        self.assertTrue(compressed.decoded_cache.peek(compressed, 'timestamps') is None)
+        with self.assertRaises(KeyError):
+            compressed.asof(timestamps[0] - 1)
+        with self.assertRaises(KeyError):
+            compressed[timestamps[0] + 1]
+        self.assertTrue(compressed._timestamps is compressed._timestamps)
+        self.assertEquals(compressed.asof(timestamps[-1] + 5), self.series.asof(timestamps[-1] + 5))
+        compressed.append(timestamps[-1] + 1000, 7)
+        self.assertEquals(compressed._timestamps[-1], timestamps[-1] + 1000)
+        self.assertEquals(compressed[timestamps[-1] + 1000], 7)
+
+    def test_decoded(self):
+        compressed = self.series.compress()
+        cache = CompressedTimeSeries.decoded_cache
+        size = compressed.compressed_size
+        timestamps = compressed._timestamps
+        self.assertEquals(compressed.compressed_size, size + 8 * len(compressed))
+        self.assertTrue(cache.peek(compressed, 'values') is None)
+        compressed.moving_average(3)
+        self.assertTrue(compressed._timestamps is timestamps)
+        self.assertEquals(compressed.compressed_size, size + 16 * len(compressed))
+        self.assertTrue(compressed.compression_ratio < 1)
+        with self.assertRaises(ValueError):
+            compressed._values[0] = 1
+        restored = pickle.loads(pickle.dumps(compressed))
+        self.assertEquals(restored.compressed_size, size)
+        self.assertListEqual(restored.points, self.series.points)
+        compressed.release()
+        self.assertEquals(compressed.compressed_size, size)
+        compressed.moving_average(3)
+        compressed += 1
+        self.assertEquals(compressed.compressed_size, size)
+        self.assertListEqual(compressed.values, (self.series + 1).values)
+
+    def test_decoded_cache_eviction(self):
+        cache = CompressedTimeSeries.decoded_cache
+        size = cache.size
+        cache.size = 16 * len(self.series)
+        try:
+            first, second = self.series.compress(), self.series.compress()
+            first.trend()
+            second.trend()
+            self.assertTrue(cache.peek(first, 'timestamps') is None)
+            self.assertTrue(cache.peek(first, 'values') is None)
+            self.assertFalse(cache.peek(second, 'values') is None)
+            used = cache.used
+            del second
+            self.assertEquals(cache.used, used - 16 * len(self.series))
+        finally:
+            cache.size = size
+
+    def test_special_values(self):
+        values = [ 1.5, float('nan'), float('-inf'), -0.0, 1e300, 5e-324 ]
+        compressed = CompressedTimeSeries(zip(range(6), values))
+        self.assertTrue(math.isnan(compressed.values[1]))
+        self.assertListEqual(compressed.values[2:], values[2:])
+        self.assertEquals(math.copysign(1, compressed.values[3]), -1)
+        compressed = CompressedTimeSeries(zip(range(3), [ 1.5, -0.0, 2.25 ]))
+        self.assertEquals(math.copysign(1, compressed.values[1]), -1)
+
+    def test_append(self):
+        compressed = CompressedTimeSeries([ (1, 2) ], chunk_size=4)
+        for x in range(2, 11):
+            compressed.append(x, x * 0.5)
+        compressed.extend([ (11, 1), (12, 2) ])
+        self.assertEquals(len(compressed.chunks), 3)
+        self.assertListEqual(compressed.points,
+            [ (1, 2) ] + [ (x, x * 0.5) for x in range(2, 11) ] + [ (11, 1), (12, 2) ])
+        compressed.extend(dict((x * 60000, x) for x in range(1, 20)))
+        self.assertListEqual(compressed.values[-19:], range(1, 20))
+        with self.assertRaises(ValueError):
+            compressed.append(5, 0)
+
+    def test_load(self):
+        series = CompressedTimeSeries([ (3, 1), (1, 2) ])
+        self.assertListEqual(series.points, [ (1, 2), (3, 1) ])
+        group = DataFrame(a=series, b=TimeSeries([ (2, 5) ]))
+        self.assertListEqual(group.sum().points, [ (1, 2), (2, 5), (3, 1) ])
@@ -0,0 +1,98 @@
+import os
+import time
+import numpy
+from datetime import datetime, timedelta, tzinfo
+from unittest import TestCase
+from timeseries import TimeSeries, DataFrame
+from timeseries.dates import UTC, FixedOffset, to_datetime64, format_dates, \
+    transitions
+
+class Shifting(tzinfo):
+    '''A timezone that moves from UTC to UTC+01:30 at 1970-01-02 00:30.'''
+
+    def fromutc(self, date):
+        return date + self.utcoffset(date)
+
+    def utcoffset(self, date):
+        if date.replace(tzinfo=None) < datetime(1970, 1, 2, 0, 30):
+            return timedelta(0)
+        return timedelta(minutes=90)
+
+    def dst(self, date):
+        return timedelta(0)
+
+class TestDates(TestCase):
+
+    def setUp(self):
+        self.timestamps = numpy.arange(0, 2 * 86400000, 60000 * 7, dtype=numpy.int64)
+
+    def tearDown(self):
+        TimeSeries.timezone = None
+
+    def test_utc(self):
+        dates = to_datetime64(self.timestamps, UTC)
+        self.assertTrue(dates.base is self.timestamps)
+        with self.assertRaises(ValueError):
+            dates[0] = dates[1]
+        self.assertTrue(self.timestamps.flags.writeable)
+        self.assertEquals(dates.astype(object).tolist(), [
+            datetime(1970, 1, 1) + timedelta(milliseconds=timestamp)
+            for timestamp in self.timestamps.tolist() ])
+
+    def test_timezones(self):
+        for timezone in (FixedOffset(-150), Shifting()):
+            expected = [ datetime.fromtimestamp(timestamp / 1000.0, timezone).replace(tzinfo=None)
+                for timestamp in self.timestamps.tolist() ]
+            self.assertEquals(to_datetime64(self.timestamps, timezone).astype(object).tolist(),
+                expected)
+        self.assertEquals(FixedOffset(-150).tzname(None), 'UTC-02:30')
+
+    def test_transitions(self):
+        self.assertEquals(transitions(0, 10 * 86400000, Shifting()),
+            ([ 88200000 ], [ 0, 5400000 ]))
+        self.assertEquals(transitions(0, 86400000, Shifting()), ([], [ 0 ]))
+
+    def test_local(self):
+        previous = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+        try:
+            # Covers the change from daylight saving time on 2014-11-02
+            timestamps = numpy.arange(1414800000000, 1415100000000, 60000 * 7,
+                dtype=numpy.int64)
+            series = TimeSeries._from_arrays(timestamps, numpy.zeros(len(timestamps)))
+            self.assertEquals(series.dates, [ datetime.fromtimestamp(timestamp / 1000.0)
+                for timestamp in timestamps.tolist() ])
+        finally:
+            if previous is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = previous
+            time.tzset()
+
+    def test_cache(self):
+        series = TimeSeries([ (1234000, 54), (5678500, 100) ])
+        TimeSeries.timezone = UTC
+        dates = series.datetime64
+        self.assertTrue(series.datetime64 is dates)
+        self.assertListEqual(format_dates(dates).tolist(),
+            [ '1970-01-01 00:20:34.000', '1970-01-01 01:34:38.500' ])
+        series.append(7200000, 1)
+        self.assertEquals(series.dates[-1], datetime(1970, 1, 1, 2))
+        TimeSeries.timezone = FixedOffset(60)
+        self.assertEquals(series.dates[-1], datetime(1970, 1, 1, 3))
+        self.assertListEqual(format_dates(series[:6000000].datetime64).tolist(),
+            [ '1970-01-01 01:20:34.000', '1970-01-01 02:34:38.500' ])
+        self.assertListEqual(format_dates(to_datetime64([ 0, 60000 ], UTC)).tolist(),
+            [ '1970-01-01 00:00:00', '1970-01-01 00:01:00' ])
+        group = DataFrame(a=series)
+        dates = group.datetime64
+        self.assertTrue(group.datetime64 is dates)
+        group['b'] = TimeSeries([ (0, 1) ])
+        self.assertEquals(group.datetime64[0], numpy.datetime64('1970-01-01T01:00'))
+
+    def test_str(self):
+        TimeSeries.timezone = UTC
+        series = TimeSeries([ (0, 1), (60000, 2) ])
+        self.assertTrue('1970-01-01 00:01:00 2.0' in str(series))
+        self.assertTrue('1970-01-01 00:01:00 2.0' in str(DataFrame(a=series)))
@@ -0,0 +1,66 @@
+from unittest import TestCase
+from timeseries import TimeSeries, Registry, instrument
+from timeseries import instrumentation
+
+class TestInstrumentation(TestCase):
+
+    def test_instrument(self):
+        series = TimeSeries(zip(range(10), range(10)))
+        with instrument() as registry:
+            series.trend()
+            series.moving_average(3)
+            series + series
+            TimeSeries([ (2, 1), (1, 2) ])
+            series[2:5]
+        self.assertEquals(registry['trend'].calls, 1)
+        self.assertEquals(registry['trend'].points, 10)
+        self.assertEquals(registry['moving_average'].points, 10)
+        self.assertEquals(registry['align'].points, 20)
+        # The trend, the moving average, the sum, the new series and the slice
+        self.assertEquals(registry['construct'].calls, 5)
+        self.assertEquals(registry['construct'].points, 10 + 8 + 10 + 2 + 3)
+        self.assertTrue(registry['trend'].seconds > 0)
+        self.assertFalse('forecast' in registry)
+        self.assertTrue(str(registry).startswith('Operation'))
+        series.trend()
+        self.assertEquals(registry['trend'].calls, 1)
+        self.assertTrue(instrumentation.active is None)
+
+    def test_iterable_points(self):
+        with instrument() as registry:
+            series = TimeSeries((t, t * 2) for t in range(5))
+        self.assertEquals(list(series), [ (t, t * 2) for t in range(5) ])
+        self.assertEquals(registry['construct'].calls, 1)
+        self.assertEquals(registry['construct'].points, 5)
+
+    def test_nested(self):
+        series = TimeSeries([ (1, 2), (2, 4) ])
+        outer = Registry()
+        with instrument(outer):
+            with instrument() as inner:
+                series.trend()
+            series.trend()
+        self.assertEquals(inner['trend'].calls, 1)
+        self.assertEquals(outer['trend'].calls, 1)
+        outer.reset()
+        self.assertFalse('trend' in outer)
+
+    def test_span(self):
+        ticks = iter(range(0, 100, 5))
+        with instrument(Registry(timer=lambda: next(ticks))) as registry:
+            with instrumentation.span('convert', points=3) as measurement:
+                measurement.bytes = 24
+        self.assertEquals(registry['convert'].seconds, 5)
+        self.assertEquals(registry['convert'].points, 3)
+        self.assertEquals(registry['convert'].bytes, 24)
+        with instrumentation.span('convert') as measurement:
+            measurement.bytes = 8
+        self.assertEquals(registry['convert'].calls, 1)
+        self.assertTrue(measurement is instrumentation.NULL_SPAN)
+        self.assertFalse(hasattr(measurement, 'bytes'))
+
+    def test_errors(self):
+        with instrument() as registry:
+            with self.assertRaises(ArithmeticError):
+                TimeSeries([]).trend()
+        self.assertEquals(registry['trend'].calls, 1)
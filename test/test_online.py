@@ -0,0 +1,64 @@
+import numpy
+from unittest import TestCase
+from timeseries import TimeSeries, RunningMovingAverage, RecursiveTrend
+
+class TestOnline(TestCase):
+
+    def test_running_moving_average(self):
+        points = [ (x, x * x % 7) for x in range(1, 50) ]
+        expected = TimeSeries(points).moving_average(5).round(6).values
+        average = RunningMovingAverage(5)
+        values = [ average.update(x, y) for x, y in points ]
+        self.assertListEqual(values[:4], [ None ] * 4)
+        self.assertListEqual([ round(v, 6) for v in values[4:] ], expected)
+        self.assertEquals(average.timestamp, 49)
+
+    def test_running_moving_average_nonfinite(self):
+        points = list(enumerate([ 1, float('nan'), 2, 3, 4, float('inf'), 5, 6, 7, 8 ]))
+        expected = TimeSeries(points).moving_average(3).values
+        average = RunningMovingAverage(3)
+        values = [ average.update(x, y) for x, y in points ][2:]
+        numpy.testing.assert_array_equal(values, expected)
+        self.assertEquals(values[2], 3.0)
+
+    def test_invalid_running_moving_average(self):
+        with self.assertRaises(ValueError):
+            RunningMovingAverage(0)
+
+    def test_recursive_trend(self):
+        points = [ (1400000000000 + x * 60000, 32 + x * 0.5 - x * x * 0.01 + x % 3)
+            for x in range(100) ]
+        trend = RecursiveTrend(order=TimeSeries.QUADRATIC)
+        with self.assertRaises(ArithmeticError):
+            trend.coefficients
+        trend.extend(points)
+        minutes = TimeSeries([ ((x - points[0][0]) // 60000, y) for x, y in points ])
+        expected = minutes.trend(order=TimeSeries.QUADRATIC).values
+        for x in range(0, 100, 10):
+            self.assertAlmostEqual(trend.predict(points[x][0]), expected[x], places=6)
+        coefficients = trend.coefficients
+        self.assertAlmostEqual(numpy.polyval(coefficients, points[50][0]) / expected[50],
+            1, places=4)
+
+    def test_recursive_trend_long_stream(self):
+        # The first points span milliseconds and the stream two weeks, far
+        # beyond the scale the first points give
+        random = numpy.random.RandomState(0)
+        x = numpy.arange(20000, dtype=numpy.float64)
+        values = 1e-9 * (x - 5000) ** 3 - 1e-4 * x * x + x + random.standard_normal(20000)
+        timestamps = 1400000000000 + 60000 * numpy.arange(20000)
+        timestamps[1:4] = timestamps[0] + [ 10, 20, 30 ]
+        series = TimeSeries._from_arrays(timestamps, values)
+        trend = RecursiveTrend(order=TimeSeries.CUBIC)
+        trend.extend(zip(timestamps.tolist(), values.tolist()))
+        expected = series.trend(order=TimeSeries.CUBIC).values
+        for index in (0, 7000, 19999):
+            self.assertAlmostEqual(trend.predict(timestamps[index]), expected[index], places=6)
+
+    def test_recursive_trend_duplicates(self):
+        trend = RecursiveTrend(order=TimeSeries.LINEAR)
+        trend.extend([ (1, 1), (1, 3) ])
+        with self.assertRaises(ArithmeticError):
+            trend.predict(2)
+        trend.extend([ (2, 4), (3, 6) ])
+        self.assertAlmostEqual(trend.predict(4), 8)
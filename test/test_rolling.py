@@ -0,0 +1,87 @@
+import numpy
+from unittest import TestCase
+from timeseries import TimeSeries
+
+class TestRolling(TestCase):
+
+    def setUp(self):
+        self.series = TimeSeries([ (1, 4), (2, 8), (3, 6), (4, 2), (6, 5), (10, 9), (11, 1) ])
+
+    def test_count_window(self):
+        rolling = self.series.rolling(3)
+        self.assertListEqual(rolling.min().points,
+            [ (3, 4), (4, 2), (6, 2), (10, 2), (11, 1) ])
+        self.assertListEqual(rolling.max().points,
+            [ (3, 8), (4, 8), (6, 6), (10, 9), (11, 9) ])
+        self.assertListEqual(rolling.mean().round(6).points,
+            [ (3, 6), (4, 5.333333), (6, 4.333333), (10, 5.333333), (11, 5) ])
+        self.assertListEqual(rolling.std().round(6).points,
+            [ (3, 2), (4, 3.05505), (6, 2.081666), (10, 3.511885), (11, 4) ])
+        self.assertListEqual(rolling.var(ddof=0).round(6).points,
+            [ (3, 2.666667), (4, 6.222222), (6, 2.888889), (10, 8.222222), (11, 10.666667) ])
+        self.assertListEqual(rolling.quantile(0.5).points,
+            [ (3, 6), (4, 6), (6, 5), (10, 5), (11, 5) ])
+        self.assertListEqual(rolling.quantile(0.25).points,
+            [ (3, 5), (4, 4), (6, 3.5), (10, 3.5), (11, 3) ])
+        self.assertListEqual(rolling.zscore().round(6).points,
+            [ (3, 0), (4, -1.091089), (6, 0.320256), (10, 1.044074), (11, -1) ])
+
+    def test_time_window(self):
+        rolling = self.series.rolling(duration=3)
+        self.assertListEqual(rolling.count().points,
+            [ (1, 1), (2, 2), (3, 3), (4, 3), (6, 2), (10, 1), (11, 2) ])
+        self.assertListEqual(rolling.max().points,
+            [ (1, 4), (2, 8), (3, 8), (4, 8), (6, 5), (10, 9), (11, 9) ])
+        self.assertListEqual(rolling.min().points,
+            [ (1, 4), (2, 4), (3, 4), (4, 2), (6, 2), (10, 9), (11, 1) ])
+        self.assertListEqual(rolling.quantile(0.5).points,
+            [ (1, 4), (2, 6), (3, 6), (4, 6), (6, 3.5), (10, 9), (11, 5) ])
+        std = rolling.std().round(6).points
+        self.assertTrue(numpy.isnan(std[0][1]) and numpy.isnan(std[5][1]))
+        self.assertListEqual(std[1:5] + std[6:], [ (2, 2.828427), (3, 2), (4, 3.05505),
+            (6, 2.12132), (11, 5.656854) ])
+
+    def test_brute_force(self):
+        random = numpy.random.RandomState(0)
+        timestamps = numpy.cumsum(random.randint(0, 4, 500)).astype(numpy.int64)
+        values = random.standard_normal(500) * 10 + 1000
+        series = TimeSeries._from_arrays(timestamps, values)
+        for rolling in (series.rolling(5), series.rolling(100), series.rolling(duration=50)):
+            windows = [ values[start:stop] for start, stop in zip(rolling.starts, rolling.stops) ]
+            for statistic, fn in ((rolling.max(), numpy.max), (rolling.min(), numpy.min),
+                    (rolling.quantile(0.9), lambda window: numpy.percentile(window, 90)),
+                    (rolling.var(ddof=0), numpy.var)):
+                self.assertTrue(numpy.array_equal(statistic._timestamps,
+                    timestamps[rolling.stops - 1]))
+                expected = [ fn(window) for window in windows ]
+                self.assertTrue(numpy.allclose(statistic._values, expected, rtol=1e-7))
+
+    def test_quantile_wide_window(self):
+        values = numpy.random.RandomState(0).standard_normal(100000)
+        series = TimeSeries._from_arrays(numpy.arange(100000), values)
+        expected = numpy.percentile(values[-50000:], 90)
+        self.assertAlmostEquals(series.rolling(50000).quantile(0.9).values[-1], expected)
+
+    def test_nan(self):
+        series = TimeSeries([ (1, 1), (2, float('nan')), (3, 3), (4, 4), (5, 5) ])
+        for rolling in (series.rolling(2), series.rolling(duration=2)):
+            for statistic in (rolling.min(), rolling.max(), rolling.std(),
+                    rolling.quantile(0.5), rolling.zscore()):
+                values = statistic.values
+                self.assertTrue(numpy.isnan(values[-4]) and numpy.isnan(values[-3]))
+                self.assertFalse(numpy.isnan(values[-1]))
+
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            self.series.rolling()
+        with self.assertRaises(TypeError):
+            self.series.rolling(3, duration=3)
+        with self.assertRaises(ValueError):
+            self.series.rolling(0)
+        with self.assertRaises(ValueError):
+            self.series.rolling(duration=0)
+        with self.assertRaises(ArithmeticError):
+            self.series.rolling(8)
+        with self.assertRaises(ValueError):
+            self.series.rolling(3).quantile(2)
+        self.assertListEqual(TimeSeries([]).rolling(duration=5).max().points, [])
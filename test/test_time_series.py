@@ -1,5 +1,15 @@
+import os
+import copy
+import math
+import numpy
+import pickle
+import shutil
+import operator
+import tempfile
+from StringIO import StringIO
+from multiprocessing import Pool
 from unittest import TestCase
-from timeseries import TimeSeries, DataFrame
+from timeseries import TimeSeries, DataFrame, ResultCache
 from datetime import datetime
 
 class TestTimeSeries(TestCase):
@@ -33,6 +43,24 @@ class TestTimeSeries(TestCase):
         self.assertListEqual(series.timestamps, [2, 3, 4])
         self.assertListEqual(series.values, [100, 54, 32])
 
+    def test_stable_sort(self):
+        series = TimeSeries([ (3, 1), (1, 9), (3, 0), (1, 5) ])
+        self.assertListEqual(series.points, [ (1, 9), (1, 5), (3, 1), (3, 0) ])
+        timestamps = numpy.arange(5, dtype=numpy.int64)
+        series = TimeSeries._from_arrays(timestamps, numpy.ones(5))
+        self.assertTrue(series._timestamps is timestamps)
+
+    def test_columnar_storage(self):
+        series = TimeSeries([ (3, 4), (1, 2), (5, 6) ])
+        self.assertEquals(series._timestamps.dtype.name, 'int64')
+        self.assertEquals(series._values.dtype.name, 'float64')
+        self.assertListEqual(series.points, [ (1, 2), (3, 4), (5, 6) ])
+        series.points = [ (2, 1), (0, 3) ]
+        self.assertListEqual(series.timestamps, [0, 2])
+        self.assertListEqual(series.values, [3, 1])
+        with self.assertRaises(ValueError):
+            TimeSeries._from_arrays([1, 2], [3])
+
     def test_interval(self):
         series = TimeSeries([])
         self.assertEquals(series.interval, None)
@@ -40,6 +68,99 @@ class TestTimeSeries(TestCase):
         self.assertEquals(series.interval, None)
         series = TimeSeries([ (1, 2), (3, 4) ])
         self.assertEquals(series.interval, 2)
+        series = TimeSeries([ (0, 1), (7, 1), (7, 2), (10, 1), (20, 1), (30, 1), (50, 1) ])
+        self.assertEquals(series.interval, 10)
+        self.assertEquals(TimeSeries([ (1, 2), (1, 3) ]).interval, None)
+
+    def test_regularity(self):
+        series = TimeSeries([ (0, 1), (10, 1), (10, 2), (20, 1), (50, 1), (55, 1), (70, 1) ])
+        self.assertDictEqual(series.regularity(), { 'interval': 10, 'regular': False,
+            'steps': 6, 'duplicates': 1, 'gaps': 1, 'missing': 2, 'irregular': 2 })
+        self.assertTrue(TimeSeries(zip(range(0, 100, 5), range(20))).regularity()['regular'])
+        self.assertEquals(TimeSeries([]).regularity()['steps'], 0)
+
+    def test_regularize(self):
+        series = TimeSeries([ (0, 1), (10, 2), (24, 3), (26, 4), (50, 6) ])
+        regular = series.regularize(10)
+        self.assertListEqual(regular.timestamps, [ 0, 10, 20, 30, 40, 50 ])
+        self.assertTrue(math.isnan(regular.values[4]))
+        self.assertListEqual(regular.values[:4], [ 1, 2, 3, 4 ])
+        regular = series.regularize(10, fill=TimeSeries.FFILL)
+        self.assertListEqual(regular.values, [ 1, 2, 3, 4, 4, 6 ])
+        regular = series.regularize(10, fill=TimeSeries.INTERPOLATE)
+        self.assertListEqual(regular.values, [ 1, 2, 3, 4, 5, 6 ])
+        regular = series.regularize(20, fill=0)
+        self.assertListEqual(regular.points, [ (0, 1), (20, 4), (40, 0), (60, 6) ])
+        self.assertListEqual(TimeSeries([]).regularize(10).points, [])
+        self.assertListEqual(TimeSeries([ (5, 1), (5, 2) ]).regularize().points, [ (5, 2) ])
+        regular = TimeSeries([ (3, 1), (13, 2), (43, 3), (53, 4) ]).regularize()
+        self.assertListEqual(regular.timestamps, [ 3, 13, 23, 33, 43, 53 ])
+        regular = series.regularize(10.0)
+        self.assertEquals(regular._timestamps.dtype, numpy.int64)
+        self.assertListEqual(regular.timestamps, [ 0, 10, 20, 30, 40, 50 ])
+        for interval in (0, 2.5):
+            with self.assertRaises(ValueError):
+                series.regularize(interval)
+        group = DataFrame(a=series, b=TimeSeries([ (0, 1), (20, 3) ]))
+        regular = group.regularize(10, fill=TimeSeries.INTERPOLATE)
+        self.assertListEqual(regular.b.points, [ (0, 1), (10, 2), (20, 3) ])
+
+    def test_append(self):
+        series = TimeSeries([ (1, 2) ])
+        view = series[:]
+        for x in range(2, 40):
+            series.append(x, x * 2)
+        self.assertListEqual(series.points, [ (x, x * 2) for x in range(1, 40) ])
+        self.assertListEqual(view.points, [ (1, 2) ])
+        series.append(39, 0)
+        self.assertEquals(series.points[-1], (39, 0))
+        with self.assertRaises(ValueError):
+            series.append(38, 0)
+        empty = TimeSeries([])
+        empty.append(5, 1)
+        self.assertListEqual(empty.points, [ (5, 1) ])
+
+    def test_append_after_update(self):
+        series = TimeSeries([ (1, 2) ])
+        series.append(2, 3)
+        copy = series + 1
+        series += 1
+        series.append(3, 4)
+        copy.append(3, 0)
+        self.assertListEqual(series.points, [ (1, 3), (2, 4), (3, 4) ])
+        self.assertListEqual(copy.points, [ (1, 3), (2, 4), (3, 0) ])
+
+    def test_append_to_copy(self):
+        series = TimeSeries([ (1, 2) ])
+        series.append(2, 3)
+        shallow = copy.copy(series)
+        series.append(3, 4)
+        shallow.append(3, 0)
+        shallow.append(4, 0)
+        series.append(4, 5)
+        self.assertListEqual(series.points, [ (1, 2), (2, 3), (3, 4), (4, 5) ])
+        self.assertListEqual(shallow.points, [ (1, 2), (2, 3), (3, 0), (4, 0) ])
+        restored = pickle.loads(pickle.dumps(series, pickle.HIGHEST_PROTOCOL))
+        self.assertFalse(hasattr(restored, '_buffers'))
+        restored.append(5, 6)
+        self.assertListEqual(series.points[-1:], [ (4, 5) ])
+        self.assertListEqual(restored.points[-2:], [ (4, 5), (5, 6) ])
+
+    def test_extend(self):
+        series = TimeSeries([ (1, 2) ])
+        series.extend([ (2, 3), (3, 4) ])
+        series.extend({ 4: 5 })
+        series.extend([])
+        self.assertListEqual(series.points, [ (1, 2), (2, 3), (3, 4), (4, 5) ])
+        with self.assertRaises(ValueError):
+            series.extend([ (6, 1), (5, 1) ])
+        with self.assertRaises(ValueError):
+            series.extend([ (3, 1) ])
+        self.assertEquals(len(series), 4)
+        start = 1420070400000
+        series = TimeSeries([ (start, 0) ])
+        series.extend(dict((start + x * 60000, x) for x in range(1, 20)))
+        self.assertListEqual(series.values, range(20))
 
     def test_map(self):
         series = TimeSeries([ (1, 2), (3, 4), (5, 6) ])
@@ -71,6 +192,32 @@ class TestTimeSeries(TestCase):
         with self.assertRaises(KeyError):
             foo = series[4]
 
+    def test_lookup(self):
+        series = TimeSeries([ (10, 1), (20, 2), (30, 3) ])
+        self.assertEquals(series.asof(25), (20, 2))
+        self.assertEquals(series.asof(30), (30, 3))
+        self.assertEquals(series.asof(99), (30, 3))
+        with self.assertRaises(KeyError):
+            series.asof(5)
+        self.assertEquals(series.nearest(5), (10, 1))
+        self.assertEquals(series.nearest(15), (10, 1))
+        self.assertEquals(series.nearest(16), (20, 2))
+        self.assertEquals(series.nearest(99), (30, 3))
+        with self.assertRaises(KeyError):
+            TimeSeries([]).nearest(1)
+        with self.assertRaises(KeyError):
+            TimeSeries([])[1]
+
+    def test_slicing(self):
+        series = TimeSeries([ (10, 1), (20, 2), (30, 3), (40, 4) ])
+        self.assertListEqual(series[20:40].points, [ (20, 2), (30, 3) ])
+        self.assertListEqual(series[15:].timestamps, [20, 30, 40])
+        self.assertListEqual(series[:30].timestamps, [10, 20])
+        self.assertListEqual(series[50:60].points, [])
+        self.assertTrue(series[20:40]._values.base is not None)
+        with self.assertRaises(ValueError):
+            series[10:40:2]
+
     def test_simple_moving_average(self):
         points = [1, 2, 3, 4, 5, 6]
         series = TimeSeries(zip(points, points))
@@ -79,6 +226,62 @@ class TestTimeSeries(TestCase):
         ma = series.moving_average(5).round()
         self.assertListEqual(ma.points, [ (5, 3), (6, 4) ])
 
+    def test_moving_average_methods(self):
+        values = [ 4, 8, 1, 9, 3, 7, 2, 6 ]
+        series = TimeSeries(zip(range(1, 9), values))
+        ma = series.moving_average(3, method=TimeSeries.WEIGHTED).round(6)
+        expected = [ round((a + 2 * b + 3 * c) / 6.0, 6) for a, b, c in
+            zip(values, values[1:], values[2:]) ]
+        self.assertListEqual(ma.timestamps, range(3, 9))
+        self.assertListEqual(ma.values, expected)
+        ma = series.moving_average(4, method=TimeSeries.TRIANGULAR).round(6)
+        expected = [ round((a + 2 * b + 2 * c + d) / 6.0, 6) for a, b, c, d in
+            zip(values, values[1:], values[2:], values[3:]) ]
+        self.assertListEqual(ma.timestamps, range(4, 9))
+        self.assertListEqual(ma.values, expected)
+        ma = series.moving_average(3, method=TimeSeries.EXPONENTIAL).round(6)
+        expected = [ sum(values[:3]) / 3.0 ]
+        for value in values[3:]:
+            expected.append(0.5 * value + 0.5 * expected[-1])
+        self.assertListEqual(ma.timestamps, range(3, 9))
+        self.assertListEqual(ma.values, [ round(value, 6) for value in expected ])
+
+    def test_wide_moving_averages(self):
+        values = [ (x * 7919) % 101 + 1000 for x in range(3000) ]
+        series = TimeSeries(zip(range(3000), values))
+        window = 200
+        ma = series.moving_average(window, method=TimeSeries.WEIGHTED)
+        weights = numpy.arange(window, 0, -1, dtype=float)
+        expected = numpy.convolve(values, weights / weights.sum(), 'valid')
+        self.assertTrue(numpy.allclose(ma.values, expected, rtol=0, atol=1e-9))
+        ma = series.moving_average(window, method=TimeSeries.EXPONENTIAL)
+        alpha = 2.0 / (window + 1)
+        expected = [ numpy.mean(values[:window]) ]
+        for value in values[window:]:
+            expected.append(alpha * value + (1 - alpha) * expected[-1])
+        self.assertTrue(numpy.allclose(ma.values, expected, rtol=0, atol=1e-9))
+
+    def test_moving_average_nan(self):
+        values = numpy.array([ (x * 7919) % 101 + 1000 for x in range(3000) ], dtype=float)
+        values[100] = numpy.nan
+        series = TimeSeries._from_arrays(numpy.arange(3000), values)
+        for window in (64, 65):
+            for method in (TimeSeries.SIMPLE, TimeSeries.WEIGHTED, TimeSeries.TRIANGULAR):
+                ma = numpy.array(series.moving_average(window, method=method).values)
+                missing = numpy.isnan(ma)
+                self.assertEquals(missing.sum(), window)
+                self.assertTrue(missing[100 - window + 1:101].all())
+            weights = numpy.arange(window, 0, -1, dtype=float)
+            expected = numpy.convolve(values, weights / weights.sum(), 'valid')
+            ma = series.moving_average(window, method=TimeSeries.WEIGHTED).values
+            self.assertTrue(numpy.allclose(ma, expected, rtol=0, atol=1e-9, equal_nan=True))
+            ma = numpy.array(series.moving_average(window, method=TimeSeries.EXPONENTIAL).values)
+            self.assertListEqual(numpy.flatnonzero(numpy.isnan(ma)).tolist(), [ 100 - window + 1 ])
+            skipped = numpy.delete(values, 100)
+            expected = TimeSeries(zip(range(2999), skipped)).moving_average(window,
+                method=TimeSeries.EXPONENTIAL).values
+            self.assertTrue(numpy.allclose(numpy.delete(ma, 100 - window + 1), expected))
+
     def test_invalid_moving_average(self):
         series = TimeSeries([])
         with self.assertRaises(ArithmeticError):
@@ -86,6 +289,40 @@ class TestTimeSeries(TestCase):
         series = TimeSeries([ (1, 1), (2, 2) ])
         with self.assertRaises(ArithmeticError):
             series.moving_average(3)
+        with self.assertRaises(ValueError):
+            series.moving_average(0)
+        with self.assertRaises(ValueError):
+            series.moving_average(2, method='huh')
+
+    def test_resample(self):
+        series = TimeSeries([ (0, 1), (400, 2), (999, 3), (1000, 4), (3500, 5),
+            (3999, 7) ])
+        resampled = series.resample(1000)
+        self.assertListEqual(resampled.points, [ (0, 2), (1000, 4), (3000, 6) ])
+        self.assertListEqual(series.resample(1000, 'sum').values, [ 6, 4, 12 ])
+        self.assertListEqual(series.resample(1000, 'min').values, [ 1, 4, 5 ])
+        self.assertListEqual(series.resample(1000, 'max').values, [ 3, 4, 7 ])
+        self.assertListEqual(series.resample(1000, 'first').values, [ 1, 4, 5 ])
+        self.assertListEqual(series.resample(1000, 'last').values, [ 3, 4, 7 ])
+        self.assertListEqual(series.resample(1000, 'count').values, [ 3, 1, 2 ])
+        self.assertListEqual(series.resample(2000, 'count').points,
+            [ (0, 4), (2000, 2) ])
+        self.assertListEqual(TimeSeries([]).resample(1000).points, [])
+        with self.assertRaises(ValueError):
+            series.resample(1000, 'median')
+        resampled = series.resample(2000.0)
+        self.assertEquals(resampled._timestamps.dtype, numpy.int64)
+        self.assertListEqual(resampled.timestamps, [ 0, 2000 ])
+        for interval in (0, 2.5):
+            with self.assertRaises(ValueError):
+                series.resample(interval)
+
+    def test_group_resample(self):
+        a = TimeSeries([ (0, 1), (500, 3), (1000, 5) ])
+        b = TimeSeries([ (1500, 2) ])
+        group = DataFrame(a=a, b=b).resample(1000, how='sum')
+        self.assertListEqual(group['a'].points, [ (0, 4), (1000, 5) ])
+        self.assertListEqual(group['b'].points, [ (1000, 2) ])
 
     def test_iteration(self):
         points = [ (1, 2), (3, 4), (5, 6) ]
@@ -140,6 +377,193 @@ class TestTimeSeries(TestCase):
         self.assertListEqual(forecast.timestamps, [6, 7, 8])
         #self.assertListEqual(forecast.values, [])
 
+    def test_ses_forecast(self):
+        series = TimeSeries([ (1, 5), (2, 5), (3, 5), (4, 5) ])
+        forecast = series.forecast(3, method=TimeSeries.SES).round()
+        self.assertListEqual(forecast.points, [ (5, 5), (6, 5), (7, 5) ])
+
+    def test_forecast_without_interval(self):
+        series = TimeSeries([ (1, 1), (1, 2) ])
+        # Checked before fitting, so this fails the same way without R
+        for method in (TimeSeries.SES, TimeSeries.ARIMA):
+            with self.assertRaises(ArithmeticError):
+                series.forecast(2, method=method)
+
+    def test_holt_forecast(self):
+        series = TimeSeries([ (x, 10 + 2 * x) for x in range(1, 21) ])
+        forecast = series.forecast(3, method=TimeSeries.HOLT).round()
+        self.assertListEqual(forecast.points, [ (21, 52), (22, 54), (23, 56) ])
+
+    def test_holt_winters_forecast(self):
+        pattern = [ 100, 200, 150, 50 ]
+        series = TimeSeries(zip(range(1, 25), pattern * 6))
+        forecast = series.forecast(4, method=TimeSeries.HOLT_WINTERS,
+            frequency=4).round()
+        self.assertListEqual(forecast.timestamps, [25, 26, 27, 28])
+        self.assertListEqual(forecast.values, pattern)
+        forecast = series.forecast(4, method=TimeSeries.HOLT_WINTERS_MULTIPLICATIVE,
+            frequency=4).round()
+        self.assertListEqual(forecast.values, pattern)
+        forecast = series.forecast(4, method=TimeSeries.HOLT_WINTERS,
+            frequency=4.0).round()
+        self.assertListEqual(forecast.values, pattern)
+
+    def test_long_holt_winters_forecast(self):
+        # Longer than the points searched, and not a whole number of seasons
+        pattern = [ 100, 200, 150, 50, 120 ]
+        series = TimeSeries(zip(range(3003), pattern * 600 + pattern[:3]))
+        forecast = series.forecast(5, method=TimeSeries.HOLT_WINTERS,
+            frequency=5).round()
+        self.assertListEqual(forecast.values, pattern[3:] + pattern[:3])
+
+    def test_invalid_holt_winters_forecast(self):
+        series = TimeSeries(zip(range(1, 6), [ 1, 2, 3, 4, 5 ]))
+        with self.assertRaises(ValueError):
+            series.forecast(3, method=TimeSeries.HOLT_WINTERS)
+        with self.assertRaises(ArithmeticError):
+            series.forecast(3, method=TimeSeries.HOLT_WINTERS, frequency=4)
+        series = TimeSeries(zip(range(1, 9), [ 1, 2, 3, 0 ] * 2))
+        with self.assertRaises(ArithmeticError):
+            series.forecast(3, method=TimeSeries.HOLT_WINTERS_MULTIPLICATIVE,
+                frequency=4)
+
+    def test_result_cache(self):
+        series = TimeSeries([ (1, 100), (2, 200), (3, 100), (4, 200), (5, 100) ])
+        directory = tempfile.mkdtemp()
+        umask = os.umask(027)
+        try:
+            TimeSeries.result_cache = ResultCache(size=1, directory=directory)
+            first = series.forecast(2, method=TimeSeries.SES)
+            again = series.forecast(2, TimeSeries.SES)
+            self.assertListEqual(again.points, first.points)
+            self.assertEquals(TimeSeries.result_cache.hits, 1)
+            self.assertEquals(TimeSeries.result_cache.misses, 1)
+            decomposed = series.decompose(2, native=True)
+            self.assertEquals(TimeSeries.result_cache.misses, 2)
+            for name in os.listdir(directory):
+                mode = os.stat(os.path.join(directory, name)).st_mode & 0777
+                self.assertEquals(mode, 0640)
+            TimeSeries.result_cache = ResultCache(directory=directory)
+            again = series.forecast(2, method=TimeSeries.SES)
+            self.assertListEqual(again.points, first.points)
+            again = series.decompose(2, native=True)
+            self.assertListEqual(sorted(again), sorted(decomposed))
+            self.assertListEqual(again['trend'].points, decomposed['trend'].points)
+            self.assertEquals(TimeSeries.result_cache.disk_hits, 2)
+            series.forecast(3, method=TimeSeries.SES)
+            self.assertEquals(TimeSeries.result_cache.misses, 1)
+        finally:
+            os.umask(umask)
+            TimeSeries.result_cache = None
+            shutil.rmtree(directory)
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'series.ts')
+            series = TimeSeries([ (1400000000000, 1.5), (1400000060000, -2) ])
+            umask = os.umask(022)
+            try:
+                series.save(path)
+            finally:
+                os.umask(umask)
+            self.assertEquals(os.stat(path).st_mode & 0777, 0644)
+            for memory_map in (True, False):
+                loaded = TimeSeries.load(path, memory_map=memory_map)
+                self.assertListEqual(loaded.points, series.points)
+            loaded += 1
+            loaded.append(1400000120000, 7)
+            self.assertListEqual(loaded.values, [ 2.5, -1, 7 ])
+            self.assertListEqual(TimeSeries.load(path).values, [ 1.5, -2 ])
+            TimeSeries([]).save(path)
+            self.assertListEqual(TimeSeries.load(path).points, [])
+            with open(path, 'wb') as output:
+                output.write('not a series file')
+            with self.assertRaises(ValueError):
+                TimeSeries.load(path)
+            os.mkdir(os.path.join(directory, 'taken'))
+            with self.assertRaises(OSError):
+                series.save(os.path.join(directory, 'taken'))
+            self.assertListEqual(sorted(os.listdir(directory)), [ 'series.ts', 'taken' ])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_group_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'group.ts')
+            group = DataFrame(foo=TimeSeries([ (1, 2), (3, 4) ]),
+                bar=TimeSeries([ (5, 6) ]), empty=TimeSeries([]))
+            group.save(path)
+            loaded = DataFrame.load(path)
+            self.assertListEqual(sorted(loaded), [ 'bar', 'empty', 'foo' ])
+            for name in group:
+                self.assertListEqual(loaded[name].points, group[name].points)
+            with self.assertRaises(ValueError):
+                TimeSeries.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_from_csv(self):
+        source = StringIO('timestamp,value\n1,1.5\n2,\n\n3,-2e3\n')
+        series = TimeSeries.from_csv(source, chunk_size=2)
+        self.assertListEqual(series.timestamps, [ 1, 2, 3 ])
+        self.assertEquals(series.values[0], 1.5)
+        self.assertTrue(math.isnan(series.values[1]))
+        self.assertEquals(series.values[2], -2000)
+        series = TimeSeries.from_csv(StringIO('3\t2\t1\n1\t3\t2\n1\t1\t4\n'),
+            value_column=2, delimiter='\t', chunk_size=2)
+        self.assertListEqual(series.points, [ (1, 2), (1, 4), (3, 1) ])
+        self.assertListEqual(TimeSeries.from_csv(StringIO('')).points, [])
+        with self.assertRaises(ValueError):
+            TimeSeries.from_csv(StringIO('1,2\n3,foo\n'))
+        for text in ('t,v\n1,2\n2,3\n,4\n', 't,v\n1,2\n2,3\nnan,4\n', 't,v\n1,2\n2,3\ninf,4\n'):
+            with self.assertRaisesRegexp(ValueError, 'row 3'):
+                TimeSeries.from_csv(StringIO(text), chunk_size=4)
+
+    def test_from_csv_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'series.csv')
+            with open(path, 'wb') as output:
+                for timestamp in xrange(1000):
+                    output.write('%d,%d\r\n' % (timestamp * 1000, timestamp % 7))
+            series = TimeSeries.from_csv(path, chunk_size=64)
+            self.assertEquals(len(series), 1000)
+            self.assertListEqual(series.values[:8], [ 0, 1, 2, 3, 4, 5, 6, 0 ])
+            self.assertEquals(series.interval, 1000)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_from_buffer(self):
+        records = numpy.array([ (3, 1.5), (1, -1), (2, 4) ],
+            dtype=[ ('timestamp', '<i8'), ('value', '<f8') ])
+        series = TimeSeries.from_buffer(records.tobytes())
+        self.assertListEqual(series.points, [ (1, -1), (2, 4), (3, 1.5) ])
+        series = TimeSeries.from_buffer(records[1:].tobytes(), offset=16)
+        self.assertListEqual(series.points, [ (2, 4) ])
+
+    def test_group_from_csv(self):
+        group = DataFrame.from_csv(StringIO('time,foo,bar\n1,2,\n2,,3\n3,4,5\n'),
+            chunk_size=2)
+        self.assertListEqual(sorted(group), [ 'bar', 'foo' ])
+        self.assertListEqual(group.foo.points, [ (1, 2), (3, 4) ])
+        self.assertListEqual(group.bar.points, [ (2, 3), (3, 5) ])
+        group = DataFrame.from_csv(StringIO('1,2,3\n2,4,5\n'))
+        self.assertListEqual(sorted(group), [ '1', '2' ])
+        self.assertListEqual(group['2'].points, [ (1, 3), (2, 5) ])
+        source = StringIO('foo,2,1\nbar,1,5\nfoo,1,2\nbar,2,6\nfoo,3,3\n')
+        group = DataFrame.from_csv(source, layout='long', chunk_size=2)
+        self.assertListEqual(group.foo.points, [ (1, 2), (2, 1), (3, 3) ])
+        self.assertListEqual(group.bar.points, [ (1, 5), (2, 6) ])
+        with self.assertRaises(ValueError):
+            DataFrame.from_csv(StringIO(''), layout='diagonal')
+        with self.assertRaisesRegexp(ValueError, 'row 2'):
+            DataFrame.from_csv(StringIO('time,foo\n1,2\n,3\n'))
+        with self.assertRaisesRegexp(ValueError, 'row 3'):
+            DataFrame.from_csv(StringIO('foo,1,2\nbar,2,3\nfoo,,4\n'), layout='long',
+                chunk_size=2)
+
     def test_decomposition(self):
         series = TimeSeries([ (1, 100), (2, 200), (3, 100), (4, 200), (5, 100) ])
         decomposed = series.decompose(2).round()
@@ -162,6 +586,28 @@ class TestTimeSeries(TestCase):
         self.assertListEqual(decomposed['seasonal'].values, [-50, 50, -50, 50, -50])
         self.assertListEqual(decomposed['residual'].values, [0] * 5)
 
+    def test_native_decomposition(self):
+        series = TimeSeries([ (1, 100), (2, 200), (3, 100), (4, 200), (5, 100) ])
+        for periodic in (False, True):
+            decomposed = series.decompose(2, periodic=periodic, native=True).round()
+            self.assertTrue(isinstance(decomposed, DataFrame))
+            self.assertEquals(len(decomposed), 3)
+            for component in decomposed.itervalues():
+                self.assertListEqual(component.timestamps, [1, 2, 3, 4, 5])
+            self.assertListEqual(decomposed['trend'].values, [150] * 5)
+            self.assertListEqual(decomposed['seasonal'].values, [-50, 50, -50, 50, -50])
+            self.assertListEqual(decomposed['residual'].values, [0] * 5)
+
+    def test_native_decomposition_components(self):
+        points = [ (x, x + [ 10, -5, 0, -5 ][x % 4]) for x in range(40) ]
+        series = TimeSeries(points)
+        decomposed = series.decompose(4, window=7, native=True)
+        total = decomposed['seasonal'] + decomposed['trend'] + decomposed['residual']
+        self.assertListEqual(total.round(6).points, series.points)
+        self.assertListEqual(decomposed['trend'][10:30].round().values, range(10, 30))
+        with self.assertRaises(ArithmeticError):
+            series[:8].decompose(4, native=True)
+
     def test_group_accessors(self):
         foo = TimeSeries({ 1: 2, 3: 4 })
         bar = TimeSeries({ 5: 6, 7: 8 })
@@ -196,6 +642,46 @@ class TestTimeSeries(TestCase):
         self.assertListEqual(trend['bar'].timestamps, [4, 5, 6])
         self.assertListEqual(trend['bar'].values, [48, 52, 56])
 
+    def test_parallel_trend(self):
+        foo = TimeSeries([ (1, 32), (2, 55), (3, 40) ])
+        bar = TimeSeries([ (4, 42), (5, 65), (6, 50) ])
+        group = DataFrame(foo=foo, bar=bar)
+        trend = group.trend(workers=2).round()
+        self.assertDictEqual(trend.failures, {})
+        self.assertListEqual(trend['foo'].points, [ (1, 38), (2, 42), (3, 46) ])
+        self.assertListEqual(trend['bar'].points, [ (4, 48), (5, 52), (6, 56) ])
+
+    def test_parallel_forecast_failures(self):
+        foo = TimeSeries([ (1, 5), (2, 5), (3, 5) ])
+        bar = TimeSeries([ (1, 5) ])
+        group = DataFrame(foo=foo, bar=bar)
+        pool = Pool(2)
+        try:
+            forecast = group.forecast(2, method=TimeSeries.SES, workers=pool)
+        finally:
+            pool.close()
+        self.assertListEqual(forecast.keys(), [ 'foo' ])
+        self.assertListEqual(forecast['foo'].round().points, [ (4, 5), (5, 5) ])
+        self.assertListEqual(forecast.failures.keys(), [ 'bar' ])
+        self.assertTrue(isinstance(forecast.failures['bar'], ArithmeticError))
+
+    def test_batched_trend(self):
+        start = 1400000000000
+        values = [ [ 32, 55, 40, 61, 48 ], [ 42, 65, 50, 12, 7 ], [ 1, 1, 2, 3, 5 ] ]
+        group = DataFrame({ name: TimeSeries(zip([ start + x * 60000 for x in range(5) ],
+            column)) for name, column in zip('abc', values) })
+        group['d'] = TimeSeries([ (1, 32), (2, 55), (3, 40) ])
+        trend = group.trend(order=TimeSeries.QUARTIC)
+        for name, column in zip('abc', values):
+            self.assertTrue(numpy.allclose(trend[name].values, column))
+        self.assertListEqual(trend['d'].round().values, [ 32, 55, 40 ])
+        trend = group.trend(order=TimeSeries.LINEAR)
+        self.assertListEqual(trend['d'].round().values, [ 38, 42, 46 ])
+        with self.assertRaises(TypeError):
+            group.trend(degree=2)
+        with self.assertRaises(ArithmeticError):
+            DataFrame(a=TimeSeries([])).trend()
+
     def test_add(self):
         a = TimeSeries([ (1, 3), (2, 3), (3, 3) ])
         b = TimeSeries([ (0, 1), (1, 1), (2, 1), (3, 1), (4, 1) ])
@@ -278,6 +764,82 @@ class TestTimeSeries(TestCase):
         self.assertTrue(isinstance(c, TimeSeries))
         self.assertListEqual(c.points, [ (1, 729), (2, 81), (3, 9) ])
 
+    def test_div_by_zero(self):
+        a = TimeSeries([ (1, 3), (2, 4) ])
+        with self.assertRaises(ZeroDivisionError):
+            a / 0
+        with self.assertRaises(ZeroDivisionError):
+            a / TimeSeries([ (1, 1), (2, 0) ])
+
+    def test_duplicate_timestamp_alignment(self):
+        a = TimeSeries([ (1, 1), (1, 2), (2, 3) ])
+        b = TimeSeries([ (1, 10), (1, 20), (3, 30) ])
+        self.assertListEqual((a + b).points, [ (1, 21), (1, 22) ])
+
+    def test_merge(self):
+        a = TimeSeries([ (1, 1), (3, 3), (3, 4), (5, 5) ])
+        b = TimeSeries([ (0, 0), (3, 30), (3, 40), (4, 40), (6, 60) ])
+        self.assertListEqual(a.merge(b, on_conflict=TimeSeries.LEFT).points,
+            [ (0, 0), (1, 1), (3, 3), (3, 4), (4, 40), (5, 5), (6, 60) ])
+        self.assertListEqual(a.merge(b, on_conflict=TimeSeries.RIGHT).points,
+            [ (0, 0), (1, 1), (3, 30), (3, 40), (4, 40), (5, 5), (6, 60) ])
+        self.assertListEqual(a.merge(b, on_conflict=TimeSeries.BOTH).points,
+            [ (0, 0), (1, 1), (3, 3), (3, 4), (3, 30), (3, 40), (4, 40), (5, 5), (6, 60) ])
+        self.assertListEqual(a.merge(b, on_conflict=operator.add).points,
+            [ (0, 0), (1, 1), (3, 43), (3, 44), (4, 40), (5, 5), (6, 60) ])
+        self.assertListEqual(a.points, [ (1, 1), (3, 3), (3, 4), (5, 5) ])
+        with self.assertRaises(ValueError):
+            a.merge(b)
+        with self.assertRaises(ValueError):
+            a.merge(b, on_conflict='first')
+        self.assertListEqual(a.merge(TimeSeries([ (2, 2) ])).timestamps, [ 1, 2, 3, 3, 5 ])
+        self.assertListEqual(TimeSeries([]).merge(a).points, a.points)
+
+    def test_align(self):
+        a = TimeSeries([ (1, 1), (2, 2), (4, 4) ])
+        b = TimeSeries([ (2, 20), (3, 30) ])
+        left, right = a.align(b, join=TimeSeries.LEFT, fill=0)
+        self.assertListEqual(left.points, [ (1, 1), (2, 2), (4, 4) ])
+        self.assertListEqual(right.points, [ (1, 0), (2, 20), (4, 0) ])
+        left, right = a.align(b, join=TimeSeries.LEFT, fill=TimeSeries.FFILL)
+        self.assertTrue(math.isnan(right.values[0]))
+        self.assertListEqual(right.values[1:], [ 20, 30 ])
+        left, right = a.align(b, join=TimeSeries.OUTER, fill=TimeSeries.FFILL)
+        self.assertListEqual(left.points, [ (1, 1), (2, 2), (3, 2), (4, 4) ])
+        self.assertListEqual(right.values[1:], [ 20, 30, 30 ])
+        with self.assertRaises(ValueError):
+            a.align(b, join='sideways')
+
+    def test_combine(self):
+        a = TimeSeries([ (1, 1), (2, 2) ])
+        b = TimeSeries([ (2, 20), (3, 30) ])
+        c = a.combine(b, operator.add, join=TimeSeries.OUTER, fill=0)
+        self.assertListEqual(c.points, [ (1, 1), (2, 22), (3, 30) ])
+        c = a.combine(b, operator.add, join=TimeSeries.LEFT)
+        self.assertTrue(math.isnan(c.values[0]))
+        self.assertEquals(c.values[1], 22)
+
+    def test_lazy(self):
+        a = TimeSeries([ (1, 1), (1, 3), (2, 2), (3, 3), (5, 5) ])
+        b = TimeSeries([ (1, 10), (2, 20), (2, 25), (3, 30), (4, 40) ])
+        c = TimeSeries([ (1, 4), (2, -8), (3, 16), (5, 32) ])
+        expressions = [
+            lambda a, b, c: (a + b) * c / a - 1,
+            lambda a, b, c: abs(a - c * b).round(1) ** 2,
+            lambda a, b, c: (a * 2).map(lambda y: y % 3) + b - (c - a),
+            lambda a, b, c: a.combine(b, lambda x, y: x * 10 + y),
+        ]
+        for expression in expressions:
+            lazy = expression(a.lazy(), b, c)
+            self.assertFalse(isinstance(lazy, TimeSeries))
+            self.assertListEqual(lazy.evaluate().points, expression(a, b, c).points)
+        self.assertListEqual((a + b.lazy()).evaluate().points, (a + b).points)
+        a += b.lazy() * 2
+        self.assertListEqual(a.points, [ (1, 21), (1, 23), (2, 52), (3, 63) ])
+        self.assertListEqual((a.lazy() + TimeSeries([])).evaluate().points, [])
+        with self.assertRaises(ZeroDivisionError):
+            (a.lazy() / (b - b)).evaluate()
+
     def test_abs(self):
         a = TimeSeries([ (1, -3), (2, 3.3), (3, -5) ])
         a = abs(a)
@@ -299,6 +861,59 @@ class TestTimeSeries(TestCase):
         group = DataFrame(a=a, b=b, c=c)
         self.assertListEqual(group.timestamps, [ 0, 1, 2, 3, 4, 5, 6 ])
 
+    def test_group_index_cache(self):
+        a = TimeSeries([ (1, 3), (2, 3) ])
+        b = TimeSeries([ (2, 2), (4, 1) ])
+        group = DataFrame(a=a, b=b)
+        index = group.index
+        self.assertListEqual(index.tolist(), [ 1, 2, 4 ])
+        self.assertIs(group.index, index)
+        group['c'] = TimeSeries([ (3, 1) ])
+        self.assertListEqual(group.timestamps, [ 1, 2, 3, 4 ])
+        del group['c']
+        self.assertListEqual(group.timestamps, [ 1, 2, 4 ])
+        group.rename(a='x')
+        self.assertListEqual(group.timestamps, [ 1, 2, 4 ])
+        b.append(5, 0)
+        self.assertListEqual(group.timestamps, [ 1, 2, 4, 5 ])
+        self.assertListEqual(DataFrame().timestamps, [])
+
+    def test_group_matrix(self):
+        a = TimeSeries([ (1, 3), (2, 4) ])
+        b = TimeSeries([ (2, 2), (4, 1), (4, 5) ])
+        group = DataFrame(a=a, b=b)
+        matrix = group.to_matrix([ 'a', 'b' ])
+        self.assertEquals(matrix.shape, (2, 3))
+        self.assertListEqual(matrix[0, :2].tolist(), [ 3, 4 ])
+        self.assertTrue(math.isnan(matrix[0, 2]))
+        self.assertTrue(math.isnan(matrix[1, 0]))
+        self.assertListEqual(matrix[1, 1:].tolist(), [ 2, 5 ])
+        matrix = group.matrix
+        self.assertIs(group.matrix, matrix)
+        names = list(group)
+        self.assertListEqual(matrix[names.index('a'), :2].tolist(), [ 3, 4 ])
+        a += 1
+        self.assertListEqual(group.matrix[names.index('a'), :2].tolist(), [ 4, 5 ])
+
+    def test_group_reductions(self):
+        a = TimeSeries([ (1, 1), (2, 2), (3, 3) ])
+        b = TimeSeries([ (2, 4), (3, 6), (4, 8) ])
+        c = TimeSeries([ (2, 9), (3, 0) ])
+        group = DataFrame(a=a, b=b, c=c)
+        self.assertListEqual(group.sum().points, [ (1, 1), (2, 15), (3, 9), (4, 8) ])
+        self.assertListEqual(group.sum(strict=True).points, [ (2, 15), (3, 9) ])
+        self.assertListEqual(group.mean().points, [ (1, 1), (2, 5), (3, 3), (4, 8) ])
+        self.assertListEqual(group.min().values, [ 1, 2, 0, 8 ])
+        self.assertListEqual(group.max(strict=True).values, [ 9, 6 ])
+        self.assertListEqual(group.quantile(0.5).values, [ 1, 4, 3, 8 ])
+        self.assertListEqual(group.quantile(1, strict=True).values, [ 9, 6 ])
+        self.assertListEqual(group.count().values, [ 1, 3, 3, 1 ])
+        self.assertEquals(group.count()._values.dtype, numpy.float64)
+        with self.assertRaises(ValueError):
+            group.quantile(2)
+        self.assertListEqual(DataFrame().sum().points, [])
+        self.assertListEqual(DataFrame(a=a, d=TimeSeries([ (9, 1) ])).mean(strict=True).points, [])
+
     def test_group_abs(self):
         a = TimeSeries([ (1, -1), (2, -3), (3, 3.3) ])
         group = DataFrame(a=a)
@@ -0,0 +1,71 @@
+import os
+import time
+from unittest import TestCase
+from timeseries import TimeSeries, DataFrame, WorkerPool, WorkerError
+
+def crash(value):
+    os._exit(1)
+
+class TestWorkers(TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(2, preload=False, timeout=2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_call(self):
+        series = TimeSeries([ (1, 5), (2, 5), (3, 5) ])
+        forecast = self.pool.call(series, 'forecast', (2,), { 'method': TimeSeries.SES })
+        self.assertListEqual(forecast.round().points, [ (4, 5), (5, 5) ])
+        self.assertEquals(self.pool.call(series, 'asof', (2,)), (2, 5))
+        with self.assertRaises(ArithmeticError):
+            self.pool.call(TimeSeries([ (1, 5) ]), 'forecast', (2,), { 'method': TimeSeries.SES })
+
+    def test_decompose(self):
+        series = TimeSeries(zip(range(24), [ 1, 3, 2, 4 ] * 6))
+        expected = series.decompose(4, native=True)
+        decomposed = self.pool.call(series, 'decompose', (4,), { 'native': True })
+        self.assertListEqual(sorted(decomposed.keys()), [ 'residual', 'seasonal', 'trend' ])
+        for name in expected:
+            self.assertListEqual(decomposed[name].points, expected[name].points)
+
+    def test_data_frame(self):
+        foo = TimeSeries([ (1, 5), (2, 5), (3, 5) ])
+        bar = TimeSeries([ (1, 5) ])
+        group = DataFrame(foo=foo, bar=bar)
+        forecast = group.forecast(2, method=TimeSeries.SES, workers=self.pool)
+        self.assertListEqual(forecast.keys(), [ 'foo' ])
+        self.assertListEqual(forecast['foo'].round().points, [ (4, 5), (5, 5) ])
+        self.assertTrue(isinstance(forecast.failures['bar'], ArithmeticError))
+        trend = group.trend(workers=self.pool)
+        self.assertListEqual(sorted(trend.keys()), [ 'bar', 'foo' ])
+
+    def test_crash(self):
+        series = TimeSeries([ (1, 3) ])
+        with self.assertRaises(WorkerError):
+            self.pool.call(series, 'map', (crash,))
+        self.assertEquals(self.pool.restarts, 2)
+        self.assertListEqual(self.pool.call(series, 'map', (abs,)).points, [ (1, 3) ])
+
+    def test_timeout(self):
+        series = TimeSeries([ (1, 60) ])
+        self.pool.retries = 0
+        with self.assertRaises(WorkerError):
+            self.pool.call(series, 'map', (time.sleep,))
+        self.assertEquals(self.pool.restarts, 1)
+        self.assertListEqual(self.pool.call(series, 'map', (abs,)).points, [ (1, 60) ])
+
+    def test_check(self):
+        self.assertEquals(self.pool.check(), 0)
+        self.pool.workers[0].process.terminate()
+        self.pool.workers[0].process.join()
+        self.assertEquals(self.pool.check(), 1)
+        self.assertTrue(all(worker.alive for worker in self.pool.workers))
+
+    def test_close(self):
+        with WorkerPool(1, preload=False) as pool:
+            process = pool.workers[0].process
+        self.assertFalse(process.is_alive())
+        with self.assertRaises(ValueError):
+            pool.call(TimeSeries([ (1, 2) ]), 'sum')
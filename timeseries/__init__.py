@@ -1,3 +1,8 @@
 from .time_series import TimeSeries
 from .data_frame import DataFrame
 from .lazy_import import LazyImport
+from .cache import ResultCache
+from .instrumentation import Registry, instrument
+from .online import RunningMovingAverage, RecursiveTrend
+from .compression import CompressedTimeSeries
+from .workers import WorkerPool, WorkerError
@@ -0,0 +1,189 @@
+from .lazy_import import LazyImport
+from .instrumentation import instrumented
+
+# Join modes
+INNER = 'inner'
+LEFT = 'left'
+OUTER = 'outer'
+
+# Fill methods
+FFILL = 'ffill'
+INTERPOLATE = 'linear'
+
+# Conflict policies for merge(), along with LEFT
+RIGHT = 'right'
+BOTH = 'both'
+RAISE = 'raise'
+
+def in_order(timestamps):
+    '''Check whether an array of timestamps is sorted.'''
+    return bool((timestamps[1:] >= timestamps[:-1]).all())
+
+def lookup(index, timestamps, values, fill=None):
+    '''Look up the value at each timestamp in the sorted `index` array from
+    the sorted `timestamps` and `values` arrays. Where a timestamp occurs
+    more than once the last value wins. Missing timestamps are set to `fill`
+    (NaN when `None`), or to the most recent earlier value when `fill` is
+    `FFILL`. Returns a tuple of (values, found) where `found` is a boolean
+    mask of the exact matches.'''
+    numpy = LazyImport.numpy()
+    if not len(timestamps):
+        missing = numpy.nan if fill is None or fill == FFILL else fill
+        return (numpy.full(len(index), missing, dtype=numpy.float64),
+            numpy.zeros(len(index), dtype=bool))
+    positions = numpy.searchsorted(timestamps, index, side='right') - 1
+    before = positions >= 0
+    positions[~before] = 0
+    found = before & (timestamps[positions] == index)
+    result = values[positions]
+    if fill == FFILL:
+        result[~before] = numpy.nan
+    else:
+        result[~found] = numpy.nan if fill is None else fill
+    return result, found
+
+@instrumented('align', lambda args: len(args[0]) + len(args[2]))
+def align(left_timestamps, left_values, right_timestamps, right_values,
+        join=INNER, fill=None):
+    '''Align two sorted series on their timestamps. `join` selects the
+    resulting timestamps: `INNER` keeps timestamps present in both series,
+    `LEFT` keeps every timestamp of the left series and `OUTER` keeps the
+    union of both. Values missing from either side are set to `fill`, see
+    `lookup()`. Returns a tuple of (timestamps, left_values, right_values).'''
+    numpy = LazyImport.numpy()
+    if join == INNER:
+        right, found = lookup(left_timestamps, right_timestamps, right_values)
+        return left_timestamps[found], left_values[found], right[found]
+    elif join == LEFT:
+        right, _ = lookup(left_timestamps, right_timestamps, right_values, fill)
+        return left_timestamps, left_values, right
+    elif join == OUTER:
+        index = numpy.union1d(left_timestamps, right_timestamps)
+        left, _ = lookup(index, left_timestamps, left_values, fill)
+        right, _ = lookup(index, right_timestamps, right_values, fill)
+        return index, left, right
+    raise ValueError('Unknown join mode')
+
+@instrumented('merge', lambda args: len(args[0]) + len(args[2]))
+def merge(left_timestamps, left_values, right_timestamps, right_values,
+        on_conflict=RAISE):
+    '''Merge two sorted series into one sorted series without sorting.
+    `on_conflict` decides what happens at timestamps found in both series:
+    `LEFT` or `RIGHT` keeps only the points of that series, `BOTH` keeps
+    every point with those of the left series first, and `RAISE` raises a
+    `ValueError`. It can also be a function that accepts arrays of the left
+    and right values at those timestamps (using the last right value where
+    a timestamp occurs more than once) and returns the values that replace
+    the left points. Returns a tuple of (timestamps, values).'''
+    numpy = LazyImport.numpy()
+    if not callable(on_conflict) and on_conflict not in (LEFT, RIGHT, BOTH, RAISE):
+        raise ValueError('Unknown conflict policy')
+    right, in_right = lookup(left_timestamps, right_timestamps, right_values)
+    if on_conflict == RAISE and in_right.any():
+        raise ValueError('Both series have a point at %d'
+            % left_timestamps[in_right][0])
+    if on_conflict == RIGHT:
+        left_timestamps = left_timestamps[~in_right]
+        left_values = left_values[~in_right]
+    elif on_conflict != BOTH:
+        _, in_left = lookup(right_timestamps, left_timestamps, left_values)
+        right_timestamps = right_timestamps[~in_left]
+        right_values = right_values[~in_left]
+        if callable(on_conflict) and in_right.any():
+            left_values = left_values.copy()
+            left_values[in_right] = on_conflict(left_values[in_right], right[in_right])
+    # Each right point goes after the left points at or before its timestamp
+    positions = left_timestamps.searchsorted(right_timestamps, side='right')
+    positions += numpy.arange(len(right_timestamps))
+    from_right = numpy.zeros(len(left_timestamps) + len(right_timestamps), dtype=bool)
+    from_right[positions] = True
+    timestamps = numpy.empty(len(from_right), dtype=numpy.int64)
+    values = numpy.empty(len(from_right), dtype=numpy.float64)
+    timestamps[from_right], values[from_right] = right_timestamps, right_values
+    timestamps[~from_right], values[~from_right] = left_timestamps, left_values
+    return timestamps, values
+
+def check_interval(interval):
+    '''Validate an interval in milliseconds, which must be a positive whole
+    number, and return it as an int so grids stay int64.'''
+    if interval <= 0:
+        raise ValueError('The interval must be positive')
+    if int(interval) != interval:
+        raise ValueError('The interval must be a whole number of milliseconds')
+    return int(interval)
+
+def infer_interval(timestamps):
+    '''Get the most common positive difference between consecutive sorted
+    timestamps, preferring the smallest on a tie, or `None` when there is
+    none.'''
+    numpy = LazyImport.numpy()
+    deltas = numpy.diff(timestamps)
+    deltas = deltas[deltas > 0]
+    if not len(deltas):
+        return None
+    candidates, counts = numpy.unique(deltas, return_counts=True)
+    return int(candidates[counts.argmax()])
+
+def regularity(timestamps, interval=None):
+    '''Describe how closely sorted timestamps follow a fixed `interval`
+    (inferred by default, see `infer_interval()`). Returns a dict of:
+
+        interval    the interval
+        regular     whether every step is exactly one interval
+        steps       the number of steps between consecutive timestamps
+        duplicates  steps of zero, from repeated timestamps
+        gaps        steps of a whole number of intervals greater than one
+        missing     grid points skipped by the gaps
+        irregular   steps that are not a whole number of intervals
+    '''
+    numpy = LazyImport.numpy()
+    if interval is None:
+        interval = infer_interval(timestamps)
+    deltas = numpy.diff(timestamps)
+    report = { 'interval': interval, 'steps': len(deltas) }
+    duplicates = deltas == 0
+    if interval:
+        whole = deltas % interval == 0
+        multiples = deltas // interval
+        gaps = whole & (multiples > 1)
+        report['gaps'] = int(gaps.sum())
+        report['missing'] = int((multiples[gaps] - 1).sum())
+        report['irregular'] = int((~whole).sum())
+    else:
+        report['gaps'] = report['missing'] = 0
+        report['irregular'] = int((~duplicates).sum())
+    report['duplicates'] = int(duplicates.sum())
+    report['regular'] = not (report['gaps'] or report['irregular'] or
+        report['duplicates'])
+    return report
+
+def regularize(timestamps, values, interval, fill=None):
+    '''Snap sorted points onto a grid of `interval` milliseconds starting at
+    the first timestamp. Each point moves to the nearest grid point, and
+    where several points land on the same grid point the last one wins.
+    Empty grid points are set to `fill` (NaN when `None` or 'nan'), to the previous
+    value when `fill` is `FFILL`, or interpolated linearly between the
+    surrounding values when `fill` is `INTERPOLATE`. Returns a tuple of
+    (timestamps, values).'''
+    numpy = LazyImport.numpy()
+    interval = check_interval(interval)
+    if not len(timestamps):
+        return timestamps, values
+    start = timestamps[0]
+    # Round half up to the nearest grid point
+    slots = (timestamps - start + interval // 2) // interval
+    last = numpy.append(slots[1:] != slots[:-1], True)
+    slots, values = slots[last], values[last]
+    grid = start + interval * numpy.arange(slots[-1] + 1, dtype=numpy.int64)
+    if fill == FFILL:
+        filled = numpy.zeros(len(grid), dtype=numpy.intp)
+        filled[slots] = numpy.arange(len(slots))
+        result = values[numpy.maximum.accumulate(filled)]
+    elif fill == INTERPOLATE:
+        result = numpy.interp(numpy.arange(len(grid)), slots, values)
+        result[slots] = values
+    else:
+        missing = numpy.nan if fill is None or fill == 'nan' else fill
+        result = numpy.full(len(grid), missing, dtype=numpy.float64)
+        result[slots] = values
+    return grid, result
@@ -0,0 +1,126 @@
+from functools import wraps
+from .lazy_import import LazyImport
+
+def nonfinite_windows(finite, window):
+    '''Get a mask of the windows of `window` points that contain a value that
+    is not finite, from a running count of such values.'''
+    numpy = LazyImport.numpy()
+    invalid = numpy.concatenate(([ 0 ], numpy.cumsum(~finite)))
+    return invalid[window:] != invalid[:-window]
+
+def masked(fn):
+    '''Decorate a moving average of (values, window, ...) so that non-finite
+    values are averaged as zero and the windows holding them are set to NaN,
+    rather than letting a running sum carry them forward.'''
+    @wraps(fn)
+    def wrapper(values, window, *args):
+        numpy = LazyImport.numpy()
+        values = numpy.asarray(values, dtype=numpy.float64)
+        finite = numpy.isfinite(values)
+        if finite.all():
+            return fn(values, window, *args)
+        result = fn(numpy.where(finite, values, 0.0), window, *args)
+        result[nonfinite_windows(finite, window)] = numpy.nan
+        return result
+    return wrapper
+
+@masked
+def simple(values, window):
+    '''Get the simple moving average of `values` over `window` points using
+    prefix sums. The result has `len(values) - window + 1` points, and is
+    NaN for windows containing a non-finite value.'''
+    numpy = LazyImport.numpy()
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if not len(values):
+        return values[:0]
+    # Summing offsets from the first value limits the cancellation error
+    offset = values[0]
+    sums = numpy.empty(len(values) + 1)
+    sums[0] = 0
+    numpy.cumsum(values - offset, out=sums[1:])
+    return (sums[window:] - sums[:-window]) / window + offset
+
+@masked
+def weighted(values, window, direct=64):
+    '''Get the linearly weighted moving average of `values` over `window`
+    points, where the most recent point has weight `window` and the oldest
+    has weight 1. Windows up to `direct` points are convolved directly;
+    wider ones are derived from prefix sums of prefix sums, computed over
+    chunks of the series to keep the sums small. Windows containing a
+    non-finite value are NaN.'''
+    numpy = LazyImport.numpy()
+    values = numpy.asarray(values, dtype=numpy.float64)
+    length = len(values) - window + 1
+    if length <= 0:
+        return values[:0]
+    divisor = window * (window + 1) / 2.0
+    if window <= direct:
+        weights = numpy.arange(window, 0, -1) / divisor
+        return numpy.convolve(values, weights, 'valid')
+    offset = values[0]
+    result = numpy.empty(length)
+    step = 16 * window
+    for start in xrange(0, length, step):
+        stop = min(length, start + step)
+        block = values[start:stop + window - 1] - offset
+        sums = numpy.concatenate(([ 0.0 ], numpy.cumsum(block)))
+        double = numpy.concatenate(([ 0.0 ], numpy.cumsum(sums)))
+        # sum of (window - m) * x[t - m] == window * S[t+1] - sum(S[t-window+1:t+1])
+        end = numpy.arange(window, len(block) + 1)
+        numerator = window * sums[end] - (double[end] - double[end - window])
+        result[start:stop] = numerator / divisor
+    return result + offset
+
+def exponential(values, window):
+    '''Get the exponentially weighted moving average of `values` with a
+    smoothing factor of `2 / (window + 1)`, seeded with the simple average of
+    the first `window` points. The recursion is evaluated in blocks: within
+    a block it is a scaled cumulative sum, and since the weight of a whole
+    block decays to almost nothing, each block only needs the final state
+    of the few blocks before it. Non-finite values are skipped: they are NaN
+    in the result and leave the average unchanged.'''
+    numpy = LazyImport.numpy()
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if len(values) < window:
+        return values[:0]
+    finite = numpy.isfinite(values)
+    if not finite.all():
+        # Average the finite values alone, then spread them back out
+        smoothed = exponential(values[finite], window)
+        positions = numpy.cumsum(finite)[window - 1:] - window
+        result = numpy.full(len(values) - window + 1, numpy.nan)
+        kept = finite[window - 1:] & (positions >= 0)
+        result[kept] = smoothed[positions[kept]]
+        return result
+    alpha = 2.0 / (window + 1)
+    decay = 1 - alpha
+    seed = values[:window].mean()
+    rest = values[window:]
+    if not len(rest) or decay == 0:
+        return numpy.concatenate(([ seed ], rest))
+    size = min(len(rest), max(1, int(numpy.log(1e-8) / numpy.log(decay))))
+    blocks = -(-len(rest) // size)
+    padded = numpy.zeros(blocks * size)
+    padded[:len(rest)] = rest
+    padded = padded.reshape(blocks, size)
+    powers = decay ** numpy.arange(size)
+    # partial[b, k] is block b smoothed from a zero initial state
+    partial = alpha * numpy.cumsum(padded / powers, axis=1) * powers
+    block_decay = decay ** size
+    finals = partial[:, -1]
+    carried = finals.copy()
+    factor = 1.0
+    for lag in xrange(1, min(blocks, 4)):
+        factor *= block_decay
+        carried[lag:] += factor * finals[:-lag]
+    carried += seed * block_decay ** numpy.arange(1, blocks + 1)
+    # State at the start of each block
+    initial = numpy.concatenate(([ seed ], carried[:-1]))
+    smoothed = partial + initial[:, numpy.newaxis] * (decay * powers)
+    return numpy.concatenate(([ seed ], smoothed.ravel()[:len(rest)]))
+
+def triangular(values, window):
+    '''Get the triangular moving average of `values` over `window` points,
+    a simple moving average of a simple moving average.'''
+    first = (window + 1) // 2
+    return simple(simple(values, first), window - first + 1)
@@ -0,0 +1,136 @@
+from multiprocessing import Pool
+from .lazy_import import LazyImport
+from .parallel import map_series
+from .utilities import table_output
+
+# Error metrics calculated for each fold
+METRICS = ('mae', 'mape', 'rmse')
+
+def forecast_errors(actual, forecast):
+    '''Get a dict of the mean absolute error, the mean absolute percentage
+    error and the root mean squared error of forecast values against actual
+    values. Actual values of zero are left out of the MAPE.'''
+    numpy = LazyImport.numpy()
+    error = forecast - actual
+    nonzero = actual != 0
+    mape = numpy.nan
+    if nonzero.any():
+        mape = 100 * numpy.abs(error[nonzero] / actual[nonzero]).mean()
+    return {
+        'mae': float(numpy.abs(error).mean()),
+        'mape': float(mape),
+        'rmse': float(numpy.sqrt((error * error).mean())),
+    }
+
+def cut_points(length, horizon, folds, step=None):
+    '''Get the number of training points in each fold of a series of
+    `length` points, oldest fold first. The last fold holds out the final
+    `horizon` points and each earlier fold ends `step` points (the horizon
+    by default) before the next.'''
+    if horizon < 1:
+        raise ValueError('The horizon must be at least one point')
+    if folds < 1:
+        raise ValueError('At least one fold is required')
+    step = step or horizon
+    cuts = [ length - horizon - step * fold for fold in xrange(folds - 1, -1, -1) ]
+    if cuts[0] < 2:
+        raise ArithmeticError('Not enough points for %d folds with a horizon of %d'
+            % (folds, horizon))
+    return cuts
+
+class Backtest(object):
+    '''The results of a rolling-origin backtest, see `TimeSeries.backtest()`.
+    `errors[method]` has a dict of `METRICS` for each fold, oldest first, or
+    `None` for folds where the forecast failed, in which case the exception
+    is in `failures[method, fold]`. `origins` has the timestamp of the last
+    training point in each fold.'''
+
+    def __init__(self, methods, origins):
+        self.methods = list(methods)
+        self.origins = origins
+        self.errors = dict((method, [ None ] * len(origins)) for method in methods)
+        self.failures = {}
+
+    def mean(self, metric='rmse'):
+        '''Get the mean of `metric` across folds for each method, leaving out
+        failed folds. Methods that failed on every fold are NaN.'''
+        numpy = LazyImport.numpy()
+        means = {}
+        for method, folds in self.errors.iteritems():
+            values = [ fold[metric] for fold in folds if fold is not None ]
+            means[method] = float(numpy.mean(values)) if values else numpy.nan
+        return means
+
+    def best(self, metric='rmse'):
+        '''Get the method with the lowest mean `metric` of those that
+        succeeded on every fold, or `None` if none did.'''
+        if metric not in METRICS:
+            raise ValueError('Unknown backtest metric')
+        means = self.mean(metric)
+        candidates = [ method for method in self.methods
+            if None not in self.errors[method] and means[method] == means[method] ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda method: means[method])
+
+    def __str__(self):
+        rows = [ (method, fold) for method in self.methods
+            for fold in xrange(len(self.origins)) ]
+        columns = [
+            ( 'Method', [ method for method, _ in rows ] ),
+            ( 'Fold', [ fold for _, fold in rows ] ),
+            ( 'Origin', [ self.origins[fold] for _, fold in rows ] ),
+        ]
+        for metric in METRICS:
+            columns.append(( metric.upper(), [ '%.6f' % self.errors[method][fold][metric]
+                if self.errors[method][fold] is not None
+                else type(self.failures[method, fold]).__name__
+                for method, fold in rows ] ))
+        return table_output(columns)
+
+    def __repr__(self):
+        return 'Backtest(%s, %d folds)' % (', '.join(self.methods), len(self.origins))
+
+def backtest(series, horizon, folds, methods, frequency=None, step=None,
+        workers=None):
+    '''Backtest each series in the `series` dict, returning a dict of
+    `Backtest` results with the same keys. The training series of each fold
+    are views of the original arrays. `workers` is as for
+    `DataFrame.forecast()`; a pool started for a process count is shared by
+    every method.'''
+    from .time_series import TimeSeries
+    splits = {}
+    results = {}
+    for name, member in series.iteritems():
+        timestamps, values = member._timestamps, member._values
+        cuts = cut_points(len(timestamps), horizon, folds, step)
+        for fold, cut in enumerate(cuts):
+            training = TimeSeries._from_arrays(timestamps[:cut], values[:cut],
+                presorted=True)
+            splits[name, fold] = training, values[cut:cut + horizon]
+        results[name] = Backtest(methods, [ int(timestamps[cut - 1]) for cut in cuts ])
+    training = dict((key, split[0]) for key, split in splits.iteritems())
+    pool = Pool(workers) if isinstance(workers, (int, long)) else workers
+    try:
+        for method in methods:
+            kwargs = { 'method': method, 'frequency': frequency }
+            if pool is None:
+                forecasts, failures = {}, {}
+                for key, member in training.iteritems():
+                    try:
+                        forecasts[key] = member.forecast(horizon, **kwargs)
+                    except Exception, error:
+                        failures[key] = error
+            else:
+                forecasts, failures = map_series(training, 'forecast', (horizon,),
+                    kwargs, pool)
+            for (name, fold), forecast in forecasts.iteritems():
+                results[name].errors[method][fold] = forecast_errors(
+                    splits[name, fold][1], forecast._values)
+            for (name, fold), error in failures.iteritems():
+                results[name].failures[method, fold] = error
+    finally:
+        if pool is not workers:
+            pool.close()
+            pool.join()
+    return results
@@ -0,0 +1,132 @@
+import os
+import hashlib
+import inspect
+from collections import OrderedDict
+from functools import wraps
+from .lazy_import import LazyImport
+from .storage import create_temporary
+
+class ResultCache(object):
+    '''A cache of `TimeSeries.forecast()` and `decompose()` results keyed on
+    a hash of the series data and the method arguments. Up to `size` results
+    are kept in memory and evicted least recently used first. When
+    `directory` is set results are also written there and read back on an
+    in-memory miss. Enable the cache by assigning an instance to
+    `TimeSeries.result_cache`.'''
+
+    def __init__(self, size=1024, directory=None):
+        self.size = size
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(series, method, arguments):
+        '''Get the cache key for calling `method` on `series` with a dict of
+        `arguments`.'''
+        digest = hashlib.sha1()
+        digest.update(series._timestamps.tobytes())
+        digest.update(series._values.tobytes())
+        digest.update(repr((method, sorted(arguments.items()))))
+        return digest.hexdigest()
+
+    def get(self, key):
+        '''Get a cached entry, a dict of name => (timestamps, values), or
+        `None` when the key is not cached.'''
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+        else:
+            entry = self._read(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        '''Cache an entry (see `get()`).'''
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def clear(self):
+        '''Remove all entries from memory and reset the counters. Files on
+        disk are kept.'''
+        self.entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def _remember(self, key, entry):
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _read(self, key):
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        archive = LazyImport.numpy().load(self._path(key))
+        try:
+            return { name: (archive['timestamps_' + name], archive['values_' + name])
+                for name in archive['names'].tolist() }
+        finally:
+            archive.close()
+
+    def _write(self, key, entry):
+        if self.directory is None:
+            return
+        numpy = LazyImport.numpy()
+        arrays = { 'names': numpy.array(sorted(entry)) }
+        for name, (timestamps, values) in entry.iteritems():
+            arrays['timestamps_' + name] = timestamps
+            arrays['values_' + name] = values
+        handle, path = create_temporary(self.directory, suffix='.npz')
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                numpy.savez(output, **arrays)
+            os.rename(path, self._path(key))
+        except:
+            os.unlink(path)
+            raise
+
+def cached(method):
+    '''Decorate a TimeSeries method that returns a TimeSeries or DataFrame so
+    its results are looked up in and stored to `TimeSeries.result_cache`.'''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.result_cache
+        if cache is None:
+            return method(self, *args, **kwargs)
+        arguments = inspect.getcallargs(method, self, *args, **kwargs)
+        del arguments['self']
+        key = cache.key(self, method.__name__, arguments)
+        entry = cache.get(key)
+        if entry is None:
+            result = method(self, *args, **kwargs)
+            cache.set(key, to_entry(result))
+            return result
+        return from_entry(entry)
+    return wrapper
+
+def to_entry(result):
+    from .time_series import TimeSeries
+    if isinstance(result, TimeSeries):
+        return { '': (result._timestamps, result._values) }
+    return { name: (series._timestamps, series._values)
+        for name, series in result.iteritems() }
+
+def from_entry(entry):
+    from .time_series import TimeSeries
+    from .data_frame import DataFrame
+    series = { name: TimeSeries._from_arrays(timestamps, values, presorted=True)
+        for name, (timestamps, values) in entry.iteritems() }
+    if '' in series:
+        return series['']
+    return DataFrame(series)
@@ -0,0 +1,442 @@
+import sys
+import weakref
+from bisect import bisect_right
+from collections import OrderedDict
+from .lazy_import import LazyImport
+from .time_series import TimeSeries
+from .instrumentation import span
+
+# Points per compressed chunk
+CHUNK_SIZE = 1024
+
+# Widths in bits of the zigzag-encoded integers (timestamp delta-of-deltas
+# and decimal value deltas) in each size class. Each integer is stored as a
+# zero flag, then for non-zero integers a two bit class and the integer.
+INTEGER_WIDTHS = (7, 9, 12, 64)
+
+# Most decimal places tried when storing values as scaled integers
+MAX_DECIMALS = 9
+
+# Values tried alone first by decimal_places()
+DECIMAL_SAMPLE = 16
+
+# Largest scaled integer that converts to and from float64 exactly
+MAX_SCALED = 2 ** 53
+
+# Numbers of XORs sharing a window of meaningful bits tried by encode_xors()
+XOR_BLOCKS = (8, 16, 32)
+
+def bit_length(words):
+    '''Get the number of significant bits in each uint64 of `words`. The
+    exponent of the nearest float is exact or one too large, where the word
+    rounds up to a power of two.'''
+    numpy = LazyImport.numpy()
+    lengths = numpy.minimum(numpy.frexp(words.astype(numpy.float64))[1], 64).astype(numpy.int64)
+    smallest = numpy.uint64(1) << (numpy.maximum(lengths, 1) - 1).astype(numpy.uint64)
+    return lengths - ((words < smallest) & (lengths > 0))
+
+def field_bits(words, widths):
+    '''Get the low `widths[i]` bits of each uint64 `words[i]`, most
+    significant first, concatenated into one array of 0 and 1 bytes.'''
+    numpy = LazyImport.numpy()
+    octets = numpy.asarray(words, dtype='>u8').view(numpy.uint8).reshape(-1, 8)
+    bits = numpy.unpackbits(octets, axis=1)
+    return bits[numpy.arange(64) >= 64 - numpy.asarray(widths)[:, None]]
+
+def read_fields(bits, position, widths):
+    '''Reverse `field_bits()` on `bits` from `position`, returning a tuple
+    of (uint64 words, position after the fields).'''
+    numpy = LazyImport.numpy()
+    widths = numpy.asarray(widths, dtype=numpy.int64)
+    stop = position + int(widths.sum())
+    padded = numpy.zeros((len(widths), 64), dtype=numpy.uint8)
+    padded[numpy.arange(64) >= 64 - widths[:, None]] = bits[position:stop]
+    return numpy.packbits(padded, axis=1).view('>u8').ravel().astype(numpy.uint64), stop
+
+def encode_integers(integers):
+    '''Get the bits of an int64 array in the variable-width format described
+    by `INTEGER_WIDTHS`: the zero flags, then the classes and the zigzag
+    encoded integers that are not zero.'''
+    numpy = LazyImport.numpy()
+    zigzag = ((integers << 1) ^ (integers >> 63)).view(numpy.uint64)
+    nonzero = zigzag != 0
+    zigzag = zigzag[nonzero]
+    classes = numpy.searchsorted(INTEGER_WIDTHS, bit_length(zigzag))
+    widths = numpy.take(INTEGER_WIDTHS, classes)
+    return numpy.concatenate((nonzero.view(numpy.uint8), field_bits(classes, [ 2 ] * len(classes)),
+        field_bits(zigzag, widths)))
+
+def decode_integers(bits, position, count):
+    '''Reverse `encode_integers()` for `count` integers starting at
+    `position`, returning a tuple of (int64 array, position after them).'''
+    numpy = LazyImport.numpy()
+    nonzero = bits[position:position + count].view(numpy.bool_)
+    position += count
+    classes, position = read_fields(bits, position, [ 2 ] * int(nonzero.sum()))
+    widths = numpy.take(INTEGER_WIDTHS, classes.astype(numpy.int64))
+    zigzag, position = read_fields(bits, position, widths)
+    integers = numpy.zeros(count, dtype=numpy.int64)
+    integers[nonzero] = (zigzag >> numpy.uint64(1)).view(numpy.int64) ^ \
+        -(zigzag & numpy.uint64(1)).view(numpy.int64)
+    return integers, position
+
+def skip_integers(bits, position, count):
+    '''Get the position after `count` integers written by
+    `encode_integers()` from `position`, reading only their zero flags and
+    classes.'''
+    numpy = LazyImport.numpy()
+    nonzero = int(bits[position:position + count].sum())
+    position += count
+    pairs = bits[position:position + 2 * nonzero].astype(numpy.int64)
+    classes = 2 * pairs[::2] + pairs[1::2]
+    return position + 2 * nonzero + int(numpy.take(INTEGER_WIDTHS, classes).sum())
+
+def decimal_places(values, fewest=0):
+    '''Get the fewest decimal places (from `fewest` up to `MAX_DECIMALS`) at
+    which every value in `values` is exactly a scaled integer, so that
+    dividing the integer by the scale gives back the same float bit for bit,
+    or `None`. Negative zero has no integer form, so it always gives `None`.
+    The first few values are tried alone first, as they usually rule out
+    the decimal places that are too few, or all of them.'''
+    numpy = LazyImport.numpy()
+    if len(values) > DECIMAL_SAMPLE:
+        fewest = decimal_places(values[:DECIMAL_SAMPLE], fewest)
+        if fewest is None:
+            return None
+    words = values.view(numpy.uint64)
+    for decimals in xrange(fewest, MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        with numpy.errstate(invalid='ignore', over='ignore'):
+            scaled = numpy.rint(values * scale)
+            if not (numpy.abs(scaled) < MAX_SCALED).all():
+                return None
+        if ((scaled.astype(numpy.int64) / scale).view(numpy.uint64) == words).all():
+            return decimals
+    return None
+
+def encode_xors(words):
+    '''Get the bits of the XORs between consecutive uint64 `words` in the
+    Gorilla format: a zero flag per XOR, then for each non-zero XOR a flag
+    for whether it needs a new window of meaningful bits, the windows (5 bit
+    leading zero count and 6 bit length minus one) and each XOR's
+    meaningful bits. Rather than opening a window whenever a XOR does not
+    fit the last one, which needs a loop over the points, the non-zero XORs
+    are split into blocks that each share the narrowest window holding all
+    of them, and a window is only written where it changes. The block size
+    in `XOR_BLOCKS` giving the fewest bits is used.'''
+    numpy = LazyImport.numpy()
+    xors = words[1:] ^ words[:-1]
+    nonzero = xors != 0
+    xors = xors[nonzero]
+    leading = numpy.minimum(64 - bit_length(xors), 31)
+    trailing = bit_length(xors & (~xors + numpy.uint64(1))) - 1
+    best = None
+    for size in XOR_BLOCKS:
+        starts = numpy.arange(0, len(xors), size)
+        if len(starts):
+            block_leading = numpy.minimum.reduceat(leading, starts)
+            block_trailing = numpy.minimum.reduceat(trailing, starts)
+        else:
+            block_leading = block_trailing = leading
+        lengths = 64 - block_leading - block_trailing
+        counts = numpy.diff(numpy.append(starts, len(xors)))
+        changed = numpy.ones(len(starts), dtype=numpy.bool_)
+        changed[1:] = (block_leading[1:] != block_leading[:-1]) | \
+            (block_trailing[1:] != block_trailing[:-1])
+        bits = 11 * int(changed.sum()) + int(lengths.dot(counts))
+        if best is None or bits < best[0]:
+            best = bits, starts, block_leading, block_trailing, lengths, counts, changed
+    _, starts, block_leading, block_trailing, lengths, counts, changed = best
+    new = numpy.zeros(len(xors), dtype=numpy.bool_)
+    new[starts[changed]] = True
+    headers = numpy.column_stack((block_leading[changed], lengths[changed] - 1)).ravel()
+    shifts = numpy.repeat(block_trailing, counts).astype(numpy.uint64)
+    return numpy.concatenate((nonzero.view(numpy.uint8), new.view(numpy.uint8),
+        field_bits(headers, [ 5, 6 ] * int(changed.sum())),
+        field_bits(xors >> shifts, numpy.repeat(lengths, counts))))
+
+def decode_xors(bits, position, first_word, count):
+    '''Reverse `encode_xors()`, returning `count` uint64 words starting with
+    `first_word`.'''
+    numpy = LazyImport.numpy()
+    nonzero = bits[position:position + count - 1].view(numpy.bool_)
+    position += count - 1
+    total = int(nonzero.sum())
+    new = bits[position:position + total].view(numpy.bool_)
+    position += total
+    headers, position = read_fields(bits, position, [ 5, 6 ] * int(new.sum()))
+    leading = numpy.zeros(total, dtype=numpy.int64)
+    lengths = numpy.zeros(total, dtype=numpy.int64)
+    leading[new] = headers[::2]
+    lengths[new] = headers[1::2] + numpy.uint64(1)
+    windows = numpy.maximum.accumulate(numpy.where(new, numpy.arange(total), 0))
+    widths = lengths[windows]
+    shifts = (64 - leading[windows] - widths).astype(numpy.uint64)
+    xors, position = read_fields(bits, position, widths)
+    words = numpy.zeros(count, dtype=numpy.uint64)
+    words[0] = first_word
+    words[1:][nonzero] = xors << shifts
+    return numpy.bitwise_xor.accumulate(words)
+
+def encode_chunk(timestamps, values):
+    '''Compress a chunk of points into a tuple of (count, start timestamp,
+    first delta, first value as a uint64, decimal places, data). The data
+    holds the timestamp delta-of-deltas as variable-width integers (see
+    `encode_integers()`), which take a bit each on a regular series. When
+    every value is a decimal with at most `MAX_DECIMALS` places the values
+    follow as the deltas of the scaled integers, otherwise decimal places is
+    `None` and the values are XORed with their predecessors in the Gorilla
+    style (see `encode_xors()`).'''
+    numpy = LazyImport.numpy()
+    count = len(timestamps)
+    deltas = numpy.diff(timestamps)
+    first_delta = int(deltas[0]) if count > 1 else 0
+    sections = [ encode_integers(numpy.diff(deltas)) ]
+    decimals = decimal_places(values)
+    if decimals is None:
+        sections.append(encode_xors(values.view(numpy.uint64)))
+    else:
+        scaled = numpy.rint(values * 10.0 ** decimals).astype(numpy.int64)
+        sections.append(encode_integers(numpy.diff(scaled)))
+    data = numpy.packbits(numpy.concatenate(sections)).tobytes()
+    return (count, int(timestamps[0]), first_delta, int(values[:1].view(numpy.uint64)[0]),
+        decimals, data)
+
+def decode_timestamps(chunk):
+    '''Decompress the timestamps of a chunk returned by `encode_chunk()`.'''
+    numpy = LazyImport.numpy()
+    count, start, first_delta, _, _, data = chunk
+    bits = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))
+    dod = decode_integers(bits, 0, max(0, count - 2))[0]
+    timestamps = numpy.empty(count, dtype=numpy.int64)
+    timestamps[0] = start
+    if count > 1:
+        deltas = numpy.empty(count - 1, dtype=numpy.int64)
+        deltas[0] = first_delta
+        numpy.cumsum(dod, out=deltas[1:])
+        deltas[1:] += first_delta
+        numpy.cumsum(deltas, out=timestamps[1:])
+        timestamps[1:] += start
+    return timestamps
+
+def decode_values(chunk):
+    '''Decompress the values of a chunk returned by `encode_chunk()`,
+    skipping over the timestamps without decoding them.'''
+    numpy = LazyImport.numpy()
+    count, _, _, first_word, decimals, data = chunk
+    bits = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))
+    position = skip_integers(bits, 0, max(0, count - 2))
+    if decimals is None:
+        return decode_xors(bits, position, first_word, count).view(numpy.float64)
+    scale = 10.0 ** decimals
+    first = numpy.array([ first_word ], dtype=numpy.uint64).view(numpy.float64)
+    scaled = numpy.empty(count, dtype=numpy.int64)
+    scaled[0] = int(numpy.rint(first[0] * scale))
+    scaled[1:] = decode_integers(bits, position, count - 1)[0]
+    return numpy.cumsum(scaled) / scale
+
+def decode_chunk(chunk):
+    '''Decompress a chunk returned by `encode_chunk()`, returning a tuple of
+    (timestamps, values) arrays.'''
+    return decode_timestamps(chunk), decode_values(chunk)
+
+class DecodedCache(object):
+    '''A cache of the decoded timestamp and value arrays of compressed
+    series, so the several reads of a series made by one operation decode
+    it once. Up to `size` bytes of arrays are kept across all series and
+    evicted least recently used first, so a large group of compressed series
+    does not also hold all of its data uncompressed. The most recent array
+    is kept even if it is larger. Entries are dropped when their series
+    changes or is garbage collected. The cached arrays are read-only.'''
+
+    def __init__(self, size=64 * 1024 * 1024):
+        self.size = size
+        self.used = 0
+        self.entries = OrderedDict()
+
+    def get(self, series, name):
+        '''Get the cached array `name` ('timestamps' or 'values') of
+        `series`, or `None`.'''
+        key = id(series), name
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.entries[key] = entry
+        return entry[1]
+
+    def peek(self, series, name):
+        '''Get a cached array like `get()` without marking it as used.'''
+        entry = self.entries.get((id(series), name))
+        return None if entry is None else entry[1]
+
+    def set(self, series, name, array):
+        '''Cache the array `name` of `series`.'''
+        key = id(series), name
+        self._discard(key)
+        array.flags.writeable = False
+        self.entries[key] = weakref.ref(series, lambda _: self._discard(key)), array
+        self.used += array.nbytes
+        while self.used > self.size and len(self.entries) > 1:
+            self._discard(next(iter(self.entries)))
+
+    def discard(self, series):
+        '''Drop the cached arrays of `series`.'''
+        for name in ('timestamps', 'values'):
+            self._discard((id(series), name))
+
+    def clear(self):
+        '''Drop all cached arrays.'''
+        self.entries.clear()
+        self.used = 0
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.used -= entry[1].nbytes
+
+class CompressedTimeSeries(TimeSeries):
+    '''A TimeSeries stored in compressed chunks (see `encode_chunk()`) and
+    decoded on demand. Every TimeSeries method works on a compressed series;
+    the results are ordinary, uncompressed series. Timestamps and values are
+    decoded separately and kept in `decoded_cache` until the series changes
+    or they are evicted. Looking up a single point with `asof()` or indexing
+    only decodes the chunk that holds it. Appending only re-encodes the last
+    chunk.'''
+
+    # The cache shared by all compressed series
+    decoded_cache = DecodedCache()
+
+    def __init__(self, points, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.length = 0
+        self._starts = None
+        super(CompressedTimeSeries, self).__init__(points)
+
+    @classmethod
+    def _from_arrays(cls, timestamps, values, presorted=False):
+        with span('construct') as measurement:
+            series = cls.__new__(cls)
+            series.chunk_size = CHUNK_SIZE
+            series.chunks = []
+            series.length = 0
+            series._starts = None
+            if presorted:
+                series._encode(timestamps, values)
+            else:
+                series._store(timestamps, values)
+            measurement.points = len(series)
+        return series
+
+    @property
+    def compressed_size(self):
+        '''Get the number of bytes used by the compressed chunks, including
+        the Python objects that hold them, and by any of its decoded arrays
+        held in `decoded_cache`.'''
+        size = sum(sys.getsizeof(chunk) + sum(sys.getsizeof(field) for field in chunk)
+            for chunk in self.chunks)
+        for name in ('timestamps', 'values'):
+            array = self.decoded_cache.peek(self, name)
+            if array is not None:
+                size += array.nbytes
+        return size
+
+    @property
+    def compression_ratio(self):
+        '''Get the size of the uncompressed arrays relative to the compressed
+        chunks.'''
+        if not self.chunks:
+            return 1.0
+        return 16.0 * self.length / self.compressed_size
+
+    def release(self):
+        '''Drop the decoded arrays of the series from `decoded_cache`.'''
+        self.decoded_cache.discard(self)
+
+    def decompress(self):
+        '''Get an uncompressed copy of the series.'''
+        return TimeSeries._from_arrays(self._timestamps.copy(), self._values.copy(),
+            presorted=True)
+
+    def chunk(self, index):
+        '''Decode a single chunk, returning a tuple of (timestamps, values).'''
+        return decode_chunk(self.chunks[index])
+
+    def asof(self, x):
+        if self.decoded_cache.peek(self, 'timestamps') is not None and \
+                self.decoded_cache.peek(self, 'values') is not None:
+            return super(CompressedTimeSeries, self).asof(x)
+        if self._starts is None:
+            self._starts = [ chunk[1] for chunk in self.chunks ]
+        index = bisect_right(self._starts, x) - 1
+        if index < 0:
+            raise KeyError(x)
+        timestamps, values = self.chunk(index)
+        position = timestamps.searchsorted(x, side='right') - 1
+        return timestamps[position].item(), values[position].item()
+
+    @property
+    def _timestamps(self):
+        return self._decode('timestamps', decode_timestamps, 'int64')
+
+    @property
+    def _values(self):
+        return self._decode('values', decode_values, 'float64')
+
+    def _set_arrays(self, timestamps, values):
+        self._encode(timestamps, values)
+
+    def extend(self, points):
+        numpy = LazyImport.numpy()
+        timestamps, values = self._unzip(points)
+        timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if timestamps.shape != values.shape or timestamps.ndim != 1:
+            raise ValueError('Timestamps and values must be equal length sequences')
+        if not len(timestamps):
+            return
+        if (numpy.diff(timestamps) < 0).any() or \
+                (self.chunks and timestamps[0] < self.chunk(-1)[0][-1]):
+            raise ValueError('Points must be appended in timestamp order')
+        if self.chunks and self.chunks[-1][0] < self.chunk_size:
+            last_timestamps, last_values = self.chunk(-1)
+            self.chunks.pop()
+            self.length -= len(last_timestamps)
+            timestamps = numpy.concatenate((last_timestamps, timestamps))
+            values = numpy.concatenate((last_values, values))
+        self._append_chunks(timestamps, values)
+
+    def append(self, timestamp, value):
+        self.extend([ (timestamp, value) ])
+
+    def _encode(self, timestamps, values):
+        numpy = LazyImport.numpy()
+        self.chunks = []
+        self.length = 0
+        self._append_chunks(numpy.ascontiguousarray(timestamps, dtype=numpy.int64),
+            numpy.ascontiguousarray(values, dtype=numpy.float64))
+
+    def _append_chunks(self, timestamps, values):
+        self.decoded_cache.discard(self)
+        self._starts = None
+        for start in xrange(0, len(timestamps), self.chunk_size):
+            stop = start + self.chunk_size
+            self.chunks.append(encode_chunk(timestamps[start:stop], values[start:stop]))
+        self.length += len(timestamps)
+
+    def _decode(self, name, decode, dtype):
+        array = self.decoded_cache.get(self, name)
+        if array is None:
+            numpy = LazyImport.numpy()
+            if not self.chunks:
+                array = numpy.zeros(0, dtype=dtype)
+            else:
+                array = numpy.concatenate([ decode(chunk) for chunk in self.chunks ])
+            self.decoded_cache.set(self, name, array)
+        return array
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return 'CompressedTimeSeries(%s)' % repr(self.points)
@@ -1,34 +1,282 @@
 from collections import MutableMapping
+from . import loading, polynomial, storage
 from .lazy_import import LazyImport
-from .utilities import table_output, to_datetime
+from .parallel import map_series
+from .alignment import lookup
+from .backtest import backtest
+from .dates import to_datetime64, format_dates
+from .utilities import table_output, same_arrays
 
 class DataFrame(MutableMapping):
     '''A group of TimeSeries.'''
 
     def __init__(self, *args, **kwargs):
         self.groups = {}
+        self.failures = {}
+        self._index = None
+        self._matrix = None
+        self._dates = None
         self.update(dict(*args, **kwargs))
 
     @property
     def timestamps(self):
         '''Get all timestamps from all series in the group.'''
-        timestamps = set()
-        for series in self.groups.itervalues():
-            timestamps |= set(series.timestamps)
-        return sorted(list(timestamps))
+        return self.index.tolist()
 
-    def trend(self, **kwargs):
+    @property
+    def index(self):
+        '''Get the sorted union of timestamps from all series in the group as
+        an array. The index is cached until the group or the timestamps of a
+        member series change.'''
+        arrays = [ series._timestamps for series in self.groups.itervalues() ]
+        if self._index is None or not same_arrays(self._index[0], arrays):
+            numpy = LazyImport.numpy()
+            if arrays:
+                index = numpy.unique(numpy.concatenate(arrays))
+            else:
+                index = numpy.zeros(0, dtype=numpy.int64)
+            self._index = arrays, index
+        return self._index[1]
+
+    @property
+    def datetime64(self):
+        '''Get the dates of `index` as a NumPy `datetime64[ms]` array of
+        wall-clock times in `TimeSeries.timezone`, cached with the index.'''
+        from .time_series import TimeSeries
+        index = self.index
+        if self._dates is None or self._dates[0] is not index or \
+                self._dates[1] is not TimeSeries.timezone:
+            self._dates = index, TimeSeries.timezone, \
+                to_datetime64(index, TimeSeries.timezone)
+        return self._dates[2]
+
+    @property
+    def matrix(self):
+        '''Get the values of all series as a 2-D array aligned to `index`,
+        with a row per series in iteration order. See `to_matrix()`.'''
+        return self.to_matrix()
+
+    def to_matrix(self, names=None):
+        '''Get the values of the named series (all series in iteration order
+        by default) as a 2-D array with a row per series and a column per
+        timestamp in `index`. Gaps are filled with NaN. Where a series has a
+        timestamp more than once the last value is used. The matrix for all
+        series is cached until the group changes and is shared between
+        callers, so it should not be modified.'''
+        index = self.index
+        if names is None:
+            names = list(self.groups)
+            arrays = [ self.groups[name]._values for name in names ]
+            if self._matrix is not None and self._matrix[0] == names and \
+                    self._matrix[1] is index and same_arrays(self._matrix[2], arrays):
+                return self._matrix[3]
+            matrix = self._build_matrix(index, names)
+            self._matrix = names, index, arrays, matrix
+            return matrix
+        return self._build_matrix(index, names)
+
+    def _build_matrix(self, index, names):
+        numpy = LazyImport.numpy()
+        matrix = numpy.empty((len(names), len(index)))
+        for row, name in enumerate(names):
+            series = self.groups[name]
+            matrix[row] = lookup(index, series._timestamps, series._values)[0]
+        return matrix
+
+    def _invalidate(self):
+        self._index = None
+        self._matrix = None
+        self._dates = None
+
+    def sum(self, strict=False):
+        '''Sum the series in the group at each timestamp. See `reduce()`.'''
+        return self.reduce(LazyImport.numpy().nansum, strict)
+
+    def mean(self, strict=False):
+        '''Average the series in the group at each timestamp. See `reduce()`.'''
+        return self.reduce(LazyImport.numpy().nanmean, strict)
+
+    def min(self, strict=False):
+        '''Get the minimum value across the group at each timestamp. See
+        `reduce()`.'''
+        return self.reduce(LazyImport.numpy().nanmin, strict)
+
+    def max(self, strict=False):
+        '''Get the maximum value across the group at each timestamp. See
+        `reduce()`.'''
+        return self.reduce(LazyImport.numpy().nanmax, strict)
+
+    def quantile(self, q, strict=False):
+        '''Get the `q` quantile (0 <= q <= 1) of the values across the group
+        at each timestamp. See `reduce()`.'''
+        if not 0 <= q <= 1:
+            raise ValueError('Quantiles must be between 0 and 1')
+        numpy = LazyImport.numpy()
+        return self.reduce(lambda matrix, axis:
+            numpy.nanpercentile(matrix, q * 100, axis=axis), strict)
+
+    def count(self, strict=False):
+        '''Count the series with a value at each timestamp. See `reduce()`.'''
+        numpy = LazyImport.numpy()
+        return self.reduce(lambda matrix, axis:
+            (~numpy.isnan(matrix)).sum(axis=axis).astype(float), strict)
+
+    def reduce(self, fn, strict=False):
+        '''Reduce the values of all series at each timestamp in `index` to a
+        single TimeSeries in one vectorized pass over `matrix`. `fn` is called
+        with the matrix and `axis=0`, and should ignore NaN gaps like
+        `numpy.nansum()`. When `strict` is true only timestamps present in
+        every series are kept.'''
+        from .time_series import TimeSeries
+        numpy = LazyImport.numpy()
+        index, matrix = self.index, self.matrix
+        if strict:
+            complete = ~numpy.isnan(matrix).any(axis=0)
+            index, matrix = index[complete], matrix[:, complete]
+        if not len(index):
+            return TimeSeries([])
+        return TimeSeries._from_arrays(index, fn(matrix, axis=0), presorted=True)
+
+    def trend(self, workers=None, **kwargs):
         '''Calculate a trend for all series in the group. See the
-        `TimeSeries.trend()` method for more information.'''
-        return DataFrame({ name: series.trend(**kwargs) \
-            for name, series in self.groups.iteritems() })
+        `TimeSeries.trend()` method for more information. See `forecast()`
+        for a description of `workers`.'''
+        if workers is not None:
+            return self._map_parallel('trend', (), kwargs, workers)
+        from .time_series import TimeSeries
+        numpy = LazyImport.numpy()
+        order = kwargs.pop('order', TimeSeries.LINEAR)
+        if kwargs:
+            raise TypeError('Unexpected trend() arguments: %s' % ', '.join(kwargs))
+        trends = {}
+        for timestamps, names in self._grids():
+            if not len(timestamps):
+                raise ArithmeticError('Cannot calculate the trend of an empty series')
+            values = numpy.column_stack([ self.groups[name]._values for name in names ])
+            fitted = polynomial.fit(timestamps, values, order)
+            for column, name in enumerate(names):
+                trends[name] = TimeSeries._from_arrays(timestamps,
+                    fitted[:, column], presorted=True)
+        return DataFrame(trends)
+
+    def _grids(self):
+        '''Group the names of series that share identical timestamps. Returns
+        a list of (timestamps, names) tuples.'''
+        numpy = LazyImport.numpy()
+        candidates = {}
+        for name, series in self.groups.iteritems():
+            timestamps = series._timestamps
+            key = len(timestamps), timestamps[:1].tobytes(), timestamps[-1:].tobytes()
+            for grid, names in candidates.setdefault(key, []):
+                if grid is timestamps or numpy.array_equal(grid, timestamps):
+                    names.append(name)
+                    break
+            else:
+                candidates[key].append((timestamps, [ name ]))
+        return [ grid for grids in candidates.itervalues() for grid in grids ]
 
-    def forecast(self, horizon, **kwargs):
+    def forecast(self, horizon, workers=None, **kwargs):
         '''Forecast all time series in the group. See the
-        `TimeSeries.forecast()` method for more information.'''
+        `TimeSeries.forecast()` method for more information. When `workers`
+        is set (a process count, a `multiprocessing.Pool` or a `WorkerPool`)
+        the series are forecast in parallel, and any series that fail are
+        left out of the result and recorded in its `failures` dict instead.'''
+        if workers is not None:
+            return self._map_parallel('forecast', (horizon,), kwargs, workers)
         return DataFrame({ name: series.forecast(horizon, **kwargs) \
             for name, series in self.groups.iteritems() })
 
+    def backtest(self, horizon, folds=3, methods=None, frequency=None,
+            step=None, workers=None):
+        '''Backtest forecast methods on all series in the group, returning a
+        dict of `Backtest` results by name. See the `TimeSeries.backtest()`
+        method for more information. Every fold of every series is fitted
+        in one batch per method when `workers` is set.'''
+        from .time_series import TimeSeries
+        if methods is None:
+            methods = (TimeSeries.ARIMA, TimeSeries.ETS)
+        return backtest(self.groups, horizon, folds, methods, frequency, step,
+            workers)
+
+    def _map_parallel(self, method, args, kwargs, workers):
+        results, failures = map_series(self.groups, method, args, kwargs, workers)
+        frame = DataFrame(results)
+        frame.failures = failures
+        return frame
+
+    def resample(self, interval, how='mean'):
+        '''Resample all series in the group. See the `TimeSeries.resample()`
+        method for more information.'''
+        return DataFrame({ name: series.resample(interval, how) \
+            for name, series in self.groups.iteritems() })
+
+    def regularize(self, interval=None, fill=None):
+        '''Regularize all series in the group. See the
+        `TimeSeries.regularize()` method for more information.'''
+        return DataFrame({ name: series.regularize(interval, fill) \
+            for name, series in self.groups.iteritems() })
+
+    def save(self, path):
+        '''Save all series in the group to `path` in the binary format
+        described in `timeseries.storage`.'''
+        storage.write(path, [ (name, series._timestamps, series._values)
+            for name, series in self.groups.iteritems() ])
+
+    @classmethod
+    def load(cls, path, memory_map=True):
+        '''Load a group saved with `save()`. Each series is backed by a
+        read-only memory map of the file unless `memory_map` is false.'''
+        from .time_series import TimeSeries
+        return cls({ name: TimeSeries._from_arrays(timestamps, values, presorted=True)
+            for name, timestamps, values in storage.read(path, memory_map) })
+
+    @classmethod
+    def from_csv(cls, source, layout='wide', delimiter=',', header=None,
+            chunk_size=loading.CHUNK_SIZE):
+        '''Load a group from a CSV file (a path or a file object), parsing
+        about `chunk_size` bytes at a time straight into arrays. In the `wide`
+        layout the first column holds timestamps in milliseconds and each
+        other column is a series named by the header (or by its column
+        index), with empty fields left out of the series. In the `long`
+        layout each line holds a series name, a timestamp and a value. The
+        first line is skipped as a header if it is not numeric, unless
+        `header` is given. Sorting is skipped for series that are already in
+        order. An empty timestamp raises `ValueError`.'''
+        from .time_series import TimeSeries
+        numpy = LazyImport.numpy()
+        if layout not in ('wide', 'long'):
+            raise ValueError('Unknown CSV layout %r' % layout)
+        builders = {}
+        rows = loading.read_csv(source, delimiter, header, chunk_size,
+            labelled=layout == 'long')
+        names = next(rows)
+        row = 0
+        for chunk in rows:
+            if layout == 'long':
+                labels, chunk = chunk
+                timestamps = loading.parse_timestamps(chunk[:, 0], row)
+                row += len(chunk)
+                labels = numpy.array(labels)
+                order = numpy.argsort(labels, kind='mergesort')
+                labels, timestamps, values = labels[order], timestamps[order], chunk[order, 1]
+                starts = numpy.flatnonzero(numpy.concatenate(([ True ],
+                    labels[1:] != labels[:-1])))
+                stops = numpy.append(starts[1:], len(labels))
+                for start, stop in zip(starts, stops):
+                    builder = builders.setdefault(str(labels[start]), loading.SeriesBuilder())
+                    builder.add(timestamps[start:stop], values[start:stop])
+                continue
+            timestamps = loading.parse_timestamps(chunk[:, 0], row)
+            row += len(chunk)
+            for column in xrange(1, chunk.shape[1]):
+                name = names[column] if names else str(column)
+                values = chunk[:, column]
+                present = ~numpy.isnan(values)
+                builders.setdefault(name, loading.SeriesBuilder()).add(
+                    timestamps[present], values[present])
+        return cls({ name: builder.build(TimeSeries)
+            for name, builder in builders.iteritems() })
+
     def plot(self, overlay=True, **labels): # pragma: no cover
         '''Plot all time series in the group.'''
         pylab = LazyImport.pylab()
@@ -57,6 +305,7 @@ class DataFrame(MutableMapping):
             if old in self.groups:
                 self.groups[new] = self.groups[old]
                 del self.groups[old]
+        self._invalidate()
 
     def round(self, n=0):
         # Manual delegation for v2.x
@@ -78,12 +327,14 @@ class DataFrame(MutableMapping):
 
     def __setitem__(self, key, value):
         self.groups[key] = value
+        self._invalidate()
 
     def __getattr__(self, key):
         return self.groups[key]
 
     def __delitem__(self, key):
         del self.groups[key]
+        self._invalidate()
 
     def __iter__(self):
         return iter(self.groups)
@@ -92,19 +343,11 @@ class DataFrame(MutableMapping):
         return len(self.groups)
 
     def __str__(self): # pragma: no cover
-        data = []
-        timestamps = self.timestamps
-        dates = [ to_datetime(date).isoformat(' ') for date in timestamps ]
+        dates = format_dates(self.datetime64)
         data = [ ( 'Date', dates ) ]
-        for key, series in self.groups.iteritems():
-            row = []
-            series = dict(series.points)
-            for timestamp in timestamps:
-                if timestamp in series:
-                    row.append(series[timestamp])
-                else:
-                    row.append('')
-            data.append(( key, row ))
+        for name, row in zip(self.groups, self.matrix):
+            data.append(( name, [ '' if value != value else value
+                for value in row.tolist() ] ))
         return table_output(data)
 
     def __repr__(self):
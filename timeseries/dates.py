@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, tzinfo
+from .lazy_import import LazyImport
+
+# Milliseconds between the times at which UTC offsets are sampled. Offsets
+# are assumed to change at most once between samples, which holds for every
+# zone in the tz database (the closest changes are four days apart).
+SAMPLE_INTERVAL = 3 * 86400000
+
+class FixedOffset(tzinfo):
+    '''A timezone at a fixed offset of `minutes` east of UTC.'''
+
+    def __init__(self, minutes, name=None):
+        self.minutes = minutes
+        self.offset = timedelta(minutes=minutes)
+        if name is None:
+            sign = '-' if minutes < 0 else '+'
+            name = 'UTC%s%02d:%02d' % (sign, abs(minutes) // 60, abs(minutes) % 60)
+        self.name = name
+
+    def utcoffset(self, date):
+        return self.offset
+
+    def dst(self, date):
+        return timedelta(0)
+
+    def tzname(self, date):
+        return self.name
+
+    def __repr__(self):
+        return 'FixedOffset(%d, %r)' % (self.minutes, self.name)
+
+UTC = FixedOffset(0, 'UTC')
+
+def utc_offset(timestamp, timezone=None):
+    '''Get the offset from UTC in milliseconds of `timezone` (a tzinfo, or
+    the local timezone when `None`) at a timestamp in milliseconds.'''
+    seconds = timestamp / 1000.0
+    if timezone is None:
+        delta = datetime.fromtimestamp(seconds) - datetime.utcfromtimestamp(seconds)
+    else:
+        delta = datetime.fromtimestamp(seconds, timezone).utcoffset()
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+def transitions(start, stop, timezone=None):
+    '''Find the changes in the UTC offset of `timezone` between timestamps
+    `start` and `stop`. Offsets are sampled at both ends and every
+    `SAMPLE_INTERVAL` between them, and each change between samples is
+    bisected to the millisecond. Returns a tuple of (times, offsets) where
+    `offsets[0]` holds before `times[0]` and `offsets[i]` from
+    `times[i - 1]`.'''
+    bounds = range(start, stop, SAMPLE_INTERVAL) + [ stop ]
+    samples = [ utc_offset(bound, timezone) for bound in bounds ]
+    times, offsets = [], samples[:1]
+    for low, high, before, after in zip(bounds, bounds[1:], samples, samples[1:]):
+        if before == after:
+            continue
+        while high - low > 1:
+            middle = (low + high) // 2
+            if utc_offset(middle, timezone) == before:
+                low = middle
+            else:
+                high = middle
+        times.append(high)
+        offsets.append(after)
+    return times, offsets
+
+def utc_offsets(timestamps, timezone=None):
+    '''Get the offset from UTC of `timezone` at each timestamp, or a single
+    offset for a `FixedOffset` or a span without changes. Offsets are looked
+    up every few days and where they change rather than once per point.'''
+    numpy = LazyImport.numpy()
+    if isinstance(timezone, FixedOffset):
+        return timezone.minutes * 60000
+    times, offsets = transitions(int(timestamps.min()), int(timestamps.max()), timezone)
+    if not times:
+        return offsets[0]
+    offsets = numpy.array(offsets, dtype=numpy.int64)
+    return offsets[numpy.searchsorted(times, timestamps, side='right')]
+
+def to_datetime64(timestamps, timezone=None):
+    '''Convert an int64 array of timestamps in milliseconds to a
+    `datetime64[ms]` array of the wall-clock times in `timezone` (a tzinfo,
+    or the local timezone when `None`). For UTC the timestamps are viewed
+    without copying, and the view is read-only so that it cannot be used to
+    change them.'''
+    numpy = LazyImport.numpy()
+    timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+    offsets = utc_offsets(timestamps, timezone) if len(timestamps) else 0
+    if numpy.isscalar(offsets) and not offsets:
+        dates = timestamps.view('datetime64[ms]')
+        dates.flags.writeable = False
+        return dates
+    return (timestamps + offsets).view('datetime64[ms]')
+
+def format_dates(dates):
+    '''Format a `datetime64[ms]` array as 'YYYY-MM-DD HH:MM:SS' strings, as
+    `datetime.isoformat(' ')` does, with milliseconds only when some date
+    has them.'''
+    numpy = LazyImport.numpy()
+    unit = 'ms' if (dates.view(numpy.int64) % 1000).any() else 's'
+    return numpy.char.replace(numpy.datetime_as_string(dates, unit=unit), 'T', ' ')
@@ -0,0 +1,172 @@
+from itertools import product
+from .lazy_import import LazyImport
+
+# Seasonal components
+ADDITIVE = 'additive'
+MULTIPLICATIVE = 'multiplicative'
+
+class ExponentialSmoothing(object):
+    '''Exponential smoothing models (simple, Holt and Holt-Winters) fitted
+    in-process with NumPy. The smoothing parameters are chosen to minimise
+    the sum of squared one-step errors with a grid search that evaluates
+    every candidate in a single pass over the most recent `SEARCH_POINTS`
+    points (or four seasons, if longer), which the parameters mostly depend
+    on. The chosen model is then run over the whole series.'''
+
+    # Grid search settings
+    GRID = 9
+    REFINEMENTS = 4
+    LOWER = 0.0001
+    UPPER = 0.9999
+    SEARCH_POINTS = 1000
+
+    def __init__(self, trend=False, seasonal=None, period=None):
+        if seasonal not in (None, ADDITIVE, MULTIPLICATIVE):
+            raise ValueError('Unknown seasonal component')
+        if seasonal is not None:
+            if period is None or period < 2:
+                raise ValueError('A seasonal model requires a period of at least 2')
+            period = int(period)
+        self.trend = trend
+        self.seasonal = seasonal
+        self.period = period
+        self.alpha = self.beta = self.gamma = None
+        self.sse = None
+        self.state = None
+        self.length = None
+
+    @property
+    def parameters(self):
+        '''Get the names of the smoothing parameters used by the model.'''
+        names = [ 'alpha' ]
+        if self.trend:
+            names.append('beta')
+        if self.seasonal is not None:
+            names.append('gamma')
+        return names
+
+    def fit(self, values):
+        '''Fit the model to an array of values and return the model.'''
+        numpy = LazyImport.numpy()
+        values = numpy.asarray(values, dtype=numpy.float64)
+        self._validate(values)
+        dimensions = len(self.parameters)
+        step = (self.UPPER - self.LOWER) / (self.GRID + 1)
+        axis = numpy.linspace(self.LOWER + step, self.UPPER - step, self.GRID)
+        candidates = numpy.array(list(product(axis, repeat=dimensions)))
+        recent = values[self._search_start(len(values)):]
+        best = self._search(recent, candidates)
+        offsets = numpy.array([ -2, -1, 0, 1, 2 ], dtype=numpy.float64)
+        for _ in xrange(self.REFINEMENTS):
+            step /= 2
+            axes = [ numpy.clip(centre + offsets * step, self.LOWER, self.UPPER)
+                for centre in best ]
+            best = self._search(recent, numpy.array(list(product(*axes))))
+        for name, value in zip(self.parameters, best):
+            setattr(self, name, float(value))
+        sse, (level, trend, season) = self._smooth(values, best[numpy.newaxis, :])
+        self.sse = float(sse[0])
+        self.state = (level[0], trend[0], None if season is None else season[0])
+        self.length = len(values)
+        return self
+
+    def forecast(self, horizon):
+        '''Forecast `horizon` values beyond the end of the fitted series.'''
+        if self.state is None:
+            raise ArithmeticError('The model must be fitted before forecasting')
+        numpy = LazyImport.numpy()
+        level, trend, season = self.state
+        steps = numpy.arange(1, horizon + 1, dtype=numpy.float64)
+        forecast = level + steps * trend
+        if self.seasonal is not None:
+            index = (self.length + numpy.arange(horizon)) % self.period
+            if self.seasonal == ADDITIVE:
+                forecast += season[index]
+            else:
+                forecast *= season[index]
+        return forecast
+
+    def _validate(self, values):
+        numpy = LazyImport.numpy()
+        if values.ndim != 1 or not numpy.isfinite(values).all():
+            raise ValueError('Values must be a one-dimensional array of finite numbers')
+        minimum = 2 * self.period if self.seasonal is not None else 2
+        if len(values) < minimum:
+            raise ArithmeticError('Not enough points to fit the model')
+        if self.seasonal == MULTIPLICATIVE and (values <= 0).any():
+            raise ArithmeticError('Multiplicative seasonality requires positive values')
+
+    def _search_start(self, length):
+        '''Get the index of the first point searched, which starts a season
+        so the seasonal indices match those of the whole series.'''
+        size = self.SEARCH_POINTS
+        if self.seasonal is not None:
+            size = max(size, 4 * self.period)
+        start = max(0, length - size)
+        if self.seasonal is not None:
+            start -= start % self.period
+        return start
+
+    def _search(self, values, candidates):
+        sse, _ = self._smooth(values, candidates)
+        return candidates[LazyImport.numpy().nanargmin(sse)]
+
+    def _initial(self, values):
+        '''Get the initial (level, trend, season) state and the index of the
+        first value to smooth.'''
+        if self.seasonal is None:
+            trend = values[1] - values[0] if self.trend else 0.0
+            return values[0], trend, None, 1
+        period = self.period
+        first = values[:period].mean()
+        trend = (values[period:2*period].mean() - first) / period if self.trend else 0.0
+        if self.seasonal == ADDITIVE:
+            season = values[:period] - first
+        else:
+            season = values[:period] / first
+        return first, trend, season, 0
+
+    def _smooth(self, values, candidates):
+        '''Run the smoothing recursions for every row of `candidates` (a
+        matrix of parameter values, one column per parameter) at once.
+        Returns the sum of squared errors for each candidate and the final
+        (level, trend, season) state arrays.'''
+        numpy = LazyImport.numpy()
+        columns = dict(zip(self.parameters, candidates.T))
+        alpha = columns['alpha']
+        beta = columns.get('beta')
+        gamma = columns.get('gamma')
+        count = len(candidates)
+        level, trend, season, start = self._initial(values)
+        level = numpy.full(count, level)
+        trend = numpy.full(count, trend)
+        if season is not None:
+            # One row per seasonal index so each update touches contiguous memory
+            season = numpy.repeat(season[:, numpy.newaxis], count, axis=1)
+        sse = numpy.zeros(count)
+        additive = self.seasonal == ADDITIVE
+        period = self.period
+        with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for t in xrange(start, len(values)):
+                y = values[t]
+                base = level + trend
+                if season is None:
+                    error = y - base
+                    new_level = base + alpha * error
+                else:
+                    seasonal = season[t % period]
+                    if additive:
+                        error = y - base - seasonal
+                        new_level = base + alpha * error
+                        seasonal += gamma * (y - new_level - seasonal)
+                    else:
+                        error = y - base * seasonal
+                        new_level = base + alpha * (y / seasonal - base)
+                        seasonal += gamma * (y / new_level - seasonal)
+                if beta is not None:
+                    trend += beta * (new_level - level - trend)
+                level = new_level
+                sse += error * error
+        if season is not None:
+            season = season.T
+        return sse, (level, trend, season)
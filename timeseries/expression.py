@@ -0,0 +1,169 @@
+import operator
+from functools import partial
+from .lazy_import import LazyImport
+from .utilities import divide
+
+# Points evaluated at a time, small enough for the temporaries of a block
+# to stay in cache
+BLOCK_SIZE = 1 << 14
+
+def ufunc(name):
+    '''Get a function that applies the numpy ufunc `name` when called.'''
+    def apply(*args, **kwargs):
+        return getattr(LazyImport.numpy(), name)(*args, **kwargs)
+    return apply
+
+def apply_binary(fn, left, right, out=None):
+    '''Apply a binary function that does not accept an `out` argument.'''
+    return fn(left, right)
+
+# Functions that can write to an `out` array, used by the expression in
+# place of the functions accepted by combine(). operator.pow is left out as
+# ndarray.__pow__ special cases some exponents, giving different rounding.
+UFUNCS = {
+    operator.add: ufunc('add'),
+    operator.sub: ufunc('subtract'),
+    operator.mul: ufunc('multiply'),
+    divide: divide,
+}
+
+def map_values(fn, values, out=None):
+    '''Apply `fn` to each value in an array.'''
+    numpy = LazyImport.numpy()
+    return numpy.fromiter((fn(y) for y in values.tolist()), numpy.float64, len(values))
+
+def round_values(n, values, out=None):
+    '''Round each value in an array to `n` digits as the builtin `round()`
+    does, which rounds halves away from zero.'''
+    return map_values(lambda y: round(y, n), values)
+
+class Expression(object):
+    '''A lazily evaluated TimeSeries expression, created with
+    `TimeSeries.lazy()`. Arithmetic operators, `map()`, `abs()` and `round()`
+    build an expression tree rather than a series, and `evaluate()` aligns
+    every input series once and computes the whole tree in a single blocked
+    pass, without creating intermediate series. The result has the same
+    points as evaluating the expression eagerly with inner joins.'''
+
+    def __init__(self, fn, operands):
+        self.fn = fn
+        if fn is not None:
+            operands = [ Expression(None, (operand,)) if is_series(operand)
+                else operand for operand in operands ]
+        self.operands = tuple(operands)
+
+    def evaluate(self):
+        '''Evaluate the expression, returning a TimeSeries.'''
+        from .time_series import TimeSeries
+        numpy = LazyImport.numpy()
+        # The leftmost series provides the timestamps, as in eager evaluation
+        node = self
+        while node.fn is not None:
+            node = node.operands[0]
+        base = node.operands[0]
+        index = base._timestamps
+        # Positions of the kept timestamps in the base series (all when
+        # `None`) and in each of the other series
+        selected = None
+        positions = []
+        for series in self.leaves(False):
+            timestamps = series._timestamps
+            if len(timestamps):
+                # The last point wins where a timestamp occurs more than once
+                position = timestamps.searchsorted(index, side='right') - 1
+                position[position < 0] = 0
+                found = timestamps[position] == index
+            else:
+                position = numpy.zeros(len(index), dtype=numpy.intp)
+                found = numpy.zeros(len(index), dtype=bool)
+            if not found.all():
+                # Narrow the index so later searches are over fewer points
+                index = index[found]
+                position = position[found]
+                selected = numpy.flatnonzero(found) if selected is None \
+                    else selected[found]
+                positions = [ (other, kept[found]) for other, kept in positions ]
+            positions.append((series, position))
+        arrays = { None: base._values if selected is None else base._values[selected] }
+        for series, position in positions:
+            arrays[id(series)] = series._values[position]
+        result = numpy.empty(len(index))
+        for start in xrange(0, len(index), BLOCK_SIZE):
+            stop = start + BLOCK_SIZE
+            result[start:stop] = self._compute(arrays, start, stop, True)[0]
+        return TimeSeries._from_arrays(index, result, presorted=True)
+
+    def leaves(self, include_leftmost=True):
+        '''Get the distinct series in the expression, optionally leaving out
+        the leftmost leaf unless the series appears elsewhere.'''
+        if self.fn is None:
+            return [ self.operands[0] ] if include_leftmost else []
+        leaves = []
+        for position, operand in enumerate(self.operands):
+            if isinstance(operand, Expression):
+                for series in operand.leaves(include_leftmost or position > 0):
+                    if not any(series is leaf for leaf in leaves):
+                        leaves.append(series)
+        return leaves
+
+    def _compute(self, arrays, start, stop, leftmost):
+        '''Compute the values of the block [start:stop), returning a tuple of
+        (values, owned) where `owned` is true if the values are a temporary
+        array that can be overwritten. The leftmost series is keyed by `None`
+        in `arrays`, and other series by their id.'''
+        if self.fn is None:
+            return arrays[None if leftmost else id(self.operands[0])][start:stop], False
+        args = []
+        out = None
+        for position, operand in enumerate(self.operands):
+            if isinstance(operand, Expression):
+                values, owned = operand._compute(arrays, start, stop,
+                    leftmost and position == 0)
+                if owned and out is None:
+                    out = values
+                operand = values
+            args.append(operand)
+        return self.fn(*args, out=out), True
+
+    def map(self, fn):
+        '''Run a map function across all values. See `TimeSeries.map()`.'''
+        return Expression(partial(map_values, fn), (self,))
+
+    def __abs__(self):
+        return Expression(ufunc('absolute'), (self,))
+
+    def __round__(self, n=0):
+        return Expression(partial(round_values, n), (self,))
+
+    def round(self, n=0):
+        # Manual delegation for v2.x
+        return self.__round__(n)
+
+    def combine(self, operand, fn):
+        '''Combine the expression with a series, another expression or a
+        scalar using `fn`. See `TimeSeries.combine()`.'''
+        if fn not in UFUNCS:
+            return Expression(partial(apply_binary, fn), (self, operand))
+        return Expression(UFUNCS[fn], (self, operand))
+
+    def __add__(self, operand):
+        return self.combine(operand, operator.add)
+
+    def __sub__(self, operand):
+        return self.combine(operand, operator.sub)
+
+    def __mul__(self, operand):
+        return self.combine(operand, operator.mul)
+
+    def __div__(self, operand):
+        return self.combine(operand, divide)
+
+    def __pow__(self, operand):
+        return self.combine(operand, operator.pow)
+
+    def __repr__(self):
+        return 'Expression(%d series)' % len(self.leaves())
+
+def is_series(operand):
+    from .time_series import TimeSeries
+    return isinstance(operand, TimeSeries)
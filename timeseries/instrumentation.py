@@ -0,0 +1,148 @@
+import timeit
+from functools import wraps
+from contextlib import contextmanager
+from .utilities import table_output
+
+# The Registry receiving measurements, or None when instrumentation is off
+active = None
+
+class Measurement(object):
+    '''Totals for one instrumented operation.'''
+
+    __slots__ = ('calls', 'seconds', 'points', 'bytes')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.points = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return 'Measurement(calls=%d, seconds=%f, points=%d, bytes=%d)' % (
+            self.calls, self.seconds, self.points, self.bytes)
+
+class Registry(object):
+    '''Collects the call count, wall time, points processed and bytes
+    converted for each instrumented operation while it is active, see
+    `instrument()`. Operations that call other instrumented operations are
+    timed including them. `timer` is called to read the time; override
+    `record()` to send measurements elsewhere.'''
+
+    def __init__(self, timer=timeit.default_timer):
+        self.timer = timer
+        self.measurements = {}
+
+    def record(self, name, seconds, points=0, bytes=0):
+        '''Record a call to the operation `name`.'''
+        measurement = self.measurements.get(name)
+        if measurement is None:
+            measurement = self.measurements[name] = Measurement()
+        measurement.calls += 1
+        measurement.seconds += seconds
+        measurement.points += points
+        measurement.bytes += bytes
+
+    def reset(self):
+        '''Discard all measurements.'''
+        self.measurements.clear()
+
+    def __getitem__(self, name):
+        return self.measurements[name]
+
+    def __contains__(self, name):
+        return name in self.measurements
+
+    def __str__(self):
+        names = sorted(self.measurements, key=lambda name: -self.measurements[name].seconds)
+        rows = [ self.measurements[name] for name in names ]
+        return table_output([
+            ( 'Operation', names ),
+            ( 'Calls', [ row.calls for row in rows ] ),
+            ( 'Seconds', [ '%.6f' % row.seconds for row in rows ] ),
+            ( 'Points', [ row.points for row in rows ] ),
+            ( 'Bytes', [ row.bytes for row in rows ] ),
+        ])
+
+@contextmanager
+def instrument(registry=None):
+    '''Record instrumented operations in `registry` (a new `Registry` by
+    default) within a `with` block, which yields the registry. The registry
+    is process wide, so calls in other threads are recorded too, while
+    calls in worker processes are not.'''
+    global active
+    if registry is None:
+        registry = Registry()
+    previous, active = active, registry
+    try:
+        yield registry
+    finally:
+        active = previous
+
+class Span(object):
+    '''Times a block of code for `span()`. `points` and `bytes` can be
+    updated within the block.'''
+
+    __slots__ = ('registry', 'name', 'points', 'bytes', 'start')
+
+    def __init__(self, registry, name, points, bytes):
+        self.registry = registry
+        self.name = name
+        self.points = points
+        self.bytes = bytes
+
+    def __enter__(self):
+        self.start = self.registry.timer()
+        return self
+
+    def __exit__(self, *error):
+        self.registry.record(self.name, self.registry.timer() - self.start,
+            self.points, self.bytes)
+
+class NullSpan(object):
+    '''The span used when instrumentation is off, which does nothing. It is
+    shared, so setting `points` or `bytes` on it is ignored rather than
+    stored.'''
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def span(name, points=0, bytes=0):
+    '''Get a context manager that records the block it wraps as a call to
+    the operation `name`.'''
+    if active is None:
+        return NULL_SPAN
+    return Span(active, name, points, bytes)
+
+def instrumented(name, points=None):
+    '''Decorate a function so calls are recorded as the operation `name`.
+    `points` is a function of the positional arguments giving the number of
+    points processed. When instrumentation is off the only cost is a check
+    of `active`.'''
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            registry = active
+            if registry is None:
+                return fn(*args, **kwargs)
+            start = registry.timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.record(name, registry.timer() - start,
+                    points(args) if points is not None else 0)
+        return wrapper
+    return decorate
+
+def series_points(args):
+    '''Get the length of a series passed as the first argument.'''
+    return len(args[0])
@@ -1,6 +1,7 @@
 class LazyImport(object): # pragma: no cover
-    '''Lazily import modules that aren't required for most functionality
-    in the library.'''
+    '''Lazily import numpy, which is required to store any series, and the
+    optional rpy2 and matplotlib modules, which are only needed for R
+    forecasts and plotting.'''
 
     numpy_module = None
     rpy2_module = None
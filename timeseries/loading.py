@@ -0,0 +1,156 @@
+from .lazy_import import LazyImport
+from .alignment import in_order
+
+# Bytes of text parsed at a time
+CHUNK_SIZE = 1 << 22
+
+# Little-endian (timestamp, value) records read by `read_records()`
+RECORD = [ ('timestamp', '<i8'), ('value', '<f8') ]
+
+class SeriesBuilder(object):
+    '''Collects the timestamps and values of a series chunk by chunk,
+    tracking whether the timestamps arrive in order so the series can be
+    built without sorting.'''
+
+    def __init__(self):
+        self.timestamps = []
+        self.values = []
+        self.presorted = True
+        self.last = None
+
+    def add(self, timestamps, values):
+        '''Add arrays of timestamps and values.'''
+        if not len(timestamps):
+            return
+        if self.presorted:
+            self.presorted = in_order(timestamps) and \
+                (self.last is None or timestamps[0] >= self.last)
+        self.last = timestamps[-1]
+        self.timestamps.append(timestamps)
+        self.values.append(values)
+
+    def build(self, cls):
+        '''Create an instance of the TimeSeries class `cls` from the points.'''
+        numpy = LazyImport.numpy()
+        if not self.timestamps:
+            return cls._from_arrays(numpy.zeros(0, dtype=numpy.int64),
+                numpy.zeros(0, dtype=numpy.float64), presorted=True)
+        timestamps = numpy.concatenate(self.timestamps)
+        values = numpy.concatenate(self.values)
+        self.timestamps, self.values = [], []
+        return cls._from_arrays(timestamps, values, presorted=self.presorted)
+
+def read_blocks(source, chunk_size=CHUNK_SIZE):
+    '''Yield blocks of whole lines from a path or file object, reading about
+    `chunk_size` bytes at a time. Line endings are normalized and blank
+    lines are removed, so each block is a non-empty string of lines
+    separated by newlines.'''
+    if isinstance(source, basestring):
+        with open(source, 'rb') as lines:
+            for block in read_blocks(lines, chunk_size):
+                yield block
+        return
+    remainder = ''
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            block, remainder = remainder, ''
+        else:
+            end = data.rfind('\n')
+            if end < 0:
+                remainder += data
+                continue
+            block, remainder = remainder + data[:end], data[end + 1:]
+        block = block.replace('\r', '')
+        while '\n\n' in block:
+            block = block.replace('\n\n', '\n')
+        block = block.strip('\n')
+        if block:
+            yield block
+        if not data:
+            return
+
+def parse_rows(block, delimiter=','):
+    '''Parse a block of lines of numeric fields into a 2-D float64 array
+    with a row per line. Empty fields are read as NaN. Timestamps are exact
+    as long as they are below 2^53.'''
+    numpy = LazyImport.numpy()
+    first = block.split('\n', 1)[0]
+    columns = first.count(delimiter) + 1
+    rows = block.count('\n') + 1
+    text = block.replace('\n', delimiter)
+    empty = delimiter * 2
+    while empty in text:
+        text = text.replace(empty, delimiter + 'nan' + delimiter)
+    if text.startswith(delimiter):
+        text = 'nan' + text
+    if text.endswith(delimiter):
+        text += 'nan'
+    fields = numpy.fromstring(text, sep=delimiter)
+    if len(fields) != rows * columns:
+        raise ValueError('Expected %d numeric fields in each line of %r...'
+            % (columns, first))
+    return fields.reshape(rows, columns)
+
+def parse_timestamps(column, row=0):
+    '''Convert a float64 column of timestamps from `parse_rows()` to int64,
+    raising `ValueError` for an empty or non-finite timestamp. `row` is the
+    number of data rows before the column, so that the error names the row
+    counting from 1.'''
+    numpy = LazyImport.numpy()
+    finite = numpy.isfinite(column)
+    if not finite.all():
+        raise ValueError('Missing or invalid timestamp in data row %d'
+            % (row + 1 + int(numpy.argmin(finite))))
+    return column.astype(numpy.int64)
+
+def is_header(line, delimiter=','):
+    '''Check whether a line has fields that are not numeric.'''
+    try:
+        parse_rows(line, delimiter)
+    except ValueError:
+        return True
+    return False
+
+def read_csv(source, delimiter=',', header=None, chunk_size=CHUNK_SIZE,
+        labelled=False):
+    '''Read a numeric CSV file in blocks of about `chunk_size` bytes. Yields
+    the header fields (or `None` when there is no header) followed by a 2-D
+    float64 array for each block, see `parse_rows()`. When `header` is
+    `None` the first line is treated as a header if it is not numeric. When
+    `labelled` is true the first field of each line is a label rather than a
+    number, and (labels, rows) tuples are yielded for each block instead.'''
+    first = True
+    for block in read_blocks(source, chunk_size):
+        if first:
+            first = False
+            line, _, rest = block.partition('\n')
+            fields = line.split(delimiter)
+            if header is None:
+                data = delimiter.join(fields[1:]) if labelled else line
+                header = is_header(data, delimiter)
+            if header:
+                yield [ field.strip() for field in fields ]
+                block = rest
+            else:
+                yield None
+            if not block:
+                continue
+        if labelled:
+            split = [ line.split(delimiter, 1) for line in block.split('\n') ]
+            if any(len(fields) != 2 for fields in split):
+                raise ValueError('Expected a label and numeric fields in each line')
+            yield [ label.strip() for label, _ in split ], \
+                parse_rows('\n'.join([ rest for _, rest in split ]), delimiter)
+        else:
+            yield parse_rows(block, delimiter)
+    if first:
+        yield None
+
+def read_records(buffer, offset=0, count=-1):
+    '''Get contiguous timestamp and value arrays from a buffer of
+    little-endian (int64 timestamp, float64 value) records.'''
+    numpy = LazyImport.numpy()
+    records = numpy.frombuffer(buffer, dtype=RECORD, count=count, offset=offset)
+    return (numpy.ascontiguousarray(records['timestamp'], dtype=numpy.int64),
+        numpy.ascontiguousarray(records['value'], dtype=numpy.float64))
@@ -0,0 +1,175 @@
+import math
+from collections import deque
+from .lazy_import import LazyImport
+
+class RunningMovingAverage(object):
+    '''A simple moving average over the last `window` values that is updated
+    in O(1) time per point. The running sum is recalculated from the window
+    once every `window` updates so rounding errors do not accumulate. Like
+    `TimeSeries.moving_average()`, the average is NaN only while a
+    non-finite value is in the window.'''
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError('The window must contain at least one point')
+        self.window = window
+        self.points = deque()
+        self.total = 0.0
+        self.nonfinite = 0
+        self.updates = 0
+        self.timestamp = None
+
+    @property
+    def value(self):
+        '''Get the current moving average, or `None` until `window` points have
+        been seen.'''
+        if len(self.points) < self.window:
+            return None
+        if self.nonfinite:
+            return float('nan')
+        return self.total / self.window
+
+    def update(self, timestamp, value):
+        '''Add a point and return the new moving average (see `value`).'''
+        self.points.append(value)
+        self._add(value, 1)
+        if len(self.points) > self.window:
+            self._add(self.points.popleft(), -1)
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.total = float(sum(point for point in self.points if finite(point)))
+        self.timestamp = timestamp
+        return self.value
+
+    def extend(self, points):
+        '''Add each (timestamp, value) point in turn and return the final
+        moving average.'''
+        for timestamp, value in points:
+            self.update(timestamp, value)
+        return self.value
+
+    def _add(self, value, sign):
+        if finite(value):
+            self.total += sign * value
+        else:
+            self.nonfinite += sign
+
+def finite(value):
+    '''Check whether a number is neither NaN nor infinite.'''
+    return not (math.isnan(value) or math.isinf(value))
+
+class RecursiveTrend(object):
+    '''A polynomial trend of the specified order that is refined as each
+    point arrives, giving the same coefficients as
+    `TimeSeries.trend_coefficients()` at a constant cost per point. Rather
+    than accumulating the normal equations, whose conditioning is the square
+    of the problem's, it keeps the triangular factor R of a QR decomposition
+    of the design matrix and updates it with Givens rotations. Timestamps are
+    centred and scaled so that those seen so far lie in [-1, 1]; when a point
+    falls outside [-RESCALE, RESCALE] the factor is moved to a new centre and
+    scale, which happens O(log n) times on a growing stream.'''
+
+    # Scaled timestamps beyond which the centre and scale are recalculated
+    RESCALE = 2.0
+
+    # Diagonal entries of R this small relative to the largest mean the
+    # points seen do not yet determine every coefficient
+    RANK_TOLERANCE = 1e-10
+
+    def __init__(self, order=1):
+        self.order = order
+        self.origin = None
+        self.scale = 1.0
+        self.first = self.last = None
+        # Kept as lists, which are faster than arrays at this size
+        self.factor = [ [ 0.0 ] * (order + 1) for _ in xrange(order + 1) ]
+        self.target = [ 0.0 ] * (order + 1)
+        self.count = 0
+
+    def update(self, timestamp, value):
+        '''Add a point to the trend.'''
+        timestamp = float(timestamp)
+        self.count += 1
+        if self.origin is None:
+            self.origin = self.first = self.last = timestamp
+        self.first = min(self.first, timestamp)
+        self.last = max(self.last, timestamp)
+        if abs(timestamp - self.origin) > self.RESCALE * self.scale:
+            self._rescale()
+        row = self._basis(timestamp).tolist()
+        value = float(value)
+        factor, target = self.factor, self.target
+        for index in xrange(self.order + 1):
+            if not row[index]:
+                continue
+            pivot = factor[index]
+            radius = math.hypot(pivot[index], row[index])
+            cos, sin = pivot[index] / radius, row[index] / radius
+            for column in xrange(index, self.order + 1):
+                pivot[column], row[column] = cos * pivot[column] + sin * row[column], \
+                    cos * row[column] - sin * pivot[column]
+            target[index], value = cos * target[index] + sin * value, \
+                cos * value - sin * target[index]
+
+    def extend(self, points):
+        '''Add each (timestamp, value) point in turn.'''
+        for timestamp, value in points:
+            self.update(timestamp, value)
+
+    @property
+    def coefficients_scaled(self):
+        '''Get the coefficients for centred and scaled timestamps, or `None`
+        until the points determine them.'''
+        numpy = LazyImport.numpy()
+        factor = numpy.array(self.factor)
+        diagonal = numpy.abs(numpy.diag(factor))
+        if not diagonal.max() or diagonal.min() <= self.RANK_TOLERANCE * diagonal.max():
+            return None
+        coefficients = numpy.zeros(self.order + 1)
+        for index in reversed(xrange(self.order + 1)):
+            coefficients[index] = (self.target[index] - factor[index, index + 1:].dot(
+                coefficients[index + 1:])) / factor[index, index]
+        return coefficients
+
+    @property
+    def coefficients(self):
+        '''Get the trend coefficients for raw timestamps, highest power first,
+        as returned by `numpy.polyfit()`.'''
+        coefficients = self.coefficients_scaled
+        if coefficients is None:
+            raise ArithmeticError('Not enough points to calculate the trend')
+        numpy = LazyImport.numpy()
+        shift = numpy.poly1d([ 1.0 / self.scale, -self.origin / self.scale ])
+        return numpy.poly1d(coefficients)(shift).coeffs
+
+    def predict(self, timestamp):
+        '''Get the value of the trend at `timestamp`.'''
+        coefficients = self.coefficients_scaled
+        if coefficients is None:
+            raise ArithmeticError('Not enough points to calculate the trend')
+        return float(self._basis(float(timestamp)).dot(coefficients))
+
+    def _basis(self, timestamp):
+        numpy = LazyImport.numpy()
+        x = (timestamp - self.origin) / self.scale
+        return x ** numpy.arange(self.order, -1, -1, dtype=numpy.float64)
+
+    def _rescale(self):
+        '''Centre and scale timestamps on the span seen so far. The new basis
+        is a polynomial in the old one, phi_new = M phi_old, so the design
+        matrix becomes D M^T and its factor R M^T, which is brought back to
+        triangular form with a QR decomposition of the small matrix.'''
+        numpy = LazyImport.numpy()
+        origin = (self.first + self.last) / 2
+        scale = (self.last - self.first) / 2 or 1.0
+        # x_new = a * x_old + b
+        shift = numpy.poly1d([ self.scale / scale, (self.origin - origin) / scale ])
+        size = self.order + 1
+        change = numpy.zeros((size, size))
+        for index in xrange(size):
+            coeffs = (shift ** (self.order - index)).coeffs
+            change[index, size - len(coeffs):] = coeffs
+        rotation, factor = numpy.linalg.qr(numpy.dot(self.factor, change.T))
+        self.factor = factor.tolist()
+        self.target = rotation.T.dot(self.target).tolist()
+        self.origin, self.scale = origin, scale
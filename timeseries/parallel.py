@@ -0,0 +1,70 @@
+import pickle
+from multiprocessing import Pool, cpu_count
+from .lazy_import import LazyImport
+
+def pack(series):
+    '''Get a compact, picklable representation of a series.'''
+    return series._timestamps.tobytes(), series._values.tobytes()
+
+def unpack(packed):
+    '''Rebuild a series from the output of `pack()`.'''
+    from .time_series import TimeSeries
+    numpy = LazyImport.numpy()
+    timestamps, values = packed
+    return TimeSeries._from_arrays(numpy.frombuffer(timestamps, dtype=numpy.int64),
+        numpy.frombuffer(values, dtype=numpy.float64), presorted=True)
+
+def apply_method(task):
+    '''Call a TimeSeries method on a packed series. Returns a tuple of
+    (key, packed result, error) where exactly one of the last two is set.'''
+    key, packed, method, args, kwargs = task
+    try:
+        result = getattr(unpack(packed), method)(*args, **kwargs)
+        return key, pack(result), None
+    except Exception, error:
+        return key, None, picklable(error)
+
+def picklable(error):
+    '''Get an exception that can be sent to another process, replacing
+    `error` with a RuntimeError describing it if it cannot be pickled.'''
+    try:
+        pickle.dumps(error)
+    except Exception:
+        error = RuntimeError('%s: %s' % (type(error).__name__, error))
+    return error
+
+def map_series(series, method, args=(), kwargs=None, workers=None):
+    '''Call `method` on every series in the `series` dict across a pool of
+    processes. `workers` is either the number of processes to start or an
+    existing `multiprocessing.Pool` or `WorkerPool`. The series are sent in
+    about four chunks per process; the size of an existing pool is not
+    known, so it is taken to be the number of CPUs, the default size of a
+    pool, and a smaller pool is sent more, smaller chunks. Series are
+    shipped to the workers as raw array buffers.
+    Returns a tuple of (results, failures), two dicts mapping the keys of
+    `series` to result series or to the exception that was raised.'''
+    from .workers import WorkerPool
+    if isinstance(workers, WorkerPool):
+        return workers.map(series, method, args, kwargs)
+    tasks = [ (key, pack(value), method, args, kwargs or {})
+        for key, value in series.iteritems() ]
+    results, failures = {}, {}
+    if not tasks:
+        return results, failures
+    if hasattr(workers, 'imap_unordered'):
+        pool, processes = workers, cpu_count()
+    else:
+        processes = workers or cpu_count()
+        pool = Pool(processes)
+    try:
+        chunksize = max(1, len(tasks) // (processes * 4))
+        for key, packed, error in pool.imap_unordered(apply_method, tasks, chunksize):
+            if error is None:
+                results[key] = unpack(packed)
+            else:
+                failures[key] = error
+    finally:
+        if pool is not workers:
+            pool.close()
+            pool.join()
+    return results, failures
@@ -0,0 +1,22 @@
+from .lazy_import import LazyImport
+
+def design_matrix(timestamps, order):
+    '''Get the Vandermonde matrix (highest power first) of `timestamps`
+    after centring them and scaling them to [-1, 1], which keeps the matrix
+    well conditioned for millisecond timestamps and high orders.'''
+    numpy = LazyImport.numpy()
+    timestamps = numpy.asarray(timestamps)
+    low, high = timestamps.min(), timestamps.max()
+    centre = low + (high - low) / 2.0
+    width = (high - low) / 2.0 or 1.0
+    return numpy.vander((timestamps - centre) / width, order + 1)
+
+def fit(timestamps, values, order):
+    '''Fit a polynomial of the specified order to each column of `values`
+    (an array with a row per timestamp, or a single series) by least
+    squares, factorizing the design matrix once for every column. Returns
+    the fitted values with the same shape as `values`.'''
+    numpy = LazyImport.numpy()
+    design = design_matrix(timestamps, order)
+    coefficients = numpy.linalg.lstsq(design, values, rcond=None)[0]
+    return design.dot(coefficients)
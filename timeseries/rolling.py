@@ -0,0 +1,276 @@
+from .lazy_import import LazyImport
+
+# Count windows up to this many points are sorted directly for quantiles
+DIRECT_QUANTILE = 64
+
+# Windows whose sums are computed together from one set of prefix sums, at
+# least; the sums restart for each block to limit rounding error
+SUM_BLOCK = 1 << 12
+
+# Windows whose quantiles are found together from one wavelet matrix, in
+# multiples of the longest window (and at least `SUM_BLOCK`), so each matrix
+# covers a few windows' worth of values
+QUANTILE_BLOCK = 4
+
+def fixed_extreme(values, window, fn):
+    '''Get the minimum or maximum (`fn` is `numpy.minimum` or
+    `numpy.maximum`) of every run of `window` consecutive values in O(n)
+    time with the van Herk/Gil-Werman algorithm: the values are split into
+    blocks of `window` and each run covers the end of one block and the
+    start of the next, so it is reduced from a suffix and a prefix.'''
+    numpy = LazyImport.numpy()
+    count = len(values)
+    blocks = -(-count // window)
+    padded = numpy.empty(blocks * window)
+    padded[:count] = values
+    # The padding is never part of a run, so any value will do
+    padded[count:] = values[-1]
+    padded = padded.reshape(blocks, window)
+    prefix = fn.accumulate(padded, axis=1).ravel()
+    suffix = fn.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return fn(suffix[:count - window + 1], prefix[window - 1:count])
+
+def sliding_extreme(values, starts, stops, fn):
+    '''Get the minimum or maximum of each window `values[starts[i]:stops[i]]`
+    for windows of any length. Level k of a sparse table holds the extreme
+    of each run of 2^k values, and a window of length L is covered by the
+    two overlapping runs of the largest power of two no longer than L, so
+    the levels are built one at a time in O(n log w) time in total.'''
+    numpy = LazyImport.numpy()
+    lengths = stops - starts
+    result = numpy.empty(len(stops))
+    table = values
+    width = 1
+    longest = lengths.max() if len(lengths) else 0
+    while width <= longest:
+        selected = numpy.flatnonzero((lengths >= width) & (lengths < 2 * width))
+        if len(selected):
+            result[selected] = fn(table[starts[selected]], table[stops[selected] - width])
+        table = fn(table[:-width], table[width:])
+        width *= 2
+    return result
+
+def window_moments(values, starts, stops, ddof):
+    '''Get the (count, mean, variance) of each window from prefix sums of
+    the values and their squares. The sums restart for each block of
+    windows, offset by a value from the block, so that they stay small
+    enough for the subtraction not to lose precision. Windows containing
+    NaN or infinite values have a NaN mean and variance.'''
+    numpy = LazyImport.numpy()
+    counts = stops - starts
+    means = numpy.empty(len(stops))
+    variances = numpy.empty(len(stops))
+    step = max(SUM_BLOCK, 16 * int(counts.max())) if len(counts) else 1
+    for first in xrange(0, len(stops), step):
+        last = min(len(stops), first + step)
+        low, high = starts[first], stops[last - 1]
+        block = values[low:high]
+        finite = numpy.isfinite(block)
+        offset = block[finite][0] if finite.any() else 0.0
+        shifted = numpy.where(finite, block - offset, 0.0)
+        begin = starts[first:last] - low
+        end = stops[first:last] - low
+        count = counts[first:last]
+        sums = numpy.concatenate(([ 0.0 ], numpy.cumsum(shifted)))
+        squares = numpy.concatenate(([ 0.0 ], numpy.cumsum(shifted * shifted)))
+        invalid = numpy.concatenate(([ 0 ], numpy.cumsum(~finite)))
+        total = sums[end] - sums[begin]
+        mean = total / count
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            variance = (squares[end] - squares[begin] - total * mean) / (count - ddof)
+        variance[count <= ddof] = numpy.nan
+        numpy.maximum(variance, 0, out=variance)
+        mean += offset
+        bad = invalid[end] != invalid[begin]
+        mean[bad] = numpy.nan
+        variance[bad] = numpy.nan
+        means[first:last] = mean
+        variances[first:last] = variance
+    return counts, means, variances
+
+def interpolate_quantile(ordered, q, count):
+    '''Interpolate the `q` quantile from rows of `count` sorted values, as
+    `numpy.percentile()` does.'''
+    position = q * (count - 1)
+    below = int(position)
+    above = min(below + 1, count - 1)
+    fraction = position - below
+    return ordered[..., below] * (1 - fraction) + ordered[..., above] * fraction
+
+def fixed_quantile(values, window, q):
+    '''Get the `q` quantile of every run of `window` consecutive values by
+    sorting a strided view of the runs, a block at a time.'''
+    numpy = LazyImport.numpy()
+    strided = numpy.lib.stride_tricks.as_strided
+    length = len(values) - window + 1
+    result = numpy.empty(length)
+    step = max(1, SUM_BLOCK * 16 // window)
+    for start in xrange(0, length, step):
+        stop = min(length, start + step)
+        block = values[start:stop + window - 1]
+        runs = strided(block, (stop - start, window), (block.strides[0],) * 2)
+        ordered = numpy.sort(runs, axis=1)
+        result[start:stop] = interpolate_quantile(ordered, q, window)
+        # NaN sorts last, so it is in the last column of any run holding one
+        result[start:stop][numpy.isnan(ordered[:, -1])] = numpy.nan
+    return result
+
+def select(values, starts, stops, ranks):
+    '''Get the `ranks[i]`-th smallest value (counting from 0) of each window
+    `values[starts[i]:stops[i]]` using a wavelet matrix. The values are
+    replaced by their ranks in sorted order, and level k of the matrix
+    partitions the ranks by bit k (from the highest) keeping the order
+    within each half, with a prefix count of the zero bits. A selection then
+    descends one level per bit, moving the window into the half that holds
+    the rank it is after, so every window is answered at once in
+    O(log n) vectorized steps.'''
+    numpy = LazyImport.numpy()
+    order = numpy.argsort(values, kind='mergesort')
+    current = numpy.empty(len(values), dtype=numpy.int64)
+    current[order] = numpy.arange(len(values))
+    levels = range(int(len(values) - 1).bit_length())[::-1]
+    zeros = []
+    for level in levels:
+        zero = (current >> level) & 1 == 0
+        zeros.append(numpy.concatenate(([ 0 ], numpy.cumsum(zero))))
+        current = numpy.concatenate((current[zero], current[~zero]))
+    found = numpy.zeros(len(ranks), dtype=numpy.int64)
+    for level, prefix in zip(levels, zeros):
+        before, through = prefix[starts], prefix[stops]
+        inside = through - before
+        right = ranks >= inside
+        ranks = numpy.where(right, ranks - inside, ranks)
+        starts = numpy.where(right, prefix[-1] + starts - before, before)
+        stops = numpy.where(right, prefix[-1] + stops - through, through)
+        found[right] |= 1 << level
+    return values[order[found]]
+
+def sliding_quantile(values, starts, stops, q):
+    '''Get the `q` quantile of each window of any length by selecting the
+    values either side of it with `select()`. The windows are taken in
+    blocks with a wavelet matrix over just the values they cover, a few
+    times the longest window, so the total time is O(n log w). Windows
+    containing NaN give NaN.'''
+    numpy = LazyImport.numpy()
+    counts = stops - starts
+    result = numpy.empty(len(stops))
+    step = max(SUM_BLOCK, QUANTILE_BLOCK * int(counts.max())) if len(counts) else 1
+    positions = q * (counts - 1)
+    below = positions.astype(numpy.int64)
+    above = numpy.minimum(below + 1, counts - 1)
+    fractions = positions - below
+    for first in xrange(0, len(stops), step):
+        last = min(len(stops), first + step)
+        low, high = starts[first:last].min(), stops[first:last].max()
+        block = values[low:high]
+        begin = starts[first:last] - low
+        end = stops[first:last] - low
+        selected = select(block, numpy.concatenate((begin, begin)),
+            numpy.concatenate((end, end)),
+            numpy.concatenate((below[first:last], above[first:last])))
+        smaller, larger = selected[:last - first], selected[last - first:]
+        fraction = fractions[first:last]
+        with numpy.errstate(invalid='ignore'):
+            interpolated = smaller * (1 - fraction) + larger * fraction
+        quantiles = numpy.where(fraction == 0, smaller, interpolated)
+        missing = numpy.concatenate(([ 0 ], numpy.cumsum(numpy.isnan(block))))
+        quantiles[missing[end] != missing[begin]] = numpy.nan
+        result[first:last] = quantiles
+    return result
+
+class Rolling(object):
+    '''Statistics over a window that slides along a series, created with
+    `TimeSeries.rolling()`. A window is either the last `window` points,
+    giving a point for each full window, or the points in the last
+    `duration` milliseconds, (t - duration, t], giving a point at every
+    timestamp. Every statistic returns a TimeSeries at the timestamps where
+    the windows end, and is NaN for windows that contain NaN.'''
+
+    def __init__(self, series, window=None, duration=None):
+        numpy = LazyImport.numpy()
+        if (window is None) == (duration is None):
+            raise TypeError('Expected either a window or a duration')
+        timestamps = series._timestamps
+        self.window = window
+        self.duration = duration
+        self.values = series._values
+        if window is not None:
+            if window < 1:
+                raise ValueError('The window must contain at least one point')
+            if len(timestamps) < window:
+                raise ArithmeticError('Not enough points for rolling window')
+            self.stops = numpy.arange(window, len(timestamps) + 1)
+            self.starts = self.stops - window
+        else:
+            if duration <= 0:
+                raise ValueError('The duration must be positive')
+            self.starts = timestamps.searchsorted(timestamps - duration, side='right')
+            self.stops = numpy.arange(1, len(timestamps) + 1)
+        self.timestamps = timestamps[self.stops - 1]
+
+    def _series(self, values):
+        from .time_series import TimeSeries
+        return TimeSeries._from_arrays(self.timestamps, values, presorted=True)
+
+    def count(self):
+        '''Get the number of points in each window.'''
+        return self._series((self.stops - self.starts).astype(float))
+
+    def min(self):
+        '''Get the smallest value in each window.'''
+        return self._extreme(LazyImport.numpy().minimum)
+
+    def max(self):
+        '''Get the largest value in each window.'''
+        return self._extreme(LazyImport.numpy().maximum)
+
+    def _extreme(self, fn):
+        if not len(self.values):
+            return self._series(self.values)
+        if self.window is not None:
+            return self._series(fixed_extreme(self.values, self.window, fn))
+        return self._series(sliding_extreme(self.values, self.starts, self.stops, fn))
+
+    def mean(self):
+        '''Get the mean of each window.'''
+        return self._series(window_moments(self.values, self.starts, self.stops, 0)[1])
+
+    def var(self, ddof=1):
+        '''Get the variance of each window, dividing by the number of points
+        less `ddof`. Windows of `ddof` points or fewer give NaN.'''
+        return self._series(window_moments(self.values, self.starts, self.stops, ddof)[2])
+
+    def std(self, ddof=1):
+        '''Get the standard deviation of each window, see `var()`.'''
+        variances = window_moments(self.values, self.starts, self.stops, ddof)[2]
+        return self._series(LazyImport.numpy().sqrt(variances))
+
+    def quantile(self, q):
+        '''Get the `q` quantile of each window, between 0 and 1, linearly
+        interpolated as `numpy.percentile()` does. Count windows of up to
+        `DIRECT_QUANTILE` points are sorted with NumPy; others select from
+        a wavelet matrix, see `sliding_quantile()`.'''
+        if not 0 <= q <= 1:
+            raise ValueError('The quantile must be between 0 and 1')
+        if not len(self.values):
+            return self._series(self.values)
+        if self.window is not None and self.window <= DIRECT_QUANTILE:
+            return self._series(fixed_quantile(self.values, self.window, q))
+        return self._series(sliding_quantile(self.values, self.starts, self.stops, q))
+
+    def zscore(self, ddof=1):
+        '''Get the number of standard deviations that each point lies from
+        the mean of the window ending at it. Points whose window has no
+        variation give NaN.'''
+        numpy = LazyImport.numpy()
+        _, means, variances = window_moments(self.values, self.starts, self.stops, ddof)
+        deviations = self.values[self.stops - 1] - means
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            scores = deviations / numpy.sqrt(variances)
+        scores[variances == 0] = numpy.nan
+        return self._series(scores)
+
+    def __repr__(self):
+        if self.window is not None:
+            return 'Rolling(window=%d)' % self.window
+        return 'Rolling(duration=%d)' % self.duration
@@ -0,0 +1,123 @@
+from .lazy_import import LazyImport
+from .averages import simple as moving_average
+
+# Maximum number of weights materialised at once by loess()
+BLOCK_SIZE = 1 << 20
+
+def next_odd(x):
+    '''Round `x` to the nearest integer, moving up to the next odd one.'''
+    x = int(round(x))
+    return x + 1 if x % 2 == 0 else x
+
+def loess(values, positions, window, degree):
+    '''Evaluate a locally weighted regression of `values` (observed at x = 1,
+    2, ..., n) at each of `positions` using the `window` nearest points and
+    tricube weights, as in Cleveland et al. (1990). Positions may lie one
+    step outside the data. Returns a tuple of (fitted, ok) where `ok` marks
+    the positions that had non-zero weights.'''
+    numpy = LazyImport.numpy()
+    length = len(values)
+    positions = numpy.asarray(positions, dtype=numpy.float64)
+    span = min(window, length)
+    nsh = (window + 1) // 2
+    left = numpy.clip(positions - nsh + 1, 1, length - span + 1).astype(numpy.int64)
+    right = left + span - 1
+    h = numpy.maximum(positions - left, right - positions)
+    if window > length:
+        h += (window - length) // 2
+    fitted = numpy.empty(len(positions))
+    ok = numpy.empty(len(positions), dtype=bool)
+    offsets = numpy.arange(span)
+    rows = max(1, BLOCK_SIZE // span)
+    for start in xrange(0, len(positions), rows):
+        block = slice(start, start + rows)
+        xs = positions[block, numpy.newaxis]
+        hs = h[block, numpy.newaxis]
+        x = left[block, numpy.newaxis] + offsets
+        distance = numpy.abs(x - xs)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            weights = (1 - (distance / hs) ** 3) ** 3
+        weights[distance <= 0.001 * hs] = 1
+        weights[distance > 0.999 * hs] = 0
+        total = weights.sum(axis=1)
+        ok[block] = total > 0
+        total[total <= 0] = 1
+        weights /= total[:, numpy.newaxis]
+        if degree > 0:
+            centre = (weights * x).sum(axis=1)[:, numpy.newaxis]
+            spread = (weights * (x - centre) ** 2).sum(axis=1)[:, numpy.newaxis]
+            slope = numpy.sqrt(spread) > 0.001 * (length - 1)
+            slope &= hs > 0
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                adjust = (xs - centre) / spread * (x - centre) + 1
+            weights = numpy.where(slope, weights * adjust, weights)
+        fitted[block] = (weights * values[x - 1]).sum(axis=1)
+    return fitted, ok
+
+def smooth(values, window, degree, jump=1):
+    '''Loess smooth `values`, fitting every `jump` observations and linearly
+    interpolating in between. The original value is kept wherever the fit
+    fails.'''
+    numpy = LazyImport.numpy()
+    length = len(values)
+    positions = numpy.arange(1, length + 1, max(1, jump))
+    if positions[-1] != length:
+        positions = numpy.append(positions, length)
+    fitted, ok = loess(values, positions, window, degree)
+    fitted[~ok] = values[positions[~ok] - 1]
+    if len(positions) == length:
+        return fitted
+    return numpy.interp(numpy.arange(1, length + 1), positions, fitted)
+
+def cycle_subseries(values, period, window, degree, jump=1):
+    '''Smooth each cycle-subseries of `values` and extend it by one period
+    at both ends. Returns an array of length `len(values) + 2 * period`.'''
+    numpy = LazyImport.numpy()
+    result = numpy.empty(len(values) + 2 * period)
+    for cycle in xrange(period):
+        subseries = values[cycle::period]
+        count = len(subseries)
+        extended = numpy.empty(count + 2)
+        extended[1:-1] = smooth(subseries, window, degree, jump)
+        ends, ok = loess(subseries, [ 0, count + 1 ], window, degree)
+        extended[0] = ends[0] if ok[0] else extended[1]
+        extended[-1] = ends[1] if ok[1] else extended[-2]
+        result[cycle::period][:count + 2] = extended
+    return result
+
+def stl(values, period, window=None, periodic=False, inner=2):
+    '''Decompose `values` into seasonal, trend and residual components with
+    STL (Cleveland et al., 1990) using the same defaults as R's `stl()`.
+    `window` is the seasonal smoothing window; when `periodic` is true the
+    seasonal component is the same in every period. Returns a tuple of
+    (seasonal, trend, residual) arrays.'''
+    numpy = LazyImport.numpy()
+    values = numpy.asarray(values, dtype=numpy.float64)
+    length = len(values)
+    period = int(period)
+    if period < 2 or length <= 2 * period:
+        raise ArithmeticError('Series is not periodic or has less than two periods')
+    seasonal_degree = 0
+    if periodic:
+        window = 10 * length + 1
+    elif window is None:
+        window = period
+    seasonal_window = max(3, next_odd(window))
+    trend_window = max(3, next_odd(numpy.ceil(1.5 * period / (1 - 1.5 / seasonal_window))))
+    lowpass_window = max(3, next_odd(period))
+    seasonal_jump, trend_jump, lowpass_jump = [ int(numpy.ceil(w / 10.0))
+        for w in (seasonal_window, trend_window, lowpass_window) ]
+    trend = numpy.zeros(length)
+    for _ in xrange(inner):
+        cycles = cycle_subseries(values - trend, period, seasonal_window,
+            seasonal_degree, seasonal_jump)
+        lowpass = moving_average(moving_average(moving_average(cycles, period),
+            period), 3)
+        lowpass = smooth(lowpass, lowpass_window, 1, lowpass_jump)
+        seasonal = cycles[period:period + length] - lowpass
+        trend = smooth(values - seasonal, trend_window, 1, trend_jump)
+    if periodic:
+        cycle = numpy.arange(length) % period
+        means = numpy.bincount(cycle, seasonal) / numpy.bincount(cycle)
+        seasonal = means[cycle]
+    return seasonal, trend, values - seasonal - trend
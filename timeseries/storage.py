@@ -0,0 +1,108 @@
+import os
+import mmap
+import errno
+import struct
+import binascii
+from .lazy_import import LazyImport
+
+# Binary layout (all integers little-endian):
+#
+#   magic        8 bytes   'TSERIES\0'
+#   version      uint32    FORMAT_VERSION
+#   count        uint32    number of series
+#   directory    count entries of:
+#                    name length  uint16
+#                    name         UTF-8 bytes
+#                    points       uint64
+#                    offset       uint64, position of the series data
+#   data         for each series, starting at its offset (a multiple of
+#                ALIGNMENT): `points` int64 timestamps in milliseconds
+#                followed by `points` float64 values
+
+MAGIC = 'TSERIES\0'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+HEADER = struct.Struct('<8sII')
+NAME = struct.Struct('<H')
+ENTRY = struct.Struct('<QQ')
+
+def create_temporary(directory, suffix=''):
+    '''Create and open a new file for writing in `directory` under a unique
+    name, returning a tuple of (file descriptor, path). Unlike
+    `tempfile.mkstemp()`, which creates files readable by the owner only,
+    the umask decides the permissions, as it would for the file the
+    temporary file is renamed to.'''
+    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0)
+    while True:
+        name = 'tmp%s%s' % (binascii.hexlify(os.urandom(8)), suffix)
+        path = os.path.join(directory, name)
+        try:
+            return os.open(path, flags, 0666), path
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+def write(path, members):
+    '''Write a list of (name, timestamps, values) tuples to `path`. The file
+    is written under a temporary name and then renamed, so existing memory
+    maps of `path` keep seeing the old contents. The temporary file is
+    removed if the write fails.'''
+    numpy = LazyImport.numpy()
+    names = [ name if isinstance(name, str) else unicode(name).encode('utf-8')
+        for name, _, _ in members ]
+    size = HEADER.size + sum(NAME.size + len(name) + ENTRY.size for name in names)
+    offsets = []
+    for _, timestamps, _ in members:
+        size += -size % ALIGNMENT
+        offsets.append(size)
+        size += 16 * len(timestamps)
+    handle, temporary = create_temporary(os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            output.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(members)))
+            for name, offset, (_, timestamps, _) in zip(names, offsets, members):
+                output.write(NAME.pack(len(name)) + name)
+                output.write(ENTRY.pack(len(timestamps), offset))
+            for offset, (_, timestamps, values) in zip(offsets, members):
+                output.write('\0' * (offset - output.tell()))
+                output.write(numpy.asarray(timestamps, dtype='<i8').tobytes())
+                output.write(numpy.asarray(values, dtype='<f8').tobytes())
+        os.rename(temporary, path)
+    except:
+        os.unlink(temporary)
+        raise
+
+def read(path, memory_map=True):
+    '''Read a list of (name, timestamps, values) tuples from `path`. When
+    `memory_map` is true the arrays are read-only views of a memory map of
+    the file, so only the pages that are accessed are read from disk.'''
+    numpy = LazyImport.numpy()
+    with open(path, 'rb') as source:
+        if memory_map:
+            data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = source.read()
+    magic, version, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('%s is not a time series file' % path)
+    if version != FORMAT_VERSION:
+        raise ValueError('Unsupported time series file version %d' % version)
+    position = HEADER.size
+    members = []
+    for _ in xrange(count):
+        length, = NAME.unpack_from(data, position)
+        position += NAME.size
+        name = data[position:position + length].decode('utf-8')
+        position += length
+        points, offset = ENTRY.unpack_from(data, position)
+        position += ENTRY.size
+        if not points:
+            timestamps = numpy.zeros(0, dtype=numpy.int64)
+            values = numpy.zeros(0, dtype=numpy.float64)
+        else:
+            timestamps = numpy.frombuffer(data, dtype='<i8', count=points, offset=offset)
+            values = numpy.frombuffer(data, dtype='<f8', count=points,
+                offset=offset + 8 * points)
+        members.append((name, timestamps, values))
+    return members
@@ -1,6 +1,20 @@
+import operator
 from types import DictType
 from .lazy_import import LazyImport
-from .utilities import table_output, to_datetime
+from .alignment import align, merge, in_order, check_interval, infer_interval, \
+    regularity, regularize, INNER, LEFT, OUTER, FFILL, INTERPOLATE, RIGHT, BOTH, \
+    RAISE
+from .ets import ExponentialSmoothing, ADDITIVE, MULTIPLICATIVE
+from .stl import stl
+from . import averages, loading, polynomial, storage
+from .cache import cached
+from .instrumentation import instrumented, series_points, span
+from .expression import Expression
+from .rolling import Rolling
+from .backtest import backtest
+from .dates import to_datetime64, format_dates
+from .utilities import table_output, divide, \
+    aggregate, AGGREGATIONS
 from .data_frame import DataFrame
 
 class TimeSeries(object):
@@ -14,112 +28,444 @@ class TimeSeries(object):
 
     # Moving average methods
     SIMPLE = 0
+    WEIGHTED = 1
+    EXPONENTIAL = 2
+    TRIANGULAR = 3
+
+    MOVING_AVERAGES = {
+        SIMPLE: averages.simple,
+        WEIGHTED: averages.weighted,
+        EXPONENTIAL: averages.exponential,
+        TRIANGULAR: averages.triangular,
+    }
 
     # Forecast methods
     ETS = 'ets'
     ARIMA = 'arima'
+    SES = 'ses'
+    HOLT = 'holt'
+    HOLT_WINTERS = 'holt_winters'
+    HOLT_WINTERS_MULTIPLICATIVE = 'holt_winters_multiplicative'
+
+    # ExponentialSmoothing arguments for the natively fitted forecast methods
+    NATIVE_FORECAST_MODELS = {
+        SES: {},
+        HOLT: { 'trend': True },
+        HOLT_WINTERS: { 'trend': True, 'seasonal': ADDITIVE },
+        HOLT_WINTERS_MULTIPLICATIVE: { 'trend': True, 'seasonal': MULTIPLICATIVE },
+    }
+
+    # A ResultCache for forecast() and decompose() results, or None
+    result_cache = None
+
+    # The timezone of `dates` and printed dates, a tzinfo such as
+    # `timeseries.dates.UTC`, or None for the local timezone
+    timezone = None
+
+    # Join modes and fill methods
+    INNER = INNER
+    LEFT = LEFT
+    OUTER = OUTER
+    FFILL = FFILL
+    INTERPOLATE = INTERPOLATE
+
+    # Conflict policies for merge(), along with LEFT
+    RIGHT = RIGHT
+    BOTH = BOTH
+    RAISE = RAISE
 
     def __init__(self, points):
         '''Initialise the time series. `points` is expected to be either a list of
         tuples where each tuple represents a point (timestamp, value), or a dict where
         the keys are timestamps. Timestamps are expected to be in milliseconds.'''
+        with span('construct') as measurement:
+            self._store(*self._unzip(points))
+            measurement.points = len(self)
+
+    @classmethod
+    def _from_arrays(cls, timestamps, values, presorted=False):
+        '''Create a series from parallel sequences of timestamps and values.
+        When `presorted` is true the arrays are trusted to already be sorted
+        and are used as is. Every series is created here or by `__init__()`,
+        which are both recorded as the 'construct' operation.'''
+        with span('construct') as measurement:
+            series = cls.__new__(cls)
+            if presorted:
+                series._set_arrays(timestamps, values)
+            else:
+                series._store(timestamps, values)
+            measurement.points = len(series)
+        return series
+
+    @classmethod
+    def from_csv(cls, source, timestamp_column=0, value_column=1, delimiter=',',
+            header=None, chunk_size=loading.CHUNK_SIZE):
+        '''Load a series from the numeric columns of a CSV file (a path or a
+        file object) with timestamps in milliseconds. The file is parsed
+        about `chunk_size` bytes at a time straight into arrays, and sorting
+        is skipped if the points are already in order. The first line is
+        skipped as a header if it is not numeric, unless `header` is given.
+        Empty values are read as NaN, while an empty timestamp raises
+        `ValueError`.'''
+        with span('from_csv') as measurement:
+            builder = loading.SeriesBuilder()
+            rows = loading.read_csv(source, delimiter, header, chunk_size)
+            next(rows)
+            row = 0
+            for chunk in rows:
+                builder.add(loading.parse_timestamps(chunk[:, timestamp_column], row),
+                    chunk[:, value_column].copy())
+                row += len(chunk)
+            series = builder.build(cls)
+            measurement.points = len(series)
+        return series
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0, count=-1):
+        '''Create a series from an object exposing the buffer interface, such
+        as a string or a memory map, containing `count` (all by default)
+        little-endian records of an int64 timestamp followed by a float64
+        value. Sorting is skipped if the records are already in order.'''
+        timestamps, values = loading.read_records(buffer, offset, count)
+        return cls._from_arrays(timestamps, values)
+
+    @staticmethod
+    def _unzip(points):
+        '''Split a list of (timestamp, value) tuples, or a dict where the keys
+        are timestamps, into separate timestamp and value sequences. Dict
+        points are returned in timestamp order.'''
         if type(points) == DictType:
-            points = points.items()
-        self.points = sorted(points)
+            points = sorted(points.iteritems())
+        points = zip(*points)
+        if not len(points):
+            return (), ()
+        return points
+
+    def _store(self, timestamps, values):
+        '''Store timestamps and values as contiguous int64 and float64 arrays,
+        sorted by timestamp. The sort is stable, so points that share a
+        timestamp keep their order, and it is skipped when the timestamps
+        are already in order.'''
+        numpy = LazyImport.numpy()
+        timestamps = numpy.asarray(timestamps, dtype=numpy.int64)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if timestamps.shape != values.shape or timestamps.ndim != 1:
+            raise ValueError('Timestamps and values must be equal length sequences')
+        if not in_order(timestamps):
+            order = timestamps.argsort(kind='mergesort')
+            timestamps, values = timestamps[order], values[order]
+        self._set_arrays(timestamps, values)
+
+    def _set_arrays(self, timestamps, values):
+        '''Replace the points of the series with sorted int64 timestamps and
+        float64 values of the same length. Every change to the points of a
+        series is made here.'''
+        self._timestamps = timestamps
+        self._values = values
+
+    @property
+    def points(self):
+        '''Get all points from the series as a list of (timestamp, value) tuples.
+        The list is built from the underlying arrays on each access.'''
+        return zip(self._timestamps.tolist(), self._values.tolist())
+
+    @points.setter
+    def points(self, points):
+        self._store(*self._unzip(points))
 
     @property
     def timestamps(self):
         '''Get all timestamps from the series.'''
-        return [ point[0] for point in self.points ]
+        return self._timestamps.tolist()
 
     @property
     def dates(self):
-        '''Get all dates from the time series as `datetime` instances.'''
-        return [ to_datetime(timestamp) for timestamp, _ in self.points ]
+        '''Get all dates from the time series as naive `datetime` instances
+        in `timezone`.'''
+        return self.datetime64.astype(object).tolist()
+
+    @property
+    def datetime64(self):
+        '''Get the dates as a NumPy `datetime64[ms]` array of wall-clock times
+        in `timezone`. The array is converted in one pass, see
+        `dates.to_datetime64()`, and cached until the series changes.'''
+        timestamps = self._timestamps
+        cache = self.__dict__.get('_dates')
+        if cache is None or cache[0] is not timestamps or cache[1] is not self.timezone:
+            cache = self._dates = (timestamps, self.timezone,
+                to_datetime64(timestamps, self.timezone))
+        return cache[2]
 
     @property
     def values(self):
         '''Get all values from the time series.'''
-        return [ point[1] for point in self.points ]
+        return self._values.tolist()
 
     @property
     def interval(self):
-        if len(self.points) <= 1:
-            return None
-        return self.points[1][0] - self.points[0][0]
+        '''Get the most common difference between consecutive timestamps, so
+        gaps and repeated points do not affect it, or `None` when there are
+        fewer than two distinct timestamps.'''
+        return infer_interval(self._timestamps)
+
+    def regularity(self, interval=None):
+        '''Get a dict describing how closely the series follows a fixed
+        interval (`interval` by default), with the number of duplicated
+        points, gaps, missing points and irregular steps. See
+        `alignment.regularity()`.'''
+        return regularity(self._timestamps, interval)
+
+    def regularize(self, interval=None, fill=None):
+        '''Snap the series onto a grid of `interval` milliseconds (`interval`
+        by default) starting at the first point. Points move to the nearest
+        grid point, the last one winning where several land together. Empty
+        grid points are set to `fill` (NaN by default), carried forward when
+        `fill` is `FFILL`, or interpolated when `fill` is `INTERPOLATE`.'''
+        if interval is None:
+            interval = self.interval
+            if interval is None:
+                return TimeSeries._from_arrays(self._timestamps[-1:],
+                    self._values[-1:], presorted=True)
+        timestamps, values = regularize(self._timestamps, self._values, interval, fill)
+        return TimeSeries._from_arrays(timestamps, values, presorted=True)
+
+    def append(self, timestamp, value):
+        '''Append a point to the end of the series in amortized O(1) time. The
+        timestamp must not precede the last point in the series.'''
+        length = len(self._timestamps)
+        if length and timestamp < self._timestamps[-1]:
+            raise ValueError('Points must be appended in timestamp order')
+        timestamps, values = self._reserve(length + 1)
+        timestamps[length] = timestamp
+        values[length] = value
+        self._set_arrays(timestamps[:length+1], values[:length+1])
+
+    def extend(self, points):
+        '''Append a list of (timestamp, value) tuples, or a dict where the keys
+        are timestamps, to the end of the series. Points must be in timestamp
+        order and must not precede the last point in the series.'''
+        numpy = LazyImport.numpy()
+        new_timestamps, new_values = self._unzip(points)
+        new_timestamps = numpy.asarray(new_timestamps, dtype=numpy.int64)
+        new_values = numpy.asarray(new_values, dtype=numpy.float64)
+        if new_timestamps.shape != new_values.shape or new_timestamps.ndim != 1:
+            raise ValueError('Timestamps and values must be equal length sequences')
+        if not len(new_timestamps):
+            return
+        length = len(self._timestamps)
+        if (numpy.diff(new_timestamps) < 0).any() or \
+                (length and new_timestamps[0] < self._timestamps[-1]):
+            raise ValueError('Points must be appended in timestamp order')
+        end = length + len(new_timestamps)
+        timestamps, values = self._reserve(end)
+        timestamps[length:end] = new_timestamps
+        values[length:end] = new_values
+        self._set_arrays(timestamps[:end], values[:end])
+
+    def _reserve(self, capacity):
+        '''Get growable buffers holding the series with room for at least
+        `capacity` points. Storage that the series does not own (e.g. a view
+        shared with another series) is copied before it is written to. The
+        buffers are recorded with the id of the series that made them, so a
+        copy of the series that shares them does not own them too.'''
+        numpy = LazyImport.numpy()
+        buffers = getattr(self, '_buffers', None)
+        if buffers is not None and buffers[0] == id(self) and \
+                self._timestamps.base is buffers[1] and \
+                self._values.base is buffers[2] and len(buffers[1]) >= capacity:
+            return buffers[1:]
+        length = len(self._timestamps)
+        size = max(capacity, 2 * length, 16)
+        timestamps = numpy.empty(size, dtype=numpy.int64)
+        values = numpy.empty(size, dtype=numpy.float64)
+        timestamps[:length] = self._timestamps
+        values[:length] = self._values
+        self._buffers = id(self), timestamps, values
+        return timestamps, values
+
+    def __getstate__(self):
+        # The spare capacity of the append buffers is not worth pickling
+        state = self.__dict__.copy()
+        state.pop('_buffers', None)
+        return state
+
+    def lazy(self):
+        '''Get an `Expression` for the series. Operators, `map()`, `abs()` and
+        `round()` on the expression build up a tree that is only computed,
+        in one pass over the aligned inputs, when `evaluate()` is called.'''
+        return Expression(None, (self,))
 
     def map(self, fn):
         '''Run a map function across all y points in the series.'''
-        return TimeSeries([ (x, fn(y)) for x, y in self.points ])
+        numpy = LazyImport.numpy()
+        values = numpy.array([ fn(y) for y in self._values.tolist() ],
+            dtype=numpy.float64)
+        return TimeSeries._from_arrays(self._timestamps, values, presorted=True)
 
+    @instrumented('trend', series_points)
     def trend(self, order=LINEAR):
-        '''Override Series.trend() to return a TimeSeries instance.'''
-        coefficients = self.trend_coefficients(order)
-        x = self.timestamps
-        trend_y = LazyImport.numpy().polyval(coefficients, x)
-        return TimeSeries(zip(x, trend_y))
+        '''Override Series.trend() to return a TimeSeries instance. The fit is
+        made against centred and scaled timestamps, see `polynomial.fit()`.'''
+        if not len(self._timestamps):
+            raise ArithmeticError('Cannot calculate the trend of an empty series')
+        trend_y = polynomial.fit(self._timestamps, self._values, order)
+        return TimeSeries._from_arrays(self._timestamps, trend_y, presorted=True)
 
     def trend_coefficients(self, order=LINEAR):
         '''Calculate trend coefficients for the specified order.'''
-        if not len(self.points):
+        if not len(self._timestamps):
             raise ArithmeticError('Cannot calculate the trend of an empty series')
-        return LazyImport.numpy().polyfit(self.timestamps, self.values, order)
+        return LazyImport.numpy().polyfit(self._timestamps, self._values, order)
 
+    @instrumented('moving_average', series_points)
     def moving_average(self, window, method=SIMPLE):
-        '''Calculate a moving average using the specified method and window'''
-        if len(self.points) < window:
+        '''Calculate a moving average using the specified method and window.
+        `SIMPLE`, `WEIGHTED` (linear weights), `EXPONENTIAL` and `TRIANGULAR`
+        methods are available and all take O(n) time regardless of window.'''
+        if window < 1:
+            raise ValueError('The window must contain at least one point')
+        if len(self._timestamps) < window:
             raise ArithmeticError('Not enough points for moving average')
+        if method not in TimeSeries.MOVING_AVERAGES:
+            raise ValueError('Unknown moving_average() method')
+        ma_x = self._timestamps[window-1:]
+        ma_y = TimeSeries.MOVING_AVERAGES[method](self._values, window)
+        return TimeSeries._from_arrays(ma_x, ma_y, presorted=True)
+
+    def rolling(self, window=None, duration=None):
+        '''Get a `Rolling` object for statistics over a sliding window of the
+        last `window` points or the last `duration` milliseconds, such as
+        `series.rolling(60).max()`. See `timeseries.rolling`.'''
+        return Rolling(self, window, duration)
+
+    def resample(self, interval, how='mean'):
+        '''Group points into buckets of `interval` milliseconds, aligned to
+        multiples of the interval, and reduce each bucket to a single point
+        using `how`: one of 'mean', 'sum', 'min', 'max', 'first', 'last' or
+        'count'. Empty buckets are omitted.'''
         numpy = LazyImport.numpy()
-        if method == TimeSeries.SIMPLE:
-            weights = numpy.ones(window) / float(window)
-        ma_x = self.timestamps[window-1:]
-        ma_y = numpy.convolve(self.values, weights)[window-1:-(window-1)].tolist()
-        return TimeSeries(zip(ma_x, ma_y))
-
+        interval = check_interval(interval)
+        if how not in AGGREGATIONS:
+            raise ValueError('Unknown resample() method')
+        timestamps = self._timestamps
+        if not len(timestamps):
+            return TimeSeries([])
+        buckets = timestamps // interval * interval
+        starts = numpy.concatenate(([ 0 ], numpy.flatnonzero(buckets[1:] != buckets[:-1]) + 1))
+        values = aggregate(self._values, starts, how)
+        return TimeSeries._from_arrays(buckets[starts], values, presorted=True)
+
+    @instrumented('forecast', series_points)
+    @cached
     def forecast(self, horizon, method=ARIMA, frequency=None):
         '''Forecast points beyond the time series range using the specified
-        forecasting method. `horizon` is the number of points to forecast.'''
-        if len(self.points) <= 1:
+        forecasting method. `horizon` is the number of points to forecast.
+        `ARIMA` and `ETS` are fitted by R's forecast package, while `SES`,
+        `HOLT`, `HOLT_WINTERS` and `HOLT_WINTERS_MULTIPLICATIVE` are fitted
+        natively. The Holt-Winters methods use `frequency` as the season
+        length.'''
+        if len(self._timestamps) <= 1:
             raise ArithmeticError('Cannot run forecast when len(series) <= 1')
-        R = LazyImport.rpy2()
-        series = LazyImport.numpy().array(self.values)
-        if frequency is not None:
-            series = R.ts(series, frequency=frequency)
-        if method == TimeSeries.ARIMA:
-            fit = R.forecast.auto_arima(series)
-        elif method == TimeSeries.ETS:
-            fit = R.forecast.ets(series)
+        interval = self.interval
+        if interval is None:
+            raise ArithmeticError('Cannot forecast a series without an interval')
+        numpy = LazyImport.numpy()
+        if method in TimeSeries.NATIVE_FORECAST_MODELS:
+            kwargs = TimeSeries.NATIVE_FORECAST_MODELS[method]
+            model = ExponentialSmoothing(period=frequency, **kwargs)
+            forecast_y = model.fit(self._values).forecast(horizon)
+        elif method in (TimeSeries.ARIMA, TimeSeries.ETS):
+            with span('r.import'):
+                R = LazyImport.rpy2()
+            with span('r.convert', len(self._values), self._values.nbytes):
+                series = R.ts(self._values, frequency=frequency or 1)
+            with span('r.fit', len(self._values)):
+                if method == TimeSeries.ARIMA:
+                    fit = R.forecast.auto_arima(series)
+                else:
+                    fit = R.forecast.ets(series)
+                forecasted = R.forecast.forecast(fit, h=horizon)
+            with span('r.convert', horizon, 8 * horizon):
+                forecast_y = numpy.array(forecasted.rx2('mean'), dtype=numpy.float64)
         else:
             raise ValueError('Unknown forecast() method')
-        forecasted = R.forecast.forecast(fit, h=horizon)
-        forecast_y = list(forecasted.rx2('mean'))
-        interval = self.interval
-        last_x = self.points[-1][0]
-        forecast_x = [ last_x + x * interval for x in xrange(1, horizon+1) ]
-        return TimeSeries(zip(forecast_x, forecast_y))
-
-    def decompose(self, frequency, window=None, periodic=False):
+        forecast_x = self._timestamps[-1] + interval * \
+            numpy.arange(1, horizon+1, dtype=numpy.int64)
+        return TimeSeries._from_arrays(forecast_x,
+            numpy.asarray(forecast_y, dtype=numpy.float64), presorted=True)
+
+    @instrumented('decompose', series_points)
+    @cached
+    def decompose(self, frequency, window=None, periodic=False, native=False):
         '''Use STL to decompose the time series into seasonal, trend, and
-        residual components.'''
-        R = LazyImport.rpy2()
+        residual components. R's `stl()` is used unless `native` is true, in
+        which case STL runs in-process with NumPy.'''
+        timestamps = self._timestamps
+        if native:
+            seasonal, trend, residual = stl(self._values, frequency, window, periodic)
+        else:
+            seasonal, trend, residual = self._r_decompose(frequency, window, periodic)
+        seasonal = TimeSeries._from_arrays(timestamps, seasonal, presorted=True)
+        trend = TimeSeries._from_arrays(timestamps, trend, presorted=True)
+        residual = TimeSeries._from_arrays(timestamps, residual, presorted=True)
+        return DataFrame(seasonal=seasonal, trend=trend, residual=residual)
+
+    def backtest(self, horizon, folds=3, methods=(ARIMA, ETS), frequency=None,
+            step=None, workers=None):
+        '''Evaluate forecast `methods` with a rolling-origin backtest. Each of
+        the `folds` forecasts `horizon` points from a prefix of the series,
+        the last fold holding out the final `horizon` points and each earlier
+        one ending `step` points (the horizon by default) before the next.
+        Forecasts are compared point for point with the held out values.
+        Returns a `Backtest` with the MAE, MAPE and RMSE of each method and
+        fold; `best()` picks a method. `workers` runs the fits in parallel,
+        see `DataFrame.forecast()`.'''
+        return backtest({ None: self }, horizon, folds, methods, frequency,
+            step, workers)[None]
+
+    def _r_decompose(self, frequency, window, periodic):
+        with span('r.import'):
+            R = LazyImport.rpy2()
         if periodic:
             window = 'periodic'
         elif window is None:
             window = frequency
-        timestamps = self.timestamps
-        series = LazyImport.numpy().array(self.values)
-        length = len(series)
-        series = R.ts(series, frequency=frequency)
+        numpy = LazyImport.numpy()
+        length = len(self._values)
+        with span('r.convert', length, self._values.nbytes):
+            series = R.ts(self._values, frequency=frequency)
         kwargs = { 's.window': window }
-        decomposed = R.robjects.r['stl'](series, **kwargs).rx2('time.series')
-        decomposed = [ row for row in decomposed ]
+        with span('r.fit', length):
+            decomposed = R.robjects.r['stl'](series, **kwargs).rx2('time.series')
+        with span('r.convert', 3 * length, 24 * length):
+            decomposed = numpy.array(decomposed, dtype=numpy.float64).ravel(order='F')
         seasonal = decomposed[0:length]
         trend = decomposed[length:2*length]
         residual = decomposed[2*length:3*length]
-        seasonal = TimeSeries(zip(timestamps, seasonal))
-        trend = TimeSeries(zip(timestamps, trend))
-        residual = TimeSeries(zip(timestamps, residual))
-        return DataFrame(seasonal=seasonal, trend=trend, residual=residual)
+        return seasonal, trend, residual
+
+    def compress(self, chunk_size=None):
+        '''Get a copy of the series stored in compressed chunks, see
+        `timeseries.compression`.'''
+        from .compression import CompressedTimeSeries, CHUNK_SIZE
+        series = CompressedTimeSeries([], chunk_size or CHUNK_SIZE)
+        series._encode(self._timestamps, self._values)
+        return series
+
+    def save(self, path):
+        '''Save the series to `path` in the binary format described in
+        `timeseries.storage`.'''
+        storage.write(path, [ ('', self._timestamps, self._values) ])
+
+    @classmethod
+    def load(cls, path, memory_map=True):
+        '''Load a series saved with `save()`. The series is backed by a
+        read-only memory map of the file unless `memory_map` is false.'''
+        members = storage.read(path, memory_map)
+        if len(members) != 1:
+            raise ValueError('%s does not contain a single series' % path)
+        _, timestamps, values = members[0]
+        return cls._from_arrays(timestamps, values, presorted=True)
 
     def plot(self, label=None, colour='g', style='-'): # pragma: no cover
         '''Plot the time series.'''
@@ -130,97 +476,146 @@ class TimeSeries(object):
         pylab.show()
 
     def __abs__(self):
-        return TimeSeries([ (x, abs(y)) for x, y in self.points ])
+        return TimeSeries._from_arrays(self._timestamps, abs(self._values),
+            presorted=True)
 
     def __round__(self, n=0):
-        return TimeSeries([ (x, round(y, n)) for x, y in self.points ])
+        numpy = LazyImport.numpy()
+        values = numpy.array([ round(y, n) for y in self._values.tolist() ],
+            dtype=numpy.float64)
+        return TimeSeries._from_arrays(self._timestamps, values, presorted=True)
 
     def round(self, n=0):
         # Manual delegation for v2.x
         return self.__round__(n)
 
-    def __add__(self, operand):
+    def align(self, other, join=INNER, fill=None):
+        '''Align this series with `other` on their timestamps and return a
+        tuple of two series sharing the same timestamps. `join` is one of
+        `INNER`, `LEFT` or `OUTER`; values missing from either series are
+        set to `fill` (NaN by default), or carried forward when `fill` is
+        `FFILL`.'''
+        x, left, right = align(self._timestamps, self._values,
+            other._timestamps, other._values, join, fill)
+        return (TimeSeries._from_arrays(x, left, presorted=True),
+            TimeSeries._from_arrays(x, right, presorted=True))
+
+    def combine(self, operand, fn, join=INNER, fill=None):
+        '''Combine the series with another series or a scalar using `fn`,
+        a function that accepts two arrays (or an array and a scalar), such
+        as `operator.add`. Series are aligned first, see `align()`. Combining
+        with an `Expression` gives another expression when the join is
+        `INNER`.'''
+        if isinstance(operand, Expression) and join == INNER and fill is None:
+            return self.lazy().combine(operand, fn)
+        return TimeSeries._from_arrays(*self._combine(operand, fn, join, fill),
+            presorted=True)
+
+    def merge(self, other, on_conflict=RAISE):
+        '''Merge the points of another series into a copy of this one in a
+        single pass over both. `on_conflict` decides what happens where both
+        series have points at the same timestamp: `LEFT` keeps the points of
+        this series, `RIGHT` keeps those of `other`, `BOTH` keeps all of them
+        (this series first) and `RAISE` raises a `ValueError`. A function
+        such as `operator.add` combines the values instead, see
+        `alignment.merge()`.'''
+        return TimeSeries._from_arrays(*merge(self._timestamps, self._values,
+            other._timestamps, other._values, on_conflict), presorted=True)
+
+    def _combine(self, operand, fn, join=INNER, fill=None):
+        if isinstance(operand, Expression):
+            operand = operand.evaluate()
         if not isinstance(operand, TimeSeries):
-            return TimeSeries([ ( x, y + operand ) for x, y in self.points ])
-        lookup = dict(operand.points)
-        return TimeSeries([ ( x, y + lookup[x] ) for x, y in self.points if x in lookup ])
+            return self._timestamps, fn(self._values, operand)
+        x, left, right = align(self._timestamps, self._values,
+            operand._timestamps, operand._values, join, fill)
+        return x, fn(left, right)
 
-    def __iadd__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            self.points = [ ( x, y + operand ) for x, y in self.points ]
-        else:
-            lookup = dict(operand.points)
-            self.points = [ ( x, y + lookup[x] ) for x, y in self.points if x in lookup ]
+    def _update(self, operand, fn):
+        self._set_arrays(*self._combine(operand, fn))
         return self
 
+    def __add__(self, operand):
+        return self.combine(operand, operator.add)
+
+    def __iadd__(self, operand):
+        return self._update(operand, operator.add)
+
     def __sub__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            return TimeSeries([ ( x, y - operand ) for x, y in self.points ])
-        lookup = dict(operand.points)
-        return TimeSeries([ ( x, y - lookup[x] ) for x, y in self.points if x in lookup ])
+        return self.combine(operand, operator.sub)
 
     def __isub__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            self.points = [ ( x, y - operand ) for x, y in self.points ]
-        else:
-            lookup = dict(operand.points)
-            self.points = [ ( x, y - lookup[x] ) for x, y in self.points if x in lookup ]
-        return self
+        return self._update(operand, operator.sub)
 
     def __mul__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            return TimeSeries([ ( x, y * operand ) for x, y in self.points ])
-        lookup = dict(operand.points)
-        return TimeSeries([ ( x, y * lookup[x] ) for x, y in self.points if x in lookup ])
+        return self.combine(operand, operator.mul)
 
     def __imul__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            self.points = [ ( x, y * operand ) for x, y in self.points ]
-        else:
-            lookup = dict(operand.points)
-            self.points = [ ( x, y * lookup[x] ) for x, y in self.points if x in lookup ]
-        return self
+        return self._update(operand, operator.mul)
 
     def __div__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            return TimeSeries([ ( x, float(y) / operand ) for x, y in self.points ])
-        lookup = dict(operand.points)
-        return TimeSeries([ ( x, float(y) / lookup[x] ) for x, y in self.points if x in lookup ])
+        return self.combine(operand, divide)
 
     def __idiv__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            self.points = [ ( x, float(y) / operand ) for x, y in self.points ]
-        else:
-            lookup = dict(operand.points)
-            self.points = [ ( x, float(y) / lookup[x] ) for x, y in self.points if x in lookup ]
-        return self
+        return self._update(operand, divide)
 
     def __pow__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            return TimeSeries([ ( x, y ** operand ) for x, y in self.points ])
-        lookup = dict(operand.points)
-        return TimeSeries([ ( x, y ** lookup[x] ) for x, y in self.points if x in lookup ])
+        return self.combine(operand, operator.pow)
 
     def __ipow__(self, operand):
-        if not isinstance(operand, TimeSeries):
-            self.points = [ ( x, y ** operand ) for x, y in self.points ]
-        else:
-            lookup = dict(operand.points)
-            self.points = [ ( x, y ** lookup[x] ) for x, y in self.points if x in lookup ]
-        return self
+        return self._update(operand, operator.pow)
+
+    def asof(self, x):
+        '''Get the last point at or before timestamp `x` as a (timestamp, value)
+        tuple. Raises `KeyError` when there is no such point.'''
+        position = self._timestamps.searchsorted(x, side='right') - 1
+        if position < 0:
+            raise KeyError(x)
+        return self._point(position)
+
+    def nearest(self, x):
+        '''Get the point closest to timestamp `x` as a (timestamp, value) tuple.
+        Ties are resolved in favour of the earlier point.'''
+        length = len(self._timestamps)
+        if not length:
+            raise KeyError(x)
+        position = self._timestamps.searchsorted(x)
+        if position == length or (position > 0 and
+                x - self._timestamps[position-1] <= self._timestamps[position] - x):
+            position -= 1
+        return self._point(position)
+
+    def _point(self, position):
+        return self._timestamps[position].item(), self._values[position].item()
 
     def __getitem__(self, x):
-        return dict(self.points)[x]
+        '''Get the value at timestamp `x`, or a series of the points in the
+        range `start <= timestamp < stop` when slicing. Slices share storage
+        with this series rather than copying it.'''
+        if isinstance(x, slice):
+            if x.step is not None:
+                raise ValueError('Slicing a series with a step is not supported')
+            start, stop = 0, len(self._timestamps)
+            if x.start is not None:
+                start = self._timestamps.searchsorted(x.start)
+            if x.stop is not None:
+                stop = self._timestamps.searchsorted(x.stop)
+            return TimeSeries._from_arrays(self._timestamps[start:stop],
+                self._values[start:stop], presorted=True)
+        timestamp, value = self.asof(x)
+        if timestamp != x:
+            raise KeyError(x)
+        return value
 
     def __iter__(self):
         return iter(self.points)
 
     def __len__(self):
-        return len(self.points)
+        return len(self._timestamps)
 
     def __str__(self): # pragma: no cover
         data = {}
-        data['Date'] = [ date.isoformat(' ') for date in self.dates ]
+        data['Date'] = format_dates(self.datetime64)
         data['Value'] = self.values
         return table_output(data)
 
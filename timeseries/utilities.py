@@ -1,5 +1,6 @@
 from datetime import datetime
 from types import IntType, LongType, DictType
+from .lazy_import import LazyImport
 
 def table_output(data):
     '''Get a table representation of a dictionary.'''
@@ -27,3 +28,41 @@ def to_datetime(time):
         time = datetime.fromtimestamp(time // 1000)
     return time
 
+def same_arrays(first, second):
+    '''Check whether two lists hold the same array objects in the same order.'''
+    return len(first) == len(second) and \
+        all(a is b for a, b in zip(first, second))
+
+def divide(dividend, divisor, out=None):
+    '''Divide an array of values by an array or scalar, raising
+    `ZeroDivisionError` rather than producing infinities. The result is
+    written to `out` if it is given.'''
+    numpy = LazyImport.numpy()
+    if numpy.any(numpy.asarray(divisor) == 0):
+        raise ZeroDivisionError('float division by zero')
+    return numpy.true_divide(dividend, divisor, out=out)
+
+# Aggregations supported by aggregate()
+AGGREGATIONS = ('mean', 'sum', 'min', 'max', 'first', 'last', 'count')
+
+def aggregate(values, starts, how):
+    '''Reduce consecutive runs of `values` that begin at the sorted indices
+    in `starts` using the aggregation named by `how`: one of 'mean', 'sum',
+    'min', 'max', 'first', 'last' or 'count'.'''
+    numpy = LazyImport.numpy()
+    ends = numpy.append(starts[1:], len(values))
+    if how == 'sum':
+        return numpy.add.reduceat(values, starts)
+    elif how == 'mean':
+        return numpy.add.reduceat(values, starts) / (ends - starts)
+    elif how == 'min':
+        return numpy.minimum.reduceat(values, starts)
+    elif how == 'max':
+        return numpy.maximum.reduceat(values, starts)
+    elif how == 'first':
+        return values[starts]
+    elif how == 'last':
+        return values[ends - 1]
+    elif how == 'count':
+        return (ends - starts).astype(numpy.float64)
+    raise ValueError('Unknown aggregation')
@@ -0,0 +1,315 @@
+import pickle
+import struct
+import timeit
+import threading
+from Queue import Queue
+from multiprocessing import Pipe, Process, cpu_count
+from multiprocessing.pool import ThreadPool
+from .lazy_import import LazyImport
+from .parallel import picklable
+
+# Seconds between checks that a busy worker is still running
+POLL_INTERVAL = 0.1
+
+# Seconds a worker has to answer a health check
+PING_TIMEOUT = 5
+
+# Seconds a worker has to exit when the pool is closed
+STOP_TIMEOUT = 1
+
+# Length prefix of the pickled header that starts each message
+HEADER = struct.Struct('<I')
+
+class WorkerError(RuntimeError):
+    '''Raised when a worker process exits or times out during a task.'''
+
+def encode(header, arrays=()):
+    '''Encode a message as a length-prefixed pickled header followed by the
+    raw bytes of each array.'''
+    header = pickle.dumps(header, pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(header)) + header + \
+        ''.join(array.tobytes() for array in arrays)
+
+def decode(message):
+    '''Decode the header of a message from `encode()`, returning a tuple of
+    (header, offset of the array data).'''
+    length, = HEADER.unpack_from(message)
+    start = HEADER.size + length
+    return pickle.loads(message[HEADER.size:start]), start
+
+def read_series(message, offset, count):
+    '''Read a series of `count` points from a message without copying the
+    arrays. Returns a tuple of (series, offset after the series).'''
+    from .time_series import TimeSeries
+    numpy = LazyImport.numpy()
+    timestamps = numpy.frombuffer(message, numpy.int64, count, offset)
+    values = numpy.frombuffer(message, numpy.float64, count, offset + 8 * count)
+    return TimeSeries._from_arrays(timestamps, values, presorted=True), \
+        offset + 16 * count
+
+def encode_result(result):
+    '''Encode the result of a method, which is a series, a group of series
+    or any picklable value.'''
+    from .time_series import TimeSeries
+    from .data_frame import DataFrame
+    if isinstance(result, DataFrame):
+        names = sorted(result)
+        members = [ result[name] for name in names ]
+        header = ('frame', [ (name, len(series._timestamps))
+            for name, series in zip(names, members) ])
+    elif isinstance(result, TimeSeries):
+        members = [ result ]
+        header = ('series', len(result._timestamps))
+    else:
+        return encode(('value', result))
+    return encode(header, [ array for series in members
+        for array in (series._timestamps, series._values) ])
+
+def decode_result(message):
+    '''Decode a message from `encode_result()`, raising the exception sent
+    by the worker if the method failed.'''
+    from .data_frame import DataFrame
+    header, offset = decode(message)
+    kind = header[0]
+    if kind == 'error':
+        raise header[1]
+    if kind == 'series':
+        return read_series(message, offset, header[1])[0]
+    if kind == 'frame':
+        frame = DataFrame()
+        for name, count in header[1]:
+            frame[name], offset = read_series(message, offset, count)
+        return frame
+    return header[1]
+
+def serve(connection, preload):
+    '''Run a worker process, answering requests on `connection` until it is
+    told to stop or the connection is closed. R is started before the
+    worker reports that it is ready when `preload` is true.'''
+    try:
+        LazyImport.numpy()
+        if preload:
+            LazyImport.rpy2()
+    except Exception, error:
+        connection.send_bytes(encode(('error', picklable(error))))
+        return
+    connection.send_bytes(encode(('ready',)))
+    while True:
+        try:
+            message = connection.recv_bytes()
+        except (EOFError, IOError):
+            return
+        header, offset = decode(message)
+        if header[0] == 'stop':
+            return
+        if header[0] == 'ping':
+            connection.send_bytes(encode(('pong',)))
+            continue
+        _, method, args, kwargs, count = header
+        try:
+            series, _ = read_series(message, offset, count)
+            response = encode_result(getattr(series, method)(*args, **kwargs))
+        except Exception, error:
+            response = encode(('error', picklable(error)))
+        connection.send_bytes(response)
+
+class Worker(object):
+    '''A worker process and the parent's end of its connection.'''
+
+    # Held while forking so that no other worker inherits the child's end
+    # of a new connection, which would hide the child exiting
+    starting = threading.Lock()
+
+    def __init__(self, preload):
+        self.preload = preload
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        '''Start the process and wait for it to be ready.'''
+        with Worker.starting:
+            connection, child = Pipe()
+            process = Process(target=serve, args=(child, self.preload))
+            process.daemon = True
+            process.start()
+            child.close()
+        self.process, self.connection = process, connection
+        header, _ = decode(self.receive(None))
+        if header[0] == 'error':
+            self.stop(0)
+            raise header[1]
+
+    def stop(self, wait=STOP_TIMEOUT):
+        '''Ask the process to exit, terminating it if it is still running
+        after `wait` seconds.'''
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.connection.send_bytes(encode(('stop',)))
+            except IOError:
+                pass
+            self.process.join(wait)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.connection.close()
+        self.process = self.connection = None
+
+    def restart(self):
+        '''Replace the process with a new one.'''
+        self.stop(0)
+        self.start()
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def request(self, message, timeout=None):
+        '''Send a message and wait up to `timeout` seconds for the response.'''
+        if self.process is None:
+            self.start()
+        try:
+            self.connection.send_bytes(message)
+        except IOError:
+            raise WorkerError('The worker process exited')
+        return self.receive(timeout)
+
+    def receive(self, timeout):
+        '''Wait up to `timeout` seconds (forever when `None`) for a message,
+        raising WorkerError if the process exits first.'''
+        deadline = None if timeout is None else timeit.default_timer() + timeout
+        try:
+            while not self.connection.poll(POLL_INTERVAL):
+                if not self.process.is_alive():
+                    raise WorkerError('The worker process exited with code %s'
+                        % self.process.exitcode)
+                if deadline is not None and timeit.default_timer() > deadline:
+                    raise WorkerError('The worker process did not respond '
+                        'within %s seconds' % timeout)
+            return self.connection.recv_bytes()
+        except (EOFError, IOError):
+            raise WorkerError('The worker process exited')
+
+    def ping(self, timeout=PING_TIMEOUT):
+        '''Check that the process answers within `timeout` seconds.'''
+        try:
+            header, _ = decode(self.request(encode(('ping',)), timeout))
+        except WorkerError:
+            return False
+        return header[0] == 'pong'
+
+class WorkerPool(object):
+    '''A pool of long-lived worker processes that call TimeSeries methods,
+    most usefully the R backed `forecast()` (auto.arima or ets) and
+    `decompose()` (stl). Each process starts R once, when the pool is
+    created, instead of once per batch of series; `preload=False` skips this
+    for pools that only run native methods. The embedded R interpreter runs
+    one call at a time, so `processes` (the number of CPUs by default) is
+    the number of series fitted at once. Series and results are sent as raw
+    array buffers behind a small pickled header.
+
+    A worker that exits, or that takes longer than `timeout` seconds on a
+    task, is restarted and the task retried up to `retries` times before
+    `WorkerError` is raised. Exceptions raised by the method itself are not
+    retried. The pool can be passed as `workers` to `DataFrame.forecast()`
+    and `DataFrame.trend()`, and should be closed with `close()` or used as
+    a context manager.'''
+
+    def __init__(self, processes=None, preload=True, timeout=None, retries=1):
+        self.processes = processes or cpu_count()
+        self.timeout = timeout
+        self.retries = retries
+        self.restarts = 0
+        self.workers = []
+        self.idle = Queue()
+        self.lock = threading.Lock()
+        try:
+            for _ in xrange(self.processes):
+                worker = Worker(preload)
+                worker.start()
+                self.workers.append(worker)
+                self.idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+
+    def call(self, series, method, args=(), kwargs=None):
+        '''Call the TimeSeries method `method` on `series` in a worker,
+        waiting for one to be free, and return the result.'''
+        if not self.workers:
+            raise ValueError('The pool is closed')
+        timestamps, values = series._timestamps, series._values
+        message = encode(('call', method, args, kwargs or {}, len(timestamps)),
+            (timestamps, values))
+        worker = self.idle.get()
+        try:
+            for attempt in xrange(self.retries + 1):
+                try:
+                    response = worker.request(message, self.timeout)
+                    break
+                except WorkerError:
+                    with self.lock:
+                        self.restarts += 1
+                    worker.stop(0)
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self.idle.put(worker)
+        return decode_result(response)
+
+    def map(self, series, method, args=(), kwargs=None):
+        '''Call `method` on every series in the `series` dict. Returns a
+        tuple of (results, failures) as `parallel.map_series()` does.'''
+        def run(item):
+            key, value = item
+            try:
+                return key, self.call(value, method, args, kwargs), None
+            except Exception, error:
+                return key, None, error
+        results, failures = {}, {}
+        if not series:
+            return results, failures
+        threads = ThreadPool(min(self.processes, len(series)))
+        try:
+            for key, result, error in threads.imap_unordered(run, series.items()):
+                if error is None:
+                    results[key] = result
+                else:
+                    failures[key] = error
+        finally:
+            threads.close()
+            threads.join()
+        return results, failures
+
+    def check(self):
+        '''Health check each idle worker, restarting any that have exited or
+        do not answer within `PING_TIMEOUT` seconds. Returns the number of
+        workers restarted.'''
+        restarted = 0
+        for _ in xrange(self.idle.qsize()):
+            worker = self.idle.get()
+            try:
+                if not worker.alive or not worker.ping():
+                    restarted += 1
+                    with self.lock:
+                        self.restarts += 1
+                    worker.restart()
+            finally:
+                self.idle.put(worker)
+        return restarted
+
+    def close(self):
+        '''Stop the worker processes.'''
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.close()
+
+    def __repr__(self):
+        return 'WorkerPool(%d processes)' % len(self.workers)